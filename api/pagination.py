@@ -0,0 +1,66 @@
+from __future__ import annotations
+import base64
+import binascii
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_QUERY_PARAM = "cursor"
+PAGE_SIZE_QUERY_PARAM = "page_size"
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(username: str) -> str:
+    return base64.urlsafe_b64encode(username.encode()).decode()
+
+
+def decode_cursor(request) -> str | None:
+    """Returns the username the requested page starts after."""
+    encoded = request.query_params.get(CURSOR_QUERY_PARAM)
+    if not encoded:
+        return None
+    try:
+        return base64.urlsafe_b64decode(encoded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise NotFound("Invalid cursor")
+
+
+def get_page_size(request) -> int:
+    try:
+        page_size = int(request.query_params[PAGE_SIZE_QUERY_PARAM])
+    except (KeyError, ValueError):
+        return api_settings.PAGE_SIZE
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+def paginated_response_data(request, results: list, next_username: str | None):
+    """
+    Keyset pages ordered by username, linked forward through an opaque
+    `cursor` like DRF's `CursorPagination`.
+    """
+    next_link = None
+    if next_username is not None:
+        next_link = replace_query_param(
+            request.build_absolute_uri(),
+            CURSOR_QUERY_PARAM,
+            encode_cursor(next_username),
+        )
+    return {"next": next_link, "results": results}
+
+
+class PageSizeCursorPagination(CursorPagination):
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+    max_page_size = MAX_PAGE_SIZE
+
+
+class CoursePagination(PageSizeCursorPagination):
+    ordering = "course_number"
+
+
+class DepartmentPagination(PageSizeCursorPagination):
+    ordering = "department_number"
+
+
+class IntervalPagination(PageSizeCursorPagination):
+    ordering = "id"
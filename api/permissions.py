@@ -0,0 +1,8 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsSuperUser(BasePermission):
+    """Only lets Admins through; `is_staff` marks Teachers in this project."""
+
+    def has_permission(self, request, view) -> bool:
+        return bool(request.user and request.user.is_superuser)
@@ -1,9 +1,23 @@
+from urllib.parse import quote
 from rest_framework import serializers
-from core.models import User
+from core.models import Course, Department, Interval, User
 from django.urls import reverse
+from django.utils.http import RFC3986_SUBDELIMS
 
+USER_FIELDS = ("username", "first_name", "last_name")
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+
+def user_url_prefix(request) -> str:
+    """The absolute URL of `core:user_details` without the username, built once per request."""
+    return request.build_absolute_uri(reverse("core:user_details", args=["-"]))[:-1]
+
+
+def user_url(prefix: str, username: str) -> str:
+    # Quotes the username the way `reverse()` does.
+    return prefix + quote(username, safe=RFC3986_SUBDELIMS + "/~:@")
+
+
+class UserSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
 
     class Meta:
@@ -11,9 +25,75 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         fields = ["url", "first_name", "last_name"]
 
     def get_url(self, obj: User) -> str:
-        request = self.context["request"]
-        return (
-            request.protocol
-            + request.get_host()
-            + reverse("core:user_details", args=[obj.username])
-        )
+        return user_url(self.context["user_url_prefix"], obj.username)
+
+
+class DepartmentSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Department
+        fields = ["department_number", "name"]
+
+
+class CourseSerializer(serializers.ModelSerializer):
+    """Expects `teacher` and `department` selected and `participant_count` annotated."""
+
+    teacher = UserSerializer(read_only=True)
+    department = DepartmentSummarySerializer(read_only=True)
+    participant_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            "course_number",
+            "group_number",
+            "name",
+            "department",
+            "teacher",
+            "first_day",
+            "second_day",
+            "start_time",
+            "end_time",
+            "participant_count",
+        ]
+
+
+class DepartmentSerializer(serializers.ModelSerializer):
+    """Expects `manager` selected and `course_count` annotated."""
+
+    manager = UserSerializer(read_only=True)
+    course_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Department
+        fields = [
+            "department_number",
+            "name",
+            "description",
+            "manager",
+            "course_count",
+        ]
+
+
+class IntervalSerializer(serializers.ModelSerializer):
+    """Expects `teacher` selected and `remaining_capacity` annotated."""
+
+    teacher = UserSerializer(read_only=True)
+    remaining_capacity = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Interval
+        fields = [
+            "id",
+            "teacher",
+            "day",
+            "start_time",
+            "end_time",
+            "capacity",
+            "reserved_count",
+            "remaining_capacity",
+        ]
+
+
+class EnrollmentSerializer(serializers.Serializer):
+    student = serializers.CharField(max_length=150)
+    course = serializers.IntegerField()
@@ -1,3 +1,460 @@
-from django.test import TestCase
+from __future__ import annotations
+import csv
+import datetime
+import io
+import json
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from core import search
+from core.catalog import import_courses
+from core.models import Course, Department, Interval, User
+from core.profiling import QUERY_BUDGETS, assert_within_query_budget
+from core.versions import COURSES, DEPARTMENTS, get_version
 
-# Create your tests here.
+
+@override_settings(QUERY_PROFILER=1, QUERY_BUDGET_STRICT=1)
+class QueryBudgetTests(TransactionTestCase):
+    """Every budgeted endpoint of `api` stays within its budget over pages of rows."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username="admin", is_superuser=True)
+        students = User.objects.bulk_create(
+            User(username=f"student{number}") for number in range(15)
+        )
+        for number in range(15):
+            teacher = User.objects.create(username=f"teacher{number}", is_staff=True)
+            department = Department.objects.create(
+                name=f"Department {number}", department_number=number, manager=teacher
+            )
+            course = Course.objects.create(
+                name=f"Course {number}",
+                user=teacher,
+                teacher=teacher,
+                department=department,
+                course_number=number,
+                group_number=1,
+                first_day="Monday",
+                second_day="Wednesday",
+                start_time=datetime.time(10),
+                end_time=datetime.time(11, 30),
+            )
+            course.participants.add(*students)
+            interval = Interval.objects.create(
+                teacher=teacher,
+                day="Tuesday",
+                start_time=datetime.time(10),
+                end_time=datetime.time(11),
+                capacity=20,
+            )
+            interval.reserving_students.add(*students)
+        self.interval = interval
+
+    def requests(self):
+        return [
+            ("teacher_list", {}),
+            ("student_list", {}),
+            ("course_list", {}),
+            ("course_detail", {"course_number": 1}),
+            ("department_list", {}),
+            ("department_detail", {"department_number": 1}),
+            ("interval_list", {}),
+            ("interval_detail", {"pk": self.interval.pk}),
+            ("response_cache_stats", {}),
+            ("db_pool_stats", {}),
+        ]
+
+    def test_endpoints_stay_within_budget(self):
+        self.client.force_login(self.admin)
+        for name, kwargs in self.requests():
+            with self.subTest(name=name), self.assertLogs("core.profiling", "INFO"):
+                response = self.client.get(reverse(f"api:{name}", kwargs=kwargs))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response["X-DB-Query-Budget"], str(QUERY_BUDGETS[f"api:{name}"])
+                )
+                assert_within_query_budget(response)
+
+    def test_every_budget_is_exercised(self):
+        budgeted = {name for name in QUERY_BUDGETS if name.startswith("api:")}
+        self.assertEqual({f"api:{name}" for name, _ in self.requests()}, budgeted)
+
+
+class ConditionalDepartmentTests(TestCase):
+    """Conditional GETs of a department see changes to its courses."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.department = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("api:department_detail", args=[1])
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["course_count"], 0)
+        self.etag = response["ETag"]
+
+    def assert_course_count(self, count: int) -> None:
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["course_count"], count)
+
+    def test_unchanged_department_is_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_saved_course_changes_the_department(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(
+                name="Algebra",
+                user=self.teacher,
+                teacher=self.teacher,
+                department=self.department,
+                course_number=1,
+                group_number=1,
+                first_day="Monday",
+                second_day="Wednesday",
+                start_time=datetime.time(10),
+                end_time=datetime.time(11, 30),
+            )
+        self.assert_course_count(1)
+
+    def test_version_changes_when_the_course_commits(self):
+        version = get_version(DEPARTMENTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Course.objects.create(
+                    name="Algebra",
+                    user=self.teacher,
+                    teacher=self.teacher,
+                    department=self.department,
+                    course_number=1,
+                    group_number=1,
+                    first_day="Monday",
+                    second_day="Wednesday",
+                    start_time=datetime.time(10),
+                    end_time=datetime.time(11, 30),
+                )
+                # Other requests still read the old rows here.
+                self.assertEqual(get_version(DEPARTMENTS), version)
+            self.assertEqual(get_version(DEPARTMENTS), version)
+        self.assertNotEqual(get_version(DEPARTMENTS), version)
+        self.assert_course_count(1)
+
+    def test_imported_course_changes_the_department(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_courses(
+                [
+                    {
+                        "name": "Algebra",
+                        "course_number": 1,
+                        "group_number": 1,
+                        "teacher": "teacher",
+                        "department": 1,
+                        "first_day": "Monday",
+                        "second_day": "Wednesday",
+                        "start_time": "10:00",
+                        "end_time": "11:30",
+                    }
+                ]
+            )
+        self.assertEqual(report.created, 1)
+        self.assert_course_count(1)
+
+
+class CatalogImportTests(TestCase):
+    """Catalogs that break off still report, and publish, what was created."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", is_superuser=True)
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def upload(self, name: str, content: bytes):
+        return self.client.post(
+            reverse("api:course_import"),
+            {"file": SimpleUploadedFile(name, content)},
+        )
+
+    def test_catalog_breaking_off_reports_created_rows(self):
+        version = get_version(DEPARTMENTS)
+        rows = "".join(
+            f"Course {number},{number},1,teacher,1,Monday,Wednesday,10:00,11:30\n"
+            for number in range(1, 501)
+        )
+        content = (
+            "name,course_number,group_number,teacher,department,"
+            "first_day,second_day,start_time,end_time\n" + rows
+        ).encode()
+        # Past the first chunk the reader decodes, so some rows come first.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(
+                "courses.csv", content[:12000] + b"\xff" + content[12000:]
+            )
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        created = Course.objects.count()
+        self.assertGreater(created, 0)
+        self.assertEqual(data["created"], created)
+        self.assertEqual(data["errors"][-1]["outcome"], "unreadable")
+        self.assertEqual(data["errors"][-1]["row"], created + 1)
+        self.assertIn("row", data["detail"])
+        self.assertNotEqual(get_version(DEPARTMENTS), version)
+
+    def test_unparseable_json_array_creates_nothing(self):
+        response = self.upload("courses.json", b'[{"name": "Algebra", ')
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(data["created"], 0)
+        self.assertEqual([error["outcome"] for error in data["errors"]], ["unreadable"])
+
+    def test_unknown_file_format(self):
+        response = self.client.post(
+            reverse("api:course_import") + "?file_format=xml",
+            {"file": SimpleUploadedFile("courses.csv", b"")},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_failing_batch_still_bumps_versions(self):
+        version = get_version(COURSES)
+        bulk_create = Course.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) > 1:
+                raise IntegrityError("Course number is already taken.")
+            return bulk_create(objs, *args, **kwargs)
+
+        records = [
+            {
+                "name": name,
+                "course_number": number,
+                "group_number": 1,
+                "teacher": "teacher",
+                "department": 1,
+                "first_day": "Monday",
+                "second_day": "Wednesday",
+                "start_time": "10:00",
+                "end_time": "11:30",
+            }
+            for number, name in enumerate(["Algebra", "Geometry"], start=1)
+        ]
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(
+            Course.objects, "bulk_create", fail_second_batch
+        ):
+            with self.assertRaises(IntegrityError):
+                import_courses(records, batch_size=1)
+        self.assertEqual(Course.objects.count(), 1)
+        self.assertNotEqual(get_version(COURSES), version)
+
+
+class UserListTests(TestCase):
+    """Teacher and student lists, by version, and their exports."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f"student{number:02}", email=f"s{number}@example.com")
+            for number in range(25)
+        )
+        User.objects.create(username="teacher", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        # The users of this class are rolled back, so they are indexed apart.
+        patcher = mock.patch.object(
+            search, "_user_backend", search.InMemoryUserSearchBackend()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url: str, version: str = "2"):
+        response = self.client.get(
+            url, HTTP_ACCEPT=f"application/json; version={version}"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def usernames(self, users: list[dict]) -> list[str]:
+        return [user["url"].rstrip("/").rsplit("/", 1)[-1] for user in users]
+
+    def test_pages_cover_every_student_once(self):
+        url = reverse("api:student_list") + "?page_size=4"
+        usernames = []
+        pages = 0
+        while url:
+            data = self.get(url)
+            self.assertLessEqual(len(data["results"]), 4)
+            usernames += self.usernames(data["results"])
+            url = data["next"]
+            pages += 1
+        self.assertEqual(pages, 7)
+        self.assertEqual(usernames, [f"student{number:02}" for number in range(25)])
+
+    def test_query_filters_every_page(self):
+        url = reverse("api:student_list") + "?page_size=2&q=student1"
+        first = self.get(url)
+        second = self.get(first["next"])
+        self.assertEqual(
+            self.usernames(first["results"] + second["results"]),
+            ["student10", "student11", "student12", "student13"],
+        )
+
+    def test_version_1_is_a_bare_list_of_every_match(self):
+        data = self.get(reverse("api:student_list"), version="1")
+        self.assertEqual(len(data), 25)
+        # Clients that ask for no version get version 1.
+        data = self.client.get(reverse("api:teacher_list")).json()
+        self.assertEqual(self.usernames(data), ["teacher"])
+
+    def test_exports_need_a_signed_in_user(self):
+        url = reverse("api:student_export")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.get(username="teacher"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 25)
+
+
+class RosterExportTests(TestCase):
+    """Rosters stream as NDJSON or CSV to their teacher and Admins only."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", is_superuser=True)
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.other = User.objects.create(
+            username="other", email="o@example.com", is_staff=True
+        )
+        cls.students = User.objects.bulk_create(
+            User(
+                username=f"student{number}",
+                first_name=f"First {number}",
+                last_name="Last, Jr.",
+                email=f"s{number}@example.com",
+            )
+            for number in (2, 1, 3)
+        )
+        department = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+        for number, name in [(2, "Geometry"), (1, "Algebra")]:
+            course = Course.objects.create(
+                name=name,
+                user=cls.teacher,
+                teacher=cls.teacher,
+                department=department,
+                course_number=number,
+                group_number=1,
+                first_day="Monday",
+                second_day="Wednesday",
+                start_time=datetime.time(10),
+                end_time=datetime.time(11, 30),
+            )
+            course.participants.add(*cls.students[: number + 1])
+        cls.interval = Interval.objects.create(
+            teacher=cls.teacher,
+            day="Tuesday",
+            start_time=datetime.time(10),
+            end_time=datetime.time(11),
+            capacity=5,
+        )
+        cls.interval.reserving_students.add(*cls.students)
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, user, name: str, file_format: str = "ndjson", **kwargs):
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse(f"api:{name}", kwargs=kwargs), {"file_format": file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_participants_as_ndjson(self):
+        # Small chunks, so the rows come from several reads.
+        with mock.patch("api.views.EXPORT_CHUNK_SIZE", 1):
+            content = self.export(
+                self.teacher, "course_participant_export", course_number=2
+            )
+        self.assertEqual(
+            [json.loads(line) for line in content.splitlines()],
+            [
+                {
+                    "username": f"student{number}",
+                    "first_name": f"First {number}",
+                    "last_name": "Last, Jr.",
+                }
+                for number in (1, 2, 3)
+            ],
+        )
+
+    def test_reservations_as_csv(self):
+        content = self.export(
+            self.admin, "interval_reservation_export", "csv", pk=self.interval.pk
+        )
+        self.assertEqual(
+            list(csv.reader(io.StringIO(content))),
+            [["username", "first_name", "last_name"]]
+            + [[f"student{n}", f"First {n}", "Last, Jr."] for n in (1, 2, 3)],
+        )
+
+    def test_department_rosters_go_course_by_course(self):
+        content = self.export(
+            self.admin, "department_roster_export", department_number=1
+        )
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(row["course_name"], row["username"]) for row in rows],
+            [
+                ("Algebra", "student1"),
+                ("Algebra", "student2"),
+                ("Geometry", "student1"),
+                ("Geometry", "student2"),
+                ("Geometry", "student3"),
+            ],
+        )
+
+    def test_only_the_teacher_and_admins_can_export(self):
+        requests = [
+            ("course_participant_export", {"course_number": 1}),
+            ("interval_reservation_export", {"pk": self.interval.pk}),
+            ("department_roster_export", {"department_number": 1}),
+        ]
+        for name, kwargs in requests:
+            url = reverse(f"api:{name}", kwargs=kwargs)
+            with self.subTest(name=name):
+                self.client.logout()
+                self.assertEqual(self.client.get(url).status_code, 403)
+                self.client.force_login(self.other)
+                self.assertEqual(self.client.get(url).status_code, 403)
+                self.client.force_login(self.students[0])
+                self.assertEqual(self.client.get(url).status_code, 403)
+        # Managing the department does not make a teacher an Admin.
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_unknown_format(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(
+            reverse("api:course_participant_export", args=[1]), {"file_format": "xml"}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -1,10 +1,85 @@
 from django.urls import path
 from api import views
-
+from core.profiling import declare_query_budgets
 
 app_name = "api"
 
 urlpatterns = [
     path("teachers/", views.teacher_list_view, name="teacher_list"),
     path("students/", views.student_list_view, name="student_list"),
+    path("teachers/export/", views.teacher_export_view, name="teacher_export"),
+    path("students/export/", views.student_export_view, name="student_export"),
+    path("courses/", views.CourseViewSet.as_view({"get": "list"}), name="course_list"),
+    path("courses/import/", views.course_import_view, name="course_import"),
+    path(
+        "courses/<int:course_number>/",
+        views.CourseViewSet.as_view({"get": "retrieve"}),
+        name="course_detail",
+    ),
+    path(
+        "courses/<int:course_number>/participants/export/",
+        views.course_participant_export_view,
+        name="course_participant_export",
+    ),
+    path(
+        "departments/",
+        views.DepartmentViewSet.as_view({"get": "list"}),
+        name="department_list",
+    ),
+    path(
+        "departments/<int:department_number>/",
+        views.DepartmentViewSet.as_view({"get": "retrieve"}),
+        name="department_detail",
+    ),
+    path(
+        "departments/<int:department_number>/rosters/export/",
+        views.department_roster_export_view,
+        name="department_roster_export",
+    ),
+    path(
+        "intervals/",
+        views.IntervalViewSet.as_view({"get": "list"}),
+        name="interval_list",
+    ),
+    path("intervals/import/", views.interval_import_view, name="interval_import"),
+    path(
+        "intervals/<int:pk>/",
+        views.IntervalViewSet.as_view({"get": "retrieve"}),
+        name="interval_detail",
+    ),
+    path(
+        "intervals/<int:pk>/reservations/export/",
+        views.interval_reservation_export_view,
+        name="interval_reservation_export",
+    ),
+    path(
+        "response-cache/",
+        views.response_cache_stats_view,
+        name="response_cache_stats",
+    ),
+    path("db-pool/", views.db_pool_stats_view, name="db_pool_stats"),
+    path(
+        "enrollments/",
+        views.enrollment_bulk_create_view,
+        name="enrollment_bulk_create",
+    ),
 ]
+
+# `enrollment_bulk_create` and the catalog imports scale with the size of the
+# payload and the user, roster and reservation exports query while
+# streaming, after the profiler has counted, so they have no budget.
+declare_query_budgets(
+    app_name,
+    {
+        "teacher_list": 5,
+        "student_list": 5,
+        "course_list": 5,
+        "course_detail": 5,
+        "department_list": 5,
+        "department_detail": 5,
+        "interval_list": 5,
+        "interval_detail": 5,
+        "response_cache_stats": 3,
+        "db_pool_stats": 3,
+    },
+)
@@ -1,41 +1,388 @@
-from rest_framework.decorators import api_view
+import csv
+import io
+import itertools
+import json
+from django.http import StreamingHttpResponse
+from django.db.models import Count, F, Q
+from django.shortcuts import get_object_or_404
+from rest_framework import status, viewsets
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from core.models import User
-from django.db.models import Q
-from api.serializers import UserSerializer
+from core.catalog import (
+    FORMATS,
+    detect_format,
+    import_courses,
+    import_intervals,
+    read_records,
+)
+from core.enrollments import Enrollment, EnrollmentOutcome, bulk_enroll
+from core.search import search_users, STUDENT, TEACHER
+from core.models import Course, Department, Interval, User
+from core.db.pool import pool_stats
+from core.reservations import Reservation
+from core.response_cache import hit_rates
+from core.versions import COURSES, DEPARTMENTS, INTERVALS
+from api.conditional import conditional_on
+from api.pagination import (
+    CoursePagination,
+    DepartmentPagination,
+    IntervalPagination,
+    decode_cursor,
+    get_page_size,
+    paginated_response_data,
+)
+from api.permissions import IsSuperUser
+from api.serializers import (
+    USER_FIELDS,
+    CourseSerializer,
+    DepartmentSerializer,
+    EnrollmentSerializer,
+    IntervalSerializer,
+    UserSerializer,
+    user_url,
+    user_url_prefix,
+)
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+ROSTER_FIELDS = ("username", "first_name", "last_name")
+
+
+def user_list_response(request, role: bool):
+    """
+    Version 2 (`Accept: application/json; version=2`) answers `{next, results}`
+    keyset pages. Version 1, the default, keeps the bare list of every match
+    for existing clients.
+    """
+    paginated = request.version != "1"
+    after = decode_cursor(request) if paginated else None
+    result = search_users(
+        request.query_params.get("q", ""),
+        roles=[role],
+        limit=get_page_size(request) if paginated else None,
+        teachers_after=after,
+        students_after=after,
+        fields=USER_FIELDS,
+    )
+    page = result.page(role)
+    context = {"request": request, "user_url_prefix": user_url_prefix(request)}
+    serialized = UserSerializer(page.users, many=True, context=context)
+    if not paginated:
+        return Response(serialized.data)
+    return Response(paginated_response_data(request, serialized.data, page.next_cursor))
+
+
+def user_export_response(request, role: bool):
+    """
+    Streams every user of `role` as NDJSON, one JSON object per line.
+    Rows are read in keyset chunks, so memory stays constant however many
+    users there are.
+    """
+    prefix = user_url_prefix(request)
+
+    def lines():
+        after = ""
+        while True:
+            rows = list(
+                User.objects.filter(is_staff=role, username__gt=after)
+                .order_by("username")
+                .values_list(*USER_FIELDS)[:EXPORT_CHUNK_SIZE]
+            )
+            for username, first_name, last_name in rows:
+                record = {
+                    "url": user_url(prefix, username),
+                    "first_name": first_name,
+                    "last_name": last_name,
+                }
+                yield json.dumps(record) + "\n"
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                return
+            after = rows[-1][0]
+
+    return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
 
 
 @api_view(http_method_names=["GET"])
 def teacher_list_view(request):
-    if request.is_secure():
-        request.protocol = "https://"
+    return user_list_response(request, TEACHER)
+
+
+@api_view(http_method_names=["GET"])
+def student_list_view(request):
+    return user_list_response(request, STUDENT)
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes([IsAuthenticated])
+def teacher_export_view(request):
+    return user_export_response(request, TEACHER)
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes([IsAuthenticated])
+def student_export_view(request):
+    return user_export_response(request, STUDENT)
+
+
+class EchoBuffer:
+    """Hands back what `csv.writer` writes, so each row can be streamed as is."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def rows_export_response(request, columns: tuple, rows, filename: str):
+    """
+    Streams `rows`, tuples in the order of `columns`, as NDJSON or, with
+    `?file_format=csv`, as CSV with a header line. `rows` should be a lazy
+    `.iterator()`, so it is read chunk by chunk while the response is sent.
+    """
+    format = request.query_params.get("file_format", "ndjson")
+    if format not in EXPORT_FORMATS:
+        return Response(
+            {"detail": f"Unknown export format {format!r}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if format == "csv":
+        writer = csv.writer(EchoBuffer())
+        lines = map(writer.writerow, itertools.chain([columns], rows))
     else:
-        request.protocol = "http://"
-    q = request.GET.get("q", "")
-    query = (
-        Q(first_name__icontains=q)
-        | Q(last_name__icontains=q)
-        | Q(username__icontains=q)
+        lines = (json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{format}"'
+    return response
+
+
+def check_teacher_or_superuser(request, teacher_id: int) -> None:
+    if not (request.user.is_superuser or request.user.pk == teacher_id):
+        raise PermissionDenied("Only its teacher and Admins can export it.")
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes([IsAuthenticated])
+def course_participant_export_view(request, course_number):
+    course = get_object_or_404(
+        Course.objects.only("pk", "teacher_id"), course_number=course_number
+    )
+    check_teacher_or_superuser(request, course.teacher_id)
+    rows = (
+        Enrollment.objects.filter(course_id=course.pk)
+        .order_by("user__username")
+        .values_list(*(f"user__{name}" for name in ROSTER_FIELDS))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return rows_export_response(
+        request, ROSTER_FIELDS, rows, f"course-{course_number}-participants"
     )
-    teachers = User.objects.filter(is_staff=True).filter(query).all()
-    context = {"request": request}
-    serialized = UserSerializer(teachers, many=True, context=context)
-    return Response(serialized.data)
 
 
 @api_view(http_method_names=["GET"])
-def student_list_view(request):
-    q = request.GET.get("q", "")
-    if request.is_secure():
-        request.protocol = "https://"
+@permission_classes([IsAuthenticated])
+def interval_reservation_export_view(request, pk):
+    interval = get_object_or_404(Interval.objects.only("pk", "teacher_id"), pk=pk)
+    check_teacher_or_superuser(request, interval.teacher_id)
+    rows = (
+        Reservation.objects.filter(interval_id=interval.pk)
+        .order_by("user__username")
+        .values_list(*(f"user__{name}" for name in ROSTER_FIELDS))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return rows_export_response(
+        request, ROSTER_FIELDS, rows, f"interval-{pk}-reservations"
+    )
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes([IsSuperUser])
+def department_roster_export_view(request, department_number):
+    """
+    The participants of every course of a department, read in one pass over
+    the enrollments joined to their courses and users, course by course.
+    """
+    department = get_object_or_404(
+        Department.objects.only("pk"), department_number=department_number
+    )
+    columns = ("course_number", "group_number", "course_name", *ROSTER_FIELDS)
+    rows = (
+        Enrollment.objects.filter(course__department_id=department.pk)
+        .order_by("course__course_number", "user__username")
+        .values_list(
+            "course__course_number",
+            "course__group_number",
+            "course__name",
+            *(f"user__{name}" for name in ROSTER_FIELDS),
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return rows_export_response(
+        request, columns, rows, f"department-{department_number}-rosters"
+    )
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes([IsSuperUser])
+def response_cache_stats_view(request):
+    """Hit rates of the response cache of the process serving the request."""
+    return Response(hit_rates())
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes([IsSuperUser])
+def db_pool_stats_view(request):
+    """Checkouts, wait times and saturation of the connection pools of this process."""
+    return Response(pool_stats())
+
+
+@api_view(http_method_names=["POST"])
+@permission_classes([IsSuperUser])
+def enrollment_bulk_create_view(request):
+    serializer = EnrollmentSerializer(data=request.data, many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    pairs = [(item["student"], item["course"]) for item in serializer.validated_data]
+    results = bulk_enroll(pairs)
+    enrolled = sum(result.outcome == EnrollmentOutcome.ENROLLED for result in results)
+    data = {
+        "enrolled": enrolled,
+        "results": [
+            {
+                "student": result.student,
+                "course": result.course,
+                "outcome": result.outcome.value,
+            }
+            for result in results
+        ],
+    }
+    return Response(data)
+
+
+def catalog_import_response(request, import_catalog):
+    """
+    Imports the catalog uploaded as `file` (CSV, JSON or NDJSON, by extension
+    or `?file_format=`) or posted as a JSON list, and reports the rejected rows.
+    `?format=` is taken by REST framework for choosing the renderer.
+    A catalog that can not be read to its end is answered with a `400`
+    reporting what was created before.
+    """
+    upload = request.FILES.get("file")
+    if upload is not None:
+        try:
+            format = request.query_params.get("file_format") or detect_format(
+                upload.name
+            )
+            if format not in FORMATS.values():
+                raise ValueError(f"Unknown catalog format {format!r}.")
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        records = read_records(
+            io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""), format
+        )
+    elif isinstance(request.data, list):
+        records = request.data
     else:
-        request.protocol = "http://"
-    query = (
-        Q(first_name__icontains=q)
-        | Q(last_name__icontains=q)
-        | Q(username__icontains=q)
-    )
-    students = User.objects.filter(is_staff=False).filter(query).all()
-    context = {"request": request}
-    serialized = UserSerializer(students, many=True, context=context)
-    return Response(serialized.data)
+        return Response(
+            {"detail": "Upload a `file` or post a JSON list of records."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    report = import_catalog(records)
+    data = {
+        "created": report.created,
+        "errors": [
+            {"row": error.row, "outcome": error.outcome.value, "message": error.message}
+            for error in report.errors
+        ],
+    }
+    if not report.complete:
+        failure = report.errors[-1]
+        message = f"The catalog breaks off at row {failure.row}: {failure.message}"
+        data["detail"] = message
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+
+@api_view(http_method_names=["POST"])
+@permission_classes([IsSuperUser])
+def course_import_view(request):
+    return catalog_import_response(
+        request, lambda records: import_courses(records, added_by=request.user)
+    )
+
+
+@api_view(http_method_names=["POST"])
+@permission_classes([IsSuperUser])
+def interval_import_view(request):
+    return catalog_import_response(request, import_intervals)
+
+
+class ReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["user_url_prefix"] = user_url_prefix(self.request)
+        return context
+
+
+@conditional_on(COURSES)
+class CourseViewSet(ReadOnlyViewSet):
+    """Courses, filterable by `day`, `teacher` (username) and `department` (number)."""
+
+    serializer_class = CourseSerializer
+    pagination_class = CoursePagination
+    lookup_field = "course_number"
+
+    def get_queryset(self):
+        courses = Course.objects.select_related("teacher", "department").annotate(
+            participant_count=Count("participants")
+        )
+        params = self.request.query_params
+        if day := params.get("day"):
+            courses = courses.filter(
+                Q(first_day__iexact=day) | Q(second_day__iexact=day)
+            )
+        if teacher := params.get("teacher"):
+            courses = courses.filter(teacher__username=teacher)
+        if department := params.get("department"):
+            courses = courses.filter(department__department_number=department)
+        return courses
+
+
+@conditional_on(DEPARTMENTS)
+class DepartmentViewSet(ReadOnlyViewSet):
+    """Departments, filterable by `manager` (username)."""
+
+    serializer_class = DepartmentSerializer
+    pagination_class = DepartmentPagination
+    lookup_field = "department_number"
+
+    def get_queryset(self):
+        departments = Department.objects.select_related("manager").annotate(
+            course_count=Count("courses")
+        )
+        if manager := self.request.query_params.get("manager"):
+            departments = departments.filter(manager__username=manager)
+        return departments
+
+
+@conditional_on(INTERVALS)
+class IntervalViewSet(ReadOnlyViewSet):
+    """
+    Intervals with their remaining capacity, filterable by `day`,
+    `teacher` (username) and `available=true`.
+    """
+
+    serializer_class = IntervalSerializer
+    pagination_class = IntervalPagination
+
+    def get_queryset(self):
+        intervals = Interval.objects.select_related("teacher").annotate(
+            remaining_capacity=F("capacity") - F("reserved_count")
+        )
+        params = self.request.query_params
+        if day := params.get("day"):
+            intervals = intervals.filter(day__iexact=day)
+        if teacher := params.get("teacher"):
+            intervals = intervals.filter(teacher__username=teacher)
+        if params.get("available") in ("1", "true"):
+            intervals = intervals.filter(remaining_capacity__gt=0)
+        return intervals
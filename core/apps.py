@@ -2,5 +2,13 @@ from django.apps import AppConfig
 
 
 class CoreConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "core"
+
+    def ready(self):
+        # Connects the signal receivers of the modules below.
+        import core.notifications  # noqa: F401
+        import core.reservations  # noqa: F401
+        import core.search  # noqa: F401
+        import core.timetable  # noqa: F401
+        import core.versions  # noqa: F401
@@ -0,0 +1,385 @@
+from __future__ import annotations
+import csv
+import datetime
+import enum
+import json
+import os
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from django.db import transaction
+from django.utils.dateparse import parse_time
+from core.models import Course, Department, Interval, User
+from core.search import build_search_document, course_row, get_course_search_backend
+from core.timetable import WEEKDAYS
+from core.utils import IntervalIndex
+from core.versions import COURSES, DEPARTMENT_COURSES, DEPARTMENTS, INTERVALS, bump
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = {".csv": "csv", ".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class ImportOutcome(enum.Enum):
+    CREATED = "created"
+    INVALID = "invalid"
+    UNKNOWN_TEACHER = "unknown_teacher"
+    NOT_A_TEACHER = "not_a_teacher"
+    UNKNOWN_DEPARTMENT = "unknown_department"
+    ALREADY_EXISTS = "already_exists"
+    DUPLICATE = "duplicate"
+    OVERLAP = "overlap"
+    UNREADABLE = "unreadable"
+
+
+@dataclass
+class ImportResult:
+    # Position among the records of the catalog, starting at 1.
+    row: int
+    outcome: ImportOutcome
+    message: str = ""
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    # Only the rejected rows, so the report stays small for large catalogs.
+    errors: list[ImportResult] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        """`False` when the catalog broke off and the rows after it were not read."""
+        return not self.errors or self.errors[-1].outcome != ImportOutcome.UNREADABLE
+
+
+def detect_format(filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown catalog format {extension!r}.")
+    return FORMATS[extension]
+
+
+def read_records(file, format: str) -> Iterator[dict | ValueError]:
+    """
+    Yields the records of a CSV, NDJSON or JSON array catalog read from the
+    text stream `file`. CSV and NDJSON are read one line at a time; a
+    malformed NDJSON line is yielded as a `ValueError` so only it is rejected.
+    """
+    if format == "csv":
+        yield from csv.DictReader(file)
+    elif format == "ndjson":
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"Malformed JSON: {e}.")
+    elif format == "json":
+        yield from json.load(file)
+    else:
+        raise ValueError(f"Unknown catalog format {format!r}.")
+
+
+def _text(record: dict, name: str) -> str:
+    value = record.get(name)
+    if value is None or not str(value).strip():
+        raise ValueError(f"`{name}` is required.")
+    return str(value).strip()
+
+
+def _integer(record: dict, name: str) -> int:
+    try:
+        return int(_text(record, name))
+    except ValueError:
+        raise ValueError(f"`{name}` must be an integer.") from None
+
+
+def _time(record: dict, name: str) -> datetime.time:
+    try:
+        value = parse_time(_text(record, name))
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValueError(f"`{name}` must be a time like 10:00.")
+    return value
+
+
+def _day(record: dict, name: str, message: str) -> str:
+    day = _text(record, name)
+    if day.lower() not in WEEKDAYS:
+        raise ValueError(message)
+    # The forms submit capitalized day names, which overlap checks compare.
+    return day.title()
+
+
+def parse_course(record) -> dict:
+    """Checks the fields of one course record against the rules of `Course.clean()`."""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object.")
+    invalid_day = "Course should be held in valid working days."
+    values = {
+        "name": _text(record, "name"),
+        "course_number": _integer(record, "course_number"),
+        "group_number": _integer(record, "group_number"),
+        "teacher": _text(record, "teacher"),
+        "department": _integer(record, "department"),
+        "first_day": _day(record, "first_day", invalid_day),
+        "second_day": _day(record, "second_day", invalid_day),
+        "start_time": _time(record, "start_time"),
+        "end_time": _time(record, "end_time"),
+    }
+    if len(values["name"]) > Course._meta.get_field("name").max_length:
+        raise ValueError("`name` is too long.")
+    if values["start_time"] >= values["end_time"]:
+        raise ValueError("Course should start before it ends!")
+    if values["first_day"] == values["second_day"]:
+        raise ValueError("Course should be held in two different days.")
+    return values
+
+
+def parse_interval(record) -> dict:
+    """Checks the fields of one interval record against the rules of `Interval.clean()`."""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object.")
+    values = {
+        "teacher": _text(record, "teacher"),
+        "day": _day(record, "day", "Interval should be held in valid working days."),
+        "start_time": _time(record, "start_time"),
+        "end_time": _time(record, "end_time"),
+        "capacity": _integer(record, "capacity"),
+    }
+    if values["start_time"] >= values["end_time"]:
+        raise ValueError("Interval should start before it ends!")
+    if values["capacity"] < 0:
+        raise ValueError("Capacity can not be negative.")
+    return values
+
+
+def _parse_batch(batch, parse) -> tuple[list[tuple[int, dict]], list[ImportResult]]:
+    parsed = []
+    errors = []
+    for row, record in batch:
+        try:
+            parsed.append((row, parse(record)))
+        except ValueError as e:
+            errors.append(ImportResult(row, ImportOutcome.INVALID, str(e)))
+    return parsed, errors
+
+
+def _load_teachers(usernames: Iterable[str]) -> dict[str, User]:
+    return {
+        user.username: user
+        for user in User.objects.filter(username__in=set(usernames)).only(
+            "pk", "username", "first_name", "last_name", "is_staff"
+        )
+    }
+
+
+def _teacher_error(teacher: User | None) -> tuple[ImportOutcome, str] | None:
+    if teacher is None:
+        return ImportOutcome.UNKNOWN_TEACHER, "No such teacher."
+    if not teacher.is_staff:
+        return ImportOutcome.NOT_A_TEACHER, "Teacher must be a staff."
+    return None
+
+
+def _import_course_batch(
+    batch: list, added_by: User | None, report: ImportReport, departments_seen: set
+) -> None:
+    parsed, errors = _parse_batch(batch, parse_course)
+    teachers = _load_teachers(values["teacher"] for _, values in parsed)
+    departments = {
+        department.department_number: department
+        for department in Department.objects.filter(
+            department_number__in={values["department"] for _, values in parsed}
+        ).only("pk", "name", "department_number")
+    }
+    taken = set(
+        Course.objects.filter(
+            course_number__in={values["course_number"] for _, values in parsed}
+        ).values_list("course_number", flat=True)
+    )
+
+    seen = set()
+    courses = []
+    for row, values in parsed:
+        teacher = teachers.get(values["teacher"])
+        department = departments.get(values["department"])
+        number = values["course_number"]
+        error = _teacher_error(teacher)
+        if error is None and department is None:
+            error = ImportOutcome.UNKNOWN_DEPARTMENT, "No such department."
+        if error is None and number in taken:
+            error = ImportOutcome.ALREADY_EXISTS, "Course number is already taken."
+        if error is None and number in seen:
+            error = ImportOutcome.DUPLICATE, "Course number appears twice."
+        if error is not None:
+            errors.append(ImportResult(row, *error))
+            continue
+        seen.add(number)
+        course = Course(
+            **{
+                **values,
+                "teacher": teacher,
+                "department": department,
+                "user": added_by or teacher,
+            }
+        )
+        course.search_document = build_search_document(course_row(course))
+        courses.append(course)
+
+    with transaction.atomic():
+        Course.objects.bulk_create(courses)
+    if courses and courses[0].pk is None:
+        pks = dict(
+            Course.objects.filter(course_number__in=seen).values_list(
+                "course_number", "pk"
+            )
+        )
+        for course in courses:
+            course.pk = pks[course.course_number]
+    # One generation per batch, so other processes catch up with the ids
+    # of the batch instead of rebuilding after a large import.
+    if courses:
+        get_course_search_backend().update_many(
+            [course_row(course) for course in courses]
+        )
+    for course in courses:
+        departments_seen.add(course.department_id)
+    report.created += len(courses)
+    report.errors.extend(sorted(errors, key=lambda result: result.row))
+
+
+def _import_interval_batch(batch: list, report: ImportReport) -> None:
+    parsed, errors = _parse_batch(batch, parse_interval)
+    teachers = _load_teachers(values["teacher"] for _, values in parsed)
+    existing = defaultdict(list)
+    for interval in Interval.objects.filter(
+        teacher_id__in=[teacher.pk for teacher in teachers.values()]
+    ).only("teacher_id", "day", "start_time", "end_time"):
+        existing[interval.teacher_id].append(interval)
+    indexes = {
+        teacher.pk: IntervalIndex(existing[teacher.pk]) for teacher in teachers.values()
+    }
+
+    candidates = defaultdict(list)
+    for row, values in parsed:
+        teacher = teachers.get(values["teacher"])
+        error = _teacher_error(teacher)
+        if error is not None:
+            errors.append(ImportResult(row, *error))
+            continue
+        interval = Interval(**{**values, "teacher": teacher})
+        candidates[teacher.pk, interval.day].append((row, interval))
+
+    # Sort-and-sweep per teacher and day: the batch is taken in start order,
+    # as if each interval were created after the previous ones, so it clashes
+    # with an accepted one iff the latest end so far is past its start.
+    intervals = []
+    for (teacher_pk, _), group in candidates.items():
+        group.sort(key=lambda item: (item[1].start_time, item[0]))
+        latest_end = None
+        for row, interval in group:
+            if indexes[teacher_pk].overlaps(interval):
+                message = "Interval overlaps with the current Intervals of the teacher."
+            elif latest_end is not None and latest_end > interval.start_time:
+                message = "Interval overlaps with another Interval of the catalog."
+            else:
+                intervals.append(interval)
+                latest_end = max(latest_end or interval.end_time, interval.end_time)
+                continue
+            errors.append(ImportResult(row, ImportOutcome.OVERLAP, message))
+
+    with transaction.atomic():
+        Interval.objects.bulk_create(intervals)
+    report.created += len(intervals)
+    report.errors.extend(sorted(errors, key=lambda result: result.row))
+
+
+def _import(
+    records: Iterable, batch_size: int, import_batch: Callable, report: ImportReport
+) -> None:
+    batch = []
+    row = 0
+    failure = None
+    records = iter(records)
+    while True:
+        try:
+            record = next(records)
+        except StopIteration:
+            break
+        except (ValueError, csv.Error) as e:
+            # The rest of the catalog can not be read, e.g. a JSON array that
+            # does not parse or bytes that are not UTF-8. What was read before
+            # is still imported, as earlier batches are already committed.
+            failure = ImportResult(row + 1, ImportOutcome.UNREADABLE, str(e))
+            break
+        row += 1
+        batch.append((row, record))
+        if len(batch) >= batch_size:
+            import_batch(batch)
+            batch = []
+    if batch:
+        import_batch(batch)
+    if failure is not None:
+        report.errors.append(failure)
+
+
+def import_courses(
+    records: Iterable,
+    added_by: User | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> ImportReport:
+    """
+    Creates the courses of a catalog, `batch_size` records at a time.
+    Each batch checks its rows, resolves teachers, departments and taken
+    course numbers with one query each and inserts with one `bulk_create`.
+    Rejected rows are reported without affecting the rest of the batch, and
+    a catalog that breaks off is imported up to there.
+    """
+    report = ImportReport()
+    departments = set()
+    try:
+        _import(
+            records,
+            batch_size,
+            lambda batch: _import_course_batch(batch, added_by, report, departments),
+            report,
+        )
+    finally:
+        # `bulk_create` sends no signals, so the cached versions are bumped
+        # here, also for the batches committed before an error.
+        if report.created:
+            bump(
+                COURSES,
+                DEPARTMENTS,
+                *(DEPARTMENT_COURSES.format(pk) for pk in departments),
+            )
+    return report
+
+
+def import_intervals(
+    records: Iterable, batch_size: int = DEFAULT_BATCH_SIZE
+) -> ImportReport:
+    """
+    Creates the intervals of a catalog, `batch_size` records at a time.
+    Each batch resolves its teachers and their current intervals with one
+    query each, rejects overlaps with a sort-and-sweep and inserts with one
+    `bulk_create`.
+    """
+    report = ImportReport()
+    try:
+        _import(
+            records,
+            batch_size,
+            lambda batch: _import_interval_batch(batch, report),
+            report,
+        )
+    finally:
+        if report.created:
+            bump(INTERVALS)
+    return report
@@ -0,0 +1,11 @@
+from __future__ import annotations
+from django.utils.functional import SimpleLazyObject
+from core.notifications import get_unread_summary
+
+
+def unread_notifications(request):
+    """Adds the cached unread notification summary of the signed-in user."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {"unread_notifications": SimpleLazyObject(lambda: get_unread_summary(user))}
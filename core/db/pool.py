@@ -0,0 +1,207 @@
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+
+# Idle pooled connections older than this are checked before they are reused.
+HEALTH_CHECK_AFTER = 30.0
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    timeouts: int = 0
+    opened: int = 0
+    discarded: int = 0
+    in_use: int = 0
+    max_in_use: int = 0
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections made by `connect`.
+    `get()` waits up to `timeout` seconds when all `max_size` connections are
+    checked out, and the waits feed the saturation metrics of `stats()`.
+    """
+
+    def __init__(self, connect, max_size: int, timeout: float):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self._idle: deque = deque()
+        self._condition = threading.Condition()
+        self._stats = PoolStats()
+
+    def get(self):
+        """Returns `(connection, idle_seconds)`; new connections were never idle."""
+        started = time.monotonic()
+        waited = False
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    idle = time.monotonic() - returned_at
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection, idle = None, 0.0
+                    break
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats.timeouts += 1
+                    raise PoolTimeout(
+                        f"All {self.max_size} connections stayed in use for "
+                        f"{self.timeout}s."
+                    )
+                self._condition.wait(remaining)
+            stats = self._stats
+            stats.checkouts += 1
+            stats.in_use += 1
+            stats.max_in_use = max(stats.max_in_use, stats.in_use)
+            if waited:
+                stats.waits += 1
+                stats.wait_time += time.monotonic() - started
+        if connection is None:
+            try:
+                connection = self.connect()
+            except BaseException:
+                self._release_slot()
+                raise
+            with self._condition:
+                self._stats.opened += 1
+        return connection, idle
+
+    def put(self, connection, discard: bool = False) -> None:
+        if discard:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            self._release_slot()
+            return
+        with self._condition:
+            self._stats.in_use -= 1
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self.size -= 1
+            self._stats.in_use -= 1
+            self._stats.discarded += 1
+            self._condition.notify()
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = asdict(self._stats)
+            stats["size"] = self.size
+            stats["idle"] = len(self._idle)
+        stats["max_size"] = self.max_size
+        stats["saturation"] = stats["in_use"] / self.max_size
+        stats["average_wait_ms"] = (
+            stats["wait_time"] / stats["waits"] * 1000 if stats["waits"] else 0.0
+        )
+        return stats
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, connect, options: dict) -> ConnectionPool:
+    # Created on first use, so `gunicorn --preload` forks before any pool exists.
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                connect, options.get("MAX_SIZE", 10), options.get("TIMEOUT", 10.0)
+            )
+        return pool
+
+
+def pool_stats() -> dict[str, dict]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+class ConnectionLifecycleMixin:
+    """
+    Adds to a Django `DatabaseWrapper`:
+    - `CONN_HEALTH_CHECKS`: a persistent connection is checked once per request
+      before it is reused, instead of failing the first query (built into
+      Django from 4.1 on).
+    - `POOL`: `{"MAX_SIZE": ..., "TIMEOUT": ...}` hands connections back to a
+      per-process `ConnectionPool` on close instead of closing them. Use it
+      with `CONN_MAX_AGE = 0` so connections return at the end of requests.
+    """
+
+    health_check_done = False
+
+    @property
+    def pool(self) -> ConnectionPool | None:
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        return get_pool(self.alias, self._connect_to_database, options)
+
+    def _connect_to_database(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection, idle = pool.get()
+        if self.settings_dict.get("CONN_HEALTH_CHECKS") and idle > HEALTH_CHECK_AFTER:
+            if not self._connection_usable(connection):
+                pool.put(connection, discard=True)
+                connection, _ = pool.get()
+        return connection
+
+    def _connection_usable(self, connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception:
+            return False
+        return True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # A connection left inside a transaction can not be handed out again.
+        broken = not self.autocommit or (self.errors_occurred and not self.is_usable())
+        with self.wrap_database_errors:
+            pool.put(self.connection, discard=broken)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Runs at the start and end of every request.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
@@ -0,0 +1,6 @@
+from django.db.backends.postgresql import base
+from core.db.pool import ConnectionLifecycleMixin
+
+
+class DatabaseWrapper(ConnectionLifecycleMixin, base.DatabaseWrapper):
+    """PostgreSQL with health checks of persistent connections and optional pooling."""
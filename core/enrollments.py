@@ -0,0 +1,170 @@
+from __future__ import annotations
+import enum
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from django.db import IntegrityError, router, transaction
+from django.db.models import signals
+from core.models import Course, User
+from core.timetable import cached_conflict, course_mask, lock_timetables
+
+Enrollment = Course.participants.through
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class EnrollmentOutcome(enum.Enum):
+    ENROLLED = "enrolled"
+    ALREADY_ENROLLED = "already_enrolled"
+    DUPLICATE = "duplicate"
+    UNKNOWN_STUDENT = "unknown_student"
+    UNKNOWN_COURSE = "unknown_course"
+    NOT_A_STUDENT = "not_a_student"
+    CONFLICT = "conflict"
+
+
+@dataclass
+class EnrollmentResult:
+    student: str
+    course: int
+    outcome: EnrollmentOutcome
+
+
+def _send_post_add(course: Course, student_ids: set[int]) -> None:
+    # Rows are written straight to the through table, so receivers of
+    # `m2m_changed` are told about them the way `participants.add()` would.
+    signals.m2m_changed.send(
+        sender=Enrollment,
+        instance=course,
+        action="post_add",
+        reverse=False,
+        model=User,
+        pk_set=student_ids,
+        using=router.db_for_write(Enrollment),
+    )
+
+
+def can_take_courses(user: User) -> bool:
+    return not (user.is_superuser or user.is_staff)
+
+
+def _clash_outcome(course: Course, student: User) -> EnrollmentOutcome:
+    # A course always collides with itself, so rule that out first.
+    if Enrollment.objects.filter(course_id=course.pk, user_id=student.pk).exists():
+        return EnrollmentOutcome.ALREADY_ENROLLED
+    return EnrollmentOutcome.CONFLICT
+
+
+def enroll_student(course: Course, student: User) -> EnrollmentOutcome:
+    """
+    Adds `student` to the participants of `course` with a single `INSERT`,
+    unless the course clashes with the student's timetable. The timetable
+    is checked against the database with the student's row locked.
+    """
+    if not can_take_courses(student):
+        return EnrollmentOutcome.NOT_A_STUDENT
+    mask = course_mask(course)
+    if cached_conflict(student, mask):
+        return _clash_outcome(course, student)
+    try:
+        with transaction.atomic():
+            if lock_timetables([student.pk])[student.pk] & mask:
+                return _clash_outcome(course, student)
+            Enrollment.objects.create(course_id=course.pk, user_id=student.pk)
+    except IntegrityError:
+        return EnrollmentOutcome.ALREADY_ENROLLED
+    _send_post_add(course, {student.pk})
+    return EnrollmentOutcome.ENROLLED
+
+
+def _enroll_batch(pairs: list[tuple[str, int]]) -> list[EnrollmentResult]:
+    usernames = {username for username, _ in pairs}
+    course_numbers = {course_number for _, course_number in pairs}
+    students = {
+        user.username: user
+        for user in User.objects.filter(username__in=usernames).only(
+            "pk", "username", "is_staff", "is_superuser"
+        )
+    }
+    courses = {
+        course.course_number: course
+        for course in Course.objects.filter(course_number__in=course_numbers).only(
+            "pk",
+            "course_number",
+            "first_day",
+            "second_day",
+            "start_time",
+            "end_time",
+        )
+    }
+    course_masks = {course.pk: course_mask(course) for course in courses.values()}
+
+    results = []
+    seen = set()
+    new_rows = []
+    added = defaultdict(set)
+    with transaction.atomic():
+        timetables = lock_timetables(
+            user.pk for user in students.values() if can_take_courses(user)
+        )
+        # Read with the students locked, so no other request can enroll
+        # them before the rows below are inserted.
+        existing = set(
+            Enrollment.objects.filter(
+                user_id__in=list(timetables),
+                course_id__in=[course.pk for course in courses.values()],
+            ).values_list("course_id", "user_id")
+        )
+        for username, course_number in pairs:
+            student = students.get(username)
+            course = courses.get(course_number)
+            if student is None:
+                outcome = EnrollmentOutcome.UNKNOWN_STUDENT
+            elif course is None:
+                outcome = EnrollmentOutcome.UNKNOWN_COURSE
+            elif not can_take_courses(student):
+                outcome = EnrollmentOutcome.NOT_A_STUDENT
+            elif (course.pk, student.pk) in existing:
+                outcome = EnrollmentOutcome.ALREADY_ENROLLED
+            elif (course.pk, student.pk) in seen:
+                outcome = EnrollmentOutcome.DUPLICATE
+            elif timetables[student.pk] & course_masks[course.pk]:
+                outcome = EnrollmentOutcome.CONFLICT
+            else:
+                outcome = EnrollmentOutcome.ENROLLED
+                seen.add((course.pk, student.pk))
+                timetables[student.pk] |= course_masks[course.pk]
+                new_rows.append(Enrollment(course_id=course.pk, user_id=student.pk))
+                added[course].add(student.pk)
+            results.append(EnrollmentResult(username, course_number, outcome))
+
+        # No conflicts are ignored: with the students locked every pair was
+        # labelled from the rows as they are, so a clash would be a bug.
+        Enrollment.objects.bulk_create(new_rows)
+    for course, student_ids in added.items():
+        _send_post_add(course, student_ids)
+    return results
+
+
+def bulk_enroll(
+    pairs: Iterable[tuple[str, int]], batch_size: int = DEFAULT_BATCH_SIZE
+) -> list[EnrollmentResult]:
+    """
+    Enrolls many `(username, course_number)` pairs.
+    Each batch resolves its students, courses, existing memberships and
+    timetables with a few set-based queries and inserts the new memberships
+    with one `bulk_create`. Memberships and timetables are read from the
+    database with the students locked, so concurrent enrollments can neither
+    slip in a clash nor be reported as enrolled by this batch.
+    Returns one result per pair, in input order.
+    """
+    results = []
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            results.extend(_enroll_batch(batch))
+            batch = []
+    if batch:
+        results.extend(_enroll_batch(batch))
+    return results
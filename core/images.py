@@ -0,0 +1,207 @@
+from __future__ import annotations
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest side of the largest variant; bigger uploads are scaled down.
+MAX_DIMENSION = 2048
+# Longest side of each variant, largest first.
+VARIANT_SIZES = {"full": MAX_DIMENSION, "large": 1024, "medium": 256, "small": 64}
+JPEG_OPTIONS = {"quality": 85, "optimize": True, "progressive": True}
+PNG_OPTIONS = {"optimize": True}
+WEBP_OPTIONS = {"quality": 80, "method": 4}
+VARIANTS_DIRECTORY = "variants"
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def variant_path(image_hash: str, name: str, extension: str) -> str:
+    return f"{VARIANTS_DIRECTORY}/{image_hash[:2]}/{image_hash}/{name}.{extension}"
+
+
+def encode(image: Image.Image, format: str, options: dict) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def decode(data: bytes) -> tuple[Image.Image, bool]:
+    """Decodes `data` upright, at no more than `MAX_DIMENSION` where JPEG allows."""
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG can decode straight into a smaller scale, skipping most of the work.
+        image.draft("RGB", (MAX_DIMENSION, MAX_DIMENSION))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        return image.convert("RGBA" if has_alpha else "RGB"), has_alpha
+
+
+def output_format(has_alpha: bool) -> tuple[str, str, dict]:
+    """Returns the extension, Pillow format and save options of the variants."""
+    return ("png", "PNG", PNG_OPTIONS) if has_alpha else ("jpg", "JPEG", JPEG_OPTIONS)
+
+
+def render_variants(data: bytes) -> dict[str, tuple[str, bytes]]:
+    """
+    Decodes `data` once and returns `{"<size>": (extension, bytes), "<size>.webp":
+    ...}` for every entry of `VARIANT_SIZES`. Each size is scaled down from the
+    previous one, so only the first resize works on the full resolution.
+    """
+    image, has_alpha = decode(data)
+    extension, format, options = output_format(has_alpha)
+    variants = {}
+    for name, size in VARIANT_SIZES.items():
+        image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        variants[name] = (extension, encode(image, format, options))
+        variants[f"{name}.webp"] = ("webp", encode(image, "WEBP", WEBP_OPTIONS))
+    return variants
+
+
+def downscale_original(data: bytes) -> tuple[str, bytes] | None:
+    """
+    Returns `(extension, bytes)` of `data` scaled down to `MAX_DIMENSION` and
+    encoded like the variants, or `None` if it is no larger than that.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # Only reads the header.
+        if max(image.size) <= MAX_DIMENSION:
+            return None
+    image, has_alpha = decode(data)
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
+    extension, format, options = output_format(has_alpha)
+    return extension, encode(image, format, options)
+
+
+def stored_variants(image_hash: str) -> dict[str, str] | None:
+    """Returns the paths of the variants of `image_hash` if all were stored already."""
+    smallest = list(VARIANT_SIZES)[-1]
+    # The smallest WebP is written last, so its presence means all are there.
+    if not default_storage.exists(variant_path(image_hash, smallest, "webp")):
+        return None
+    extension = (
+        "png"
+        if default_storage.exists(variant_path(image_hash, smallest, "png"))
+        else "jpg"
+    )
+    paths = {}
+    for name in VARIANT_SIZES:
+        paths[name] = variant_path(image_hash, name, extension)
+        paths[f"{name}.webp"] = variant_path(image_hash, name, "webp")
+    return paths
+
+
+def store_variants(data: bytes) -> tuple[str, dict[str, str]]:
+    """
+    Stores the variants of `data` under the hash of its bytes and returns the
+    hash with `{"<size>": path}`. Images that were processed before are not
+    decoded again.
+    """
+    image_hash = content_hash(data)
+    paths = stored_variants(image_hash)
+    if paths is not None:
+        return image_hash, paths
+    paths = {}
+    for name, (extension, content) in render_variants(data).items():
+        path = variant_path(image_hash, name.split(".")[0], extension)
+        # Leftovers of an interrupted run would make the storage rename the file.
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        paths[name] = default_storage.save(path, ContentFile(content))
+    return image_hash, paths
+
+
+def delete_variants(image_hash: str, exclude_pk=None) -> None:
+    """Deletes the variants of `image_hash` unless another user still shows them."""
+    from core.models import User
+
+    if not image_hash:
+        return
+    if User.objects.filter(image_hash=image_hash).exclude(pk=exclude_pk).exists():
+        return
+    for path in (stored_variants(image_hash) or {}).values():
+        default_storage.delete(path)
+
+
+def process_user_image(pk) -> None:
+    """
+    Builds the variants of the current image of user `pk`. Uploads larger than
+    `MAX_DIMENSION` are replaced by a scaled-down copy first, so the original
+    is no bigger than the largest variant.
+    """
+    from core.models import User
+
+    user = User.objects.filter(pk=pk).only("pk", "image").first()
+    if user is None or not user.image:
+        return
+    name = user.image.name
+    with user.image.open("rb") as file:
+        data = file.read()
+    fields = {}
+    downscaled = downscale_original(data)
+    if downscaled is not None:
+        extension, data = downscaled
+        stem = os.path.splitext(os.path.basename(name))[0].rsplit("_", 1)[0]
+        fields["image"] = user.image.storage.save(
+            user.image.field.generate_filename(user, f"{stem}.{extension}"),
+            ContentFile(data),
+        )
+    image_hash, paths = store_variants(data)
+    # The filter on `image` skips users that uploaded another image meanwhile.
+    updated = User.objects.filter(pk=pk, image=name).update(
+        image_hash=image_hash, image_variants=paths, **fields
+    )
+    if fields:
+        user.image.storage.delete(name if updated else fields["image"])
+
+
+def _process_in_background(pk) -> None:
+    try:
+        process_user_image(pk)
+    except Exception:
+        logger.exception("Processing the image of user %s failed", pk)
+    finally:
+        connections.close_all()
+
+
+def submit(pk) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Pillow releases the GIL while decoding and encoding, so threads
+            # scale with cores.
+            _executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix="images"
+            )
+        _executor.submit(_process_in_background, pk)
+
+
+def schedule_user_image(pk) -> None:
+    """Processes the image of user `pk` on a worker thread once the transaction commits."""
+    transaction.on_commit(lambda: submit(pk))
+
+
+def finish_scheduled_images() -> None:
+    """
+    Waits for every image scheduled so far, e.g. before the process exits.
+    Later calls to `schedule_user_image` start new threads. Uploads lost to
+    a killed process keep an empty `image_hash`; `manage.py process_images`
+    builds them.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
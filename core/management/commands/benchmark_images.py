@@ -0,0 +1,56 @@
+from __future__ import annotations
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageFilter
+from core.images import render_variants
+
+
+def sample_image(width: int, height: int) -> bytes:
+    """Blurred noise, which compresses about as badly as a real photo."""
+    image = Image.merge(
+        "RGB", [Image.effect_noise((width, height), sigma) for sigma in (40, 60, 80)]
+    ).filter(ImageFilter.GaussianBlur(2))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def process_many(data: bytes, count: int) -> None:
+    for _ in range(count):
+        render_variants(data)
+
+
+class Command(BaseCommand):
+    help = "Measures how many uploads `core.images` turns into variants per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=20)
+        parser.add_argument("--width", type=int, default=4000)
+        parser.add_argument("--height", type=int, default=3000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        count = options["images"]
+        workers = options["workers"]
+        data = sample_image(options["width"], options["height"])
+        self.stdout.write(
+            f"{options['width']}x{options['height']} JPEG, {len(data) / 1024:.0f}KiB"
+        )
+
+        started = perf_counter()
+        process_many(data, count)
+        elapsed = perf_counter() - started
+        self.stdout.write(f"  1 worker: {count / elapsed:.2f} images/s per core")
+
+        started = perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(process_many, [data] * workers, [count] * workers))
+        elapsed = perf_counter() - started
+        total = count * workers
+        self.stdout.write(
+            f"{workers:>3} workers: {total / elapsed:.2f} images/s, "
+            f"{total / elapsed / workers:.2f} images/s per core"
+        )
@@ -0,0 +1,49 @@
+from __future__ import annotations
+from time import perf_counter
+import markdown as md
+from django.core.management.base import BaseCommand
+from core.utils import MARKDOWN_EXTENSIONS, markdown_cache, render_markdown
+
+SAMPLE = """# About me
+
+I teach **distributed systems** and *databases*.
+
+- Office hours: Monday 10:00 - 12:00
+- Room 204
+
+```python
+def greet(name):
+    return f"Hello {name}"
+```
+"""
+
+
+class Command(BaseCommand):
+    help = "Compares uncached, cold-cache and warm-cache Markdown rendering."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=1000)
+
+    def report(self, name: str, started: float, iterations: int) -> None:
+        elapsed = (perf_counter() - started) / iterations
+        self.stdout.write(f"{name:>10}: {elapsed * 1_000_000:.1f}us/render")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        texts = [f"{SAMPLE}\n{number}" for number in range(iterations)]
+
+        started = perf_counter()
+        for text in texts:
+            md.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+        self.report("uncached", started, iterations)
+
+        markdown_cache.clear()
+        started = perf_counter()
+        for text in texts[: markdown_cache.maxsize]:
+            render_markdown(text)
+        self.report("cold", started, min(iterations, markdown_cache.maxsize))
+
+        started = perf_counter()
+        for text in texts[: markdown_cache.maxsize]:
+            render_markdown(text)
+        self.report("warm", started, min(iterations, markdown_cache.maxsize))
@@ -0,0 +1,53 @@
+from __future__ import annotations
+from time import perf_counter
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from core.models import Course, Department
+from core.response_cache import build_response_cache, hit_rates, set_response_cache
+
+
+class Command(BaseCommand):
+    help = "Compares anonymous requests per second of the public pages with and without the response cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--backend", choices=["memory", "file"], default=settings.RESPONSE_CACHE
+        )
+
+    def urls(self) -> list[str]:
+        urls = ["/", "/?q=mon", "/departments/"]
+        department = Department.objects.first()
+        if department is not None:
+            urls.append(f"/departments/{department.department_number}/")
+        course = Course.objects.first()
+        if course is not None:
+            urls.append(f"/courses/{course.course_number}/")
+        return urls
+
+    def measure(self, client: Client, url: str, count: int) -> float:
+        client.get(url)
+        started = perf_counter()
+        for _ in range(count):
+            client.get(url)
+        return count / (perf_counter() - started)
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        client = Client()
+        self.stdout.write(f"{'url':<24}{'uncached':>12}{'cached':>12}{'speedup':>9}")
+        try:
+            for url in self.urls():
+                set_response_cache(False)
+                uncached = self.measure(client, url, count)
+                set_response_cache(build_response_cache(options["backend"]))
+                cached = self.measure(client, url, count)
+                self.stdout.write(
+                    f"{url:<24}{uncached:>10.0f}/s{cached:>10.0f}/s"
+                    f"{cached / uncached:>8.1f}x"
+                )
+        finally:
+            set_response_cache(None)
+        for view_name, counter in hit_rates().items():
+            self.stdout.write(f"{view_name}: {counter}")
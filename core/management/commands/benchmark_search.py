@@ -0,0 +1,56 @@
+from __future__ import annotations
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from core.models import Course
+from core.search import get_course_search_backend, search_courses
+
+
+def legacy_course_search(q: str, limit: int) -> list[Course]:
+    """The `icontains` chain `index_view` used before the search index existed."""
+    query = (
+        Q(name__icontains=q)
+        | Q(department__name__icontains=q)
+        | Q(teacher__username__icontains=q)
+        | Q(teacher__first_name__icontains=q)
+        | Q(teacher__last_name__icontains=q)
+        | Q(course_number__contains=q)
+        | Q(group_number__contains=q)
+        | Q(first_day__icontains=q)
+        | Q(second_day__icontains=q)
+    )
+    return list(
+        Course.objects.select_related("department", "teacher").filter(query)[:limit]
+    )
+
+
+class Command(BaseCommand):
+    help = "Compares the course search index against the legacy `icontains` query."
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", default=["mon", "math", "12"])
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=5)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        limit = options["limit"]
+        backend = get_course_search_backend()
+        started = perf_counter()
+        if hasattr(backend, "build"):
+            backend.build()
+        self.stdout.write(
+            f"{backend.__class__.__name__}: index built in "
+            f"{(perf_counter() - started) * 1000:.1f}ms "
+            f"over {Course.objects.count()} courses."
+        )
+        for q in options["queries"]:
+            for name, search in [
+                ("q-chain", legacy_course_search),
+                ("index", search_courses),
+            ]:
+                started = perf_counter()
+                for _ in range(iterations):
+                    search(q, limit)
+                elapsed = (perf_counter() - started) / iterations
+                self.stdout.write(f"{q!r:>12} {name:>8}: {elapsed * 1000:.3f}ms/query")
@@ -0,0 +1,26 @@
+from __future__ import annotations
+import time
+from django.core.management.base import BaseCommand
+from core.notifications import deliver_deferred_notifications
+
+
+class Command(BaseCommand):
+    help = "Writes the notifications of deferred fan-outs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue once and exit."
+        )
+        parser.add_argument("--interval", type=float, default=5.0)
+        parser.add_argument("--batch-size", type=int, default=10)
+
+    def handle(self, *args, **options):
+        while True:
+            handled = deliver_deferred_notifications(options["batch_size"])
+            if handled:
+                self.stdout.write(f"Delivered {handled} fan-outs.")
+                if handled == options["batch_size"]:
+                    continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from core.synthetic import DatasetSpec, SyntheticDataset, clear_dataset, dataset_exists
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a deterministic synthetic dataset of users, departments, "
+        "courses, intervals, enrollments and reservations and bulk-loads it."
+    )
+
+    def add_arguments(self, parser):
+        defaults = DatasetSpec()
+        parser.add_argument(
+            "--prefix",
+            default=defaults.prefix,
+            help="Usernames start with it, so datasets can be told apart and cleared.",
+        )
+        parser.add_argument("--departments", type=int, default=defaults.departments)
+        parser.add_argument("--teachers", type=int, default=defaults.teachers)
+        parser.add_argument("--students", type=int, default=defaults.students)
+        parser.add_argument("--courses", type=int, default=defaults.courses)
+        parser.add_argument(
+            "--intervals",
+            type=int,
+            default=defaults.intervals,
+            help="Intervals per teacher.",
+        )
+        parser.add_argument(
+            "--enrollments",
+            type=int,
+            default=defaults.enrollments,
+            help="Courses per student.",
+        )
+        parser.add_argument(
+            "--reservations",
+            type=int,
+            default=defaults.reservations,
+            help="Intervals per student.",
+        )
+        parser.add_argument("--capacity", type=int, default=defaults.capacity)
+        parser.add_argument("--password", default=defaults.password)
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+        parser.add_argument(
+            "--no-validate",
+            dest="validate",
+            action="store_false",
+            help="Skip running the model rules on every generated row.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete a dataset with the same prefix first.",
+        )
+
+    def handle(self, *args, **options):
+        spec = DatasetSpec(
+            **{
+                name: options[name]
+                for name in DatasetSpec.__dataclass_fields__
+                if name in options
+            }
+        )
+        if spec.teachers < 1 or spec.departments < 1:
+            raise CommandError("At least one teacher and one department are needed.")
+        if options["clear"]:
+            started = perf_counter()
+            clear_dataset(spec.prefix)
+            self.stdout.write(
+                f"Cleared {spec.prefix!r} in {perf_counter() - started:.2f}s."
+            )
+        elif dataset_exists(spec.prefix):
+            raise CommandError(
+                f"A dataset with the prefix {spec.prefix!r} exists; use --clear or "
+                "another --prefix."
+            )
+        started = perf_counter()
+        writers = SyntheticDataset(spec).load()
+        elapsed = perf_counter() - started
+        for name, writer in writers.items():
+            self.stdout.write(
+                f"{name:>13}: {writer.rows:>9} rows in {writer.seconds:7.2f}s "
+                f"({writer.rows_per_second:,.0f} rows/s)"
+            )
+        rows = sum(writer.rows for writer in writers.values())
+        self.stdout.write(
+            f"Loaded {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s "
+            "including generation)."
+        )
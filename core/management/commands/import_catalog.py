@@ -0,0 +1,69 @@
+from __future__ import annotations
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from core.catalog import (
+    DEFAULT_BATCH_SIZE,
+    FORMATS,
+    detect_format,
+    import_courses,
+    import_intervals,
+    read_records,
+)
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a CSV, JSON or NDJSON catalog of courses or intervals. "
+        "Course columns: name, course_number, group_number, teacher (username), "
+        "department (number), first_day, second_day, start_time, end_time. "
+        "Interval columns: teacher (username), day, start_time, end_time, capacity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["courses", "intervals"])
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=sorted(set(FORMATS.values())),
+            help="By default taken from the file extension.",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--user",
+            help="Username recorded as having added the courses; the teacher by default.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            format = options["format"] or detect_format(options["path"])
+        except ValueError as e:
+            raise CommandError(e)
+        added_by = None
+        if options["user"]:
+            added_by = User.objects.filter(username=options["user"]).first()
+            if added_by is None:
+                raise CommandError(f"No user {options['user']!r}.")
+        started = perf_counter()
+        with open(options["path"], encoding="utf-8-sig", newline="") as file:
+            records = read_records(file, format)
+            if options["kind"] == "courses":
+                report = import_courses(records, added_by, options["batch_size"])
+            else:
+                report = import_intervals(records, options["batch_size"])
+        elapsed = perf_counter() - started
+        for error in report.errors:
+            self.stderr.write(
+                f"row {error.row}: {error.outcome.value}: {error.message}"
+            )
+        rows = report.created + len(report.errors)
+        self.stdout.write(
+            f"Created {report.created} {options['kind']}, rejected "
+            f"{len(report.errors)} rows, in {elapsed:.2f}s "
+            f"({rows / elapsed:,.0f} rows/s)."
+        )
+        if not report.complete:
+            raise CommandError(
+                f"The catalog breaks off at row {report.errors[-1].row}; "
+                "the rows before it were imported."
+            )
@@ -0,0 +1,27 @@
+from __future__ import annotations
+from django.core.management.base import BaseCommand
+from core.images import process_user_image
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Builds the missing image variants, e.g. after a restart or for old uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Rebuild users that have variants too."
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            users = users.filter(image_hash="")
+        processed = 0
+        for pk in users.values_list("pk", flat=True).iterator():
+            try:
+                process_user_image(pk)
+            except Exception as e:
+                self.stderr.write(f"User {pk}: {e}")
+            else:
+                processed += 1
+        self.stdout.write(f"Processed the images of {processed} users.")
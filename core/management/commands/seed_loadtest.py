@@ -0,0 +1,63 @@
+from __future__ import annotations
+import json
+from core.management.commands.generate_dataset import Command as GenerateCommand
+from core.models import Course, Department, Interval, User
+
+PREFIX = "loadtest"
+
+
+class Command(GenerateCommand):
+    help = (
+        "Generates a load-testing dataset with `generate_dataset` and writes "
+        "the manifest `loadtest/` replays against."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(
+            prefix=PREFIX,
+            password=PREFIX,
+            departments=10,
+            teachers=50,
+            students=2000,
+            courses=200,
+            capacity=50,
+        )
+        parser.add_argument("--output", default="loadtest/dataset.json")
+
+    def handle(self, *args, **options):
+        super().handle(*args, **options)
+        prefix = options["prefix"]
+        teachers = User.objects.filter(username__startswith=f"{prefix}-teacher-")
+        courses = Course.objects.filter(teacher__in=teachers)
+        manifest = {
+            "password": options["password"],
+            "teachers": list(teachers.values_list("username", flat=True)),
+            "students": list(
+                User.objects.filter(
+                    username__startswith=f"{prefix}-student-"
+                ).values_list("username", flat=True)
+            ),
+            "departments": list(
+                Department.objects.filter(manager__in=teachers).values_list(
+                    "department_number", flat=True
+                )
+            ),
+            "courses": list(courses.values_list("course_number", flat=True)),
+            "intervals": [
+                {"pk": pk, "teacher": username}
+                for pk, username in Interval.objects.filter(
+                    teacher__in=teachers
+                ).values_list("pk", "teacher__username")
+            ],
+            # Prefixes of the course names, as typed into the search box.
+            "queries": sorted(
+                {
+                    name.split()[0].lower()[:4]
+                    for name in courses.values_list("name", flat=True)
+                }
+            ),
+        }
+        with open(options["output"], "w") as file:
+            json.dump(manifest, file)
+        self.stdout.write(f"Manifest: {options['output']}")
@@ -0,0 +1,33 @@
+from __future__ import annotations
+import time
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from core.utils import EMAIL_BATCH_SIZE, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Delivers queued outbound emails over one persistent SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue once and exit."
+        )
+        parser.add_argument("--interval", type=float, default=5.0)
+        parser.add_argument("--batch-size", type=int, default=EMAIL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        try:
+            while True:
+                connection.open()
+                sent = send_queued_emails(connection, options["batch_size"])
+                if sent:
+                    self.stdout.write(f"Handled {sent} emails.")
+                    # A full batch means more emails may already be due.
+                    if sent == options["batch_size"]:
+                        continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        finally:
+            connection.close()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from core.models import Interval, User
+from core.reservations import Reservation, reserve_interval
+
+
+class Command(BaseCommand):
+    help = (
+        "Reserves one interval from many threads at once and checks that "
+        "its capacity is never exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--capacity", type=int, default=50)
+
+    def reserve(self, interval_pk: int, student: User) -> str:
+        try:
+            interval = Interval.objects.get(pk=interval_pk)
+            return reserve_interval(interval, student).value
+        except OperationalError:
+            # SQLite answers concurrent writers with "database is locked".
+            return "error"
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        prefix = "stress-reservation"
+        teacher = User.objects.create(username=f"{prefix}-teacher", is_staff=True)
+        User.objects.bulk_create(
+            User(username=f"{prefix}-{number}") for number in range(options["students"])
+        )
+        students = list(
+            User.objects.filter(username__startswith=f"{prefix}-", is_staff=False)
+        )
+        interval = Interval.objects.create(
+            teacher=teacher,
+            day="Monday",
+            capacity=options["capacity"],
+            start_time=datetime.time(8),
+            end_time=datetime.time(10),
+        )
+        try:
+            # Every student tries twice to exercise the duplicate path as well.
+            attempts = students * 2
+            started = perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                outcomes = Counter(
+                    executor.map(
+                        lambda student: self.reserve(interval.pk, student), attempts
+                    )
+                )
+            elapsed = perf_counter() - started
+            interval.refresh_from_db()
+            seats = Reservation.objects.filter(interval_id=interval.pk).count()
+            self.stdout.write(
+                f"{len(attempts)} attempts from {options['threads']} threads "
+                f"in {elapsed:.2f}s ({len(attempts) / elapsed:.0f} reservations/s)."
+            )
+            for outcome, count in sorted(outcomes.items()):
+                self.stdout.write(f"{outcome:>17}: {count}")
+            self.stdout.write(
+                f"capacity={interval.capacity} reserved_count="
+                f"{interval.reserved_count} seats={seats}"
+            )
+            if seats > interval.capacity or seats != interval.reserved_count:
+                raise CommandError("Interval was over-booked or lost count.")
+        finally:
+            interval.delete()
+            User.objects.filter(username__startswith=f"{prefix}-").delete()
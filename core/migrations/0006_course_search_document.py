@@ -0,0 +1,57 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:52
+
+from django.db import migrations, models
+
+
+def populate_search_documents(apps, schema_editor):
+    Course = apps.get_model("core", "Course")
+    courses = list(Course.objects.select_related("department", "teacher"))
+    for course in courses:
+        values = [
+            course.name,
+            course.department.name,
+            course.teacher.username,
+            course.teacher.first_name,
+            course.teacher.last_name,
+            course.course_number,
+            course.group_number,
+            course.first_day,
+            course.second_day,
+        ]
+        course.search_document = " ".join(
+            str(value).lower() for value in values if value is not None
+        )
+    Course.objects.bulk_update(courses, ["search_document"], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS core_course_search_trgm ON core_course "
+        "USING gin (UPPER(search_document) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS core_course_search_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_interval_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
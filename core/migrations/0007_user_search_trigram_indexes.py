@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+USER_SEARCH_COLUMNS = ["username", "first_name", "last_name"]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in USER_SEARCH_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS core_user_{column}_trgm ON core_user "
+            f"USING gin (UPPER({column}) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in USER_SEARCH_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS core_user_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_course_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interval',
+            index=models.Index(fields=['teacher', 'day', 'start_time'], name='interval_teacher_day_start'),
+        ),
+    ]
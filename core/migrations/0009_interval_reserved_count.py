@@ -0,0 +1,27 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reserved_count(apps, schema_editor):
+    Interval = apps.get_model("core", "Interval")
+    intervals = Interval.objects.annotate(seats=Count("reserving_students"))
+    for interval in intervals.filter(seats__gt=0):
+        Interval.objects.filter(pk=interval.pk).update(reserved_count=interval.seats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_interval_teacher_day_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interval',
+            name='reserved_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reserved_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:00
+
+import markdown
+from django.db import migrations, models
+
+
+def render_existing_markdown(apps, schema_editor):
+    engine = markdown.Markdown(extensions=["markdown.extensions.fenced_code"])
+    for model_name, field in [("User", "bio"), ("Department", "description")]:
+        model = apps.get_model("core", model_name)
+        rows = model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+        for pk, text in rows.values_list("pk", field):
+            html = engine.reset().convert(text)
+            model.objects.filter(pk=pk).update(**{f"{field}_html": html})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_interval_reserved_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='bio_html',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(render_existing_markdown, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,37 @@
 from __future__ import annotations
-import os
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.dispatch import receiver
-from core.utils import uuid_namer
+from core.images import delete_variants, schedule_user_image
+from core.utils import render_markdown, uuid_namer
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from notifications.signals import notify
+from django.contrib.contenttypes.models import ContentType
+
+
+def render_markdown_field(instance: models.Model, name: str, save_kwargs: dict):
+    """Fills the `<name>_html` column of `instance` unless `name` is not being saved."""
+    update_fields = save_kwargs.get("update_fields")
+    if update_fields is not None and name not in update_fields:
+        return
+    text = getattr(instance, name)
+    setattr(instance, f"{name}_html", render_markdown(text) if text else None)
+    if update_fields is not None:
+        save_kwargs["update_fields"] = {*update_fields, f"{name}_html"}
 
 
 class User(AbstractUser):
     image = models.ImageField(blank=True, null=True, upload_to=uuid_namer)
     bio = models.CharField(blank=True, null=True, max_length=1024)
     gender = models.CharField(max_length=16, default="Other")
+    # `bio` rendered from Markdown, kept up to date by `save()`.
+    bio_html = models.TextField(blank=True, null=True, editable=False)
+    # Resized copies of `image`, filled in the background by `core.images`.
+    image_hash = models.CharField(
+        max_length=64, blank=True, default="", db_index=True, editable=False
+    )
+    image_variants = models.JSONField(blank=True, default=dict, editable=False)
 
     def __str__(self) -> str:
         role = "Student"
@@ -24,10 +43,70 @@ class User(AbstractUser):
         if self.gender.lower() not in ["male", "female", "other"]:
             raise ValidationError(_("Invalid gender was selected."))
 
+    # The fields `core.search` indexes users and their courses by.
+    SEARCH_FIELDS = ("username", "first_name", "last_name", "is_staff")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_image()
+        instance.remember_search_values()
+        return instance
+
+    def remember_search_values(self) -> None:
+        """Records the indexed fields, so saves that keep them skip reindexing."""
+        if self.get_deferred_fields() & set(self.SEARCH_FIELDS):
+            return
+        self._loaded_search_values = self.search_values()
+
+    def search_values(self) -> dict:
+        return {name: getattr(self, name) for name in self.SEARCH_FIELDS}
+
+    def search_values_changed(self, names) -> bool:
+        """Whether a save changed any of the `SEARCH_FIELDS` `names` since loading."""
+        loaded = getattr(self, "_loaded_search_values", None)
+        if loaded is None:
+            return True
+        return any(loaded[name] != getattr(self, name) for name in names)
+
+    def remember_loaded_image(self) -> None:
+        """Records the stored image so a later `save()` can tell whether it changed."""
+        deferred = self.get_deferred_fields()
+        if "image" in deferred or "image_hash" in deferred:
+            return
+        self._loaded_image_name = self.image.name or ""
+        self._loaded_image_hash = self.image_hash
+
+    def save(self, *args, **kwargs):
+        render_markdown_field(self, "bio", kwargs)
+        # An uncommitted file is a fresh upload; its variants are built later.
+        new_image = bool(self.image) and not self.image._committed
+        if new_image or (not self.image and self.image_hash):
+            self.image_hash = ""
+            self.image_variants = {}
+        elif not self._state.adding and kwargs.get("update_fields") is None:
+            # The variants, and the scaled-down upload, are written by a
+            # background `UPDATE`, so saving a stale instance must not
+            # overwrite them.
+            background = {"image_hash", "image_variants"}
+            if self.image.name == getattr(self, "_loaded_image_name", None):
+                background.add("image")
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in background
+            ]
+        super().save(*args, **kwargs)
+        self.remember_search_values()
+        if new_image:
+            schedule_user_image(self.pk)
+
 
 class Department(models.Model):
     name = models.CharField(max_length=128)
     description = models.TextField(blank=True, null=True)
+    # `description` rendered from Markdown, kept up to date by `save()`.
+    description_html = models.TextField(blank=True, null=True, editable=False)
     department_number = models.IntegerField(unique=True)
     manager = models.ForeignKey(
         User, related_name="departments_owned", on_delete=models.CASCADE
@@ -39,6 +118,10 @@ class Department(models.Model):
     def __repr__(self) -> str:
         return f"Department({self.name[:5]})"
 
+    def save(self, *args, **kwargs):
+        render_markdown_field(self, "description", kwargs)
+        super().save(*args, **kwargs)
+
 
 class Course(models.Model):
     name = models.CharField(max_length=128)
@@ -58,10 +141,21 @@ class Course(models.Model):
     end_time = models.TimeField()
     first_day = models.CharField(max_length=32)
     second_day = models.CharField(max_length=32)
+    search_document = models.TextField(blank=True, default="", editable=False)
+
+    # The department the row was loaded with, so moving a course can refresh
+    # the cached course list of the old department too.
+    _loaded_department_id = None
 
     def __str__(self) -> str:
         return f"Course({self.name[:10]}...)"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_department_id = instance.__dict__.get("department_id")
+        return instance
+
     def clean(self):
         valid_days = ["monday", "tuesday", "wednesday", "thursday", "friday"]
         if self.start_time >= self.end_time:
@@ -84,9 +178,19 @@ class Interval(models.Model):
     day = models.CharField(max_length=16)
     reserving_students = models.ManyToManyField(User, related_name="reserved_intervals")
     capacity = models.IntegerField()
+    # Denormalized number of `reserving_students`, maintained by `core.reservations`.
+    reserved_count = models.IntegerField(default=0, editable=False)
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["teacher", "day", "start_time"],
+                name="interval_teacher_day_start",
+            )
+        ]
+
     def __str__(self) -> str:
         return f"{self.day} | {self.start_time} - {self.end_time} | {self.capacity} | {self.teacher.first_name} {self.teacher.last_name}"
 
@@ -99,13 +203,78 @@ class Interval(models.Model):
             "friday",
         ]:
             raise ValidationError(_("Interval should be held in valid working days."))
-        if self.pk and self.capacity < self.reserving_students.count():
+        if self.pk and self.capacity < self.reserved_count:
             raise ValidationError(
                 _("Capacity can not be less than already reserving students.")
             )
         if self.start_time >= self.end_time:
             raise ValidationError(_("Course should start before it ends!"))
 
+    def save(self, *args, **kwargs):
+        # `reserved_count` is only ever written with atomic `UPDATE`s,
+        # so saving a stale instance must not overwrite it.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "reserved_count"
+            ]
+        super().save(*args, **kwargs)
+
+
+class OutboundEmail(models.Model):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed")]
+
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="outbound_email_due"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject[:20]} -> {', '.join(self.recipients)} | {self.status}"
+
+
+class NotificationFanout(models.Model):
+    """Notifications for a large audience, written later by `deliver_notifications`."""
+
+    actor_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    actor_object_id = models.CharField(max_length=255)
+    verb = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    recipients = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.verb} -> {len(self.recipients)} recipients"
+
+
+def delete_image_on_commit(instance: User, name: str, image_hash: str) -> None:
+    """Deletes the image file `name` and its variants once the transaction commits."""
+    storage = instance.image.storage
+
+    def delete():
+        if name:
+            storage.delete(name)
+        delete_variants(image_hash, exclude_pk=instance.pk)
+
+    transaction.on_commit(delete)
+
 
 @receiver(models.signals.post_delete, sender=User)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
@@ -113,9 +282,8 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     Deletes image from filesystem
     when corresponding `User` object is deleted.
     """
-    if instance.image:
-        if os.path.isfile(instance.image.path):
-            os.remove(instance.image.path)
+    if instance.image or instance.image_hash:
+        delete_image_on_commit(instance, instance.image.name, instance.image_hash)
 
 
 @receiver(models.signals.pre_save, sender=User)
@@ -125,32 +293,21 @@ def auto_delete_file_on_change(sender, instance, **kwargs):
     when corresponding `User` object is updated
     with new image.
     """
-    if not instance.pk:
-        return False
-
-    try:
-        old_file = User.objects.get(pk=instance.pk).image
-    except User.DoesNotExist:
-        return False
-
-    try:
-        new_file = instance.image
-        if not old_file == new_file:
-            if os.path.isfile(old_file.path):
-                os.remove(old_file.path)
-    except Exception as e:
-        # TODO: These two lines should be logged.
-        print(e.__class__)
-        print(e)
-        pass
-
-
-@receiver(
-    models.signals.pre_delete, sender=Interval, dispatch_uid="interval_delete_signal"
-)
-def notify_reserving_student_on_interval_delete(sender, instance, *args, **kwargs):
-    description = f"Teacher {instance.teacher.username} deleted Interval on {instance}"
-    for student in instance.reserving_students.all():
-        notify.send(
-            instance.teacher, recipient=student, verb="Message", description=description
+    # Compares against the names recorded by `User.from_db`, so no query is needed.
+    if instance._state.adding or not hasattr(instance, "_loaded_image_name"):
+        return
+    old_name = instance._loaded_image_name
+    old_hash = instance._loaded_image_hash
+    name_changed = old_name != (instance.image.name or "")
+    hash_changed = old_hash != instance.image_hash
+    if name_changed or hash_changed:
+        delete_image_on_commit(
+            instance,
+            old_name if name_changed else "",
+            old_hash if hash_changed else "",
         )
+
+
+@receiver(models.signals.post_save, sender=User)
+def remember_saved_image(sender, instance, **kwargs):
+    instance.remember_loaded_image()
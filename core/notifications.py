@@ -0,0 +1,184 @@
+from __future__ import annotations
+from collections.abc import Iterable
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import signals
+from django.dispatch import receiver
+from django.utils import timezone
+from notifications.models import Notification
+from core.models import Interval, NotificationFanout
+
+Reservation = Interval.reserving_students.through
+
+# Audiences above this size are written by the `deliver_notifications` worker.
+FANOUT_INLINE_LIMIT = 200
+FANOUT_BATCH_SIZE = 1000
+
+UNREAD_CACHE_KEY = "notifications:unread:{}"
+# Bounds staleness after bulk `update()`s, which send no signals.
+UNREAD_CACHE_TIMEOUT = 60 * 5
+RECENT_NOTIFICATIONS = 5
+
+
+def invalidate_unread(user_ids: Iterable[int]) -> None:
+    cache.delete_many([UNREAD_CACHE_KEY.format(user_id) for user_id in user_ids])
+
+
+def get_unread_summary(user) -> dict:
+    """
+    Returns `{"count": ..., "recent": [{"actor": ..., "description": ...}]}`
+    for the unread notifications of `user`, from the cache when possible.
+    """
+    key = UNREAD_CACHE_KEY.format(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        unread = Notification.objects.filter(recipient_id=user.pk, unread=True)
+        count = unread.count()
+        recent = (
+            unread.order_by("-timestamp").prefetch_related("actor")[
+                :RECENT_NOTIFICATIONS
+            ]
+            if count
+            else []
+        )
+        summary = {
+            "count": count,
+            "recent": [
+                {
+                    "actor": str(notification.actor),
+                    "description": notification.description,
+                }
+                for notification in recent
+            ],
+        }
+        cache.set(key, summary, UNREAD_CACHE_TIMEOUT)
+    return summary
+
+
+def mark_notifications_read(user_id: int, notification_ids: Iterable[int]) -> int:
+    """Marks the given notifications of `user_id` read with one `UPDATE`."""
+    notification_ids = list(notification_ids)
+    if not notification_ids:
+        return 0
+    updated = Notification.objects.filter(
+        recipient_id=user_id, pk__in=notification_ids, unread=True
+    ).update(unread=False)
+    invalidate_unread([user_id])
+    return updated
+
+
+def build_notifications(
+    actor_content_type: ContentType,
+    actor_object_id,
+    recipient_ids: Iterable[int],
+    verb: str,
+    description: str | None = None,
+) -> list[Notification]:
+    timestamp = timezone.now()
+    return [
+        Notification(
+            recipient_id=recipient_id,
+            actor_content_type=actor_content_type,
+            actor_object_id=str(actor_object_id),
+            verb=verb,
+            description=description,
+            timestamp=timestamp,
+        )
+        for recipient_id in recipient_ids
+    ]
+
+
+def dispatch_notifications(
+    actor: models.Model,
+    recipient_ids: Iterable[int],
+    verb: str,
+    description: str | None = None,
+    defer: bool | None = None,
+) -> int:
+    """
+    Notifies every recipient once, writing all rows with `bulk_create`
+    instead of one `notify.send` per recipient.
+    With `defer` (by default for more than `FANOUT_INLINE_LIMIT` recipients)
+    only a `NotificationFanout` row is written and the worker expands it.
+    Returns the number of recipients.
+    """
+    recipient_ids = sorted(set(recipient_ids))
+    if not recipient_ids:
+        return 0
+    if defer is None:
+        defer = len(recipient_ids) > FANOUT_INLINE_LIMIT
+    actor_content_type = ContentType.objects.get_for_model(actor)
+    if defer:
+        NotificationFanout.objects.create(
+            actor_content_type=actor_content_type,
+            actor_object_id=str(actor.pk),
+            verb=verb,
+            description=description,
+            recipients=recipient_ids,
+        )
+    else:
+        Notification.objects.bulk_create(
+            build_notifications(
+                actor_content_type, actor.pk, recipient_ids, verb, description
+            ),
+            batch_size=FANOUT_BATCH_SIZE,
+        )
+        invalidate_unread(recipient_ids)
+    return len(recipient_ids)
+
+
+def deliver_deferred_notifications(limit: int = 10) -> int:
+    """Expands up to `limit` pending fan-outs and returns how many were handled."""
+    with transaction.atomic():
+        fanouts = list(
+            NotificationFanout.objects.select_for_update(skip_locked=True).order_by(
+                "pk"
+            )[:limit]
+        )
+        for fanout in fanouts:
+            Notification.objects.bulk_create(
+                build_notifications(
+                    fanout.actor_content_type,
+                    fanout.actor_object_id,
+                    fanout.recipients,
+                    fanout.verb,
+                    fanout.description,
+                ),
+                batch_size=FANOUT_BATCH_SIZE,
+            )
+            invalidate_unread(fanout.recipients)
+        NotificationFanout.objects.filter(pk__in=[f.pk for f in fanouts]).delete()
+    return len(fanouts)
+
+
+def notify_interval_deleted(interval: Interval) -> int:
+    """
+    Tells the students who reserved `interval` that it is being deleted.
+    Runs at most once per instance, so views may call it before `delete()`.
+    """
+    if getattr(interval, "_deletion_notified", False):
+        return 0
+    interval._deletion_notified = True
+    student_ids = Reservation.objects.filter(interval_id=interval.pk).values_list(
+        "user_id", flat=True
+    )
+    teacher = interval.teacher
+    return dispatch_notifications(
+        teacher,
+        student_ids,
+        verb="Message",
+        description=f"Teacher {teacher.username} deleted Interval on {interval}",
+    )
+
+
+@receiver(signals.pre_delete, sender=Interval, dispatch_uid="interval_delete_signal")
+def notify_reserving_student_on_interval_delete(sender, instance, *args, **kwargs):
+    notify_interval_deleted(instance)
+
+
+@receiver(signals.post_save, sender=Notification, dispatch_uid="unread_on_save")
+@receiver(signals.post_delete, sender=Notification, dispatch_uid="unread_on_delete")
+def invalidate_unread_on_change(sender, instance, **kwargs):
+    # Covers `notify.send` and `Notification.mark_as_read()`.
+    invalidate_unread([instance.recipient_id])
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_CLAUSE_PATTERN = re.compile(r"IN \((?:%s, )*%s\)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# `{"<app_name>:<url_name>": max_queries}`, filled by `declare_query_budgets`.
+QUERY_BUDGETS: dict[str, int] = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def declare_query_budgets(app_name: str, budgets: dict[str, int]) -> None:
+    """Declares the maximum number of SQL queries each URL name of `app_name` may issue."""
+    for url_name, budget in budgets.items():
+        QUERY_BUDGETS[f"{app_name}:{url_name}"] = budget
+
+
+def fingerprint(sql: str) -> str:
+    """Normalizes `sql` so the same query with other parameters compares equal."""
+    sql = IN_CLAUSE_PATTERN.sub("IN (...)", sql)
+    return WHITESPACE_PATTERN.sub(" ", sql).strip()
+
+
+@dataclass
+class QueryProfile:
+    count: int = 0
+    duration: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self) -> dict[str, int]:
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    @property
+    def duplicate_count(self) -> int:
+        return sum(count - 1 for count in self.duplicates.values())
+
+
+@contextmanager
+def profile_queries():
+    """Records every query run on any database connection inside the block."""
+    profile = QueryProfile()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+        yield profile
+
+
+def get_query_budget(request) -> tuple[str | None, int | None]:
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.url_name:
+        return None, None
+    view_name = match.view_name
+    return view_name, QUERY_BUDGETS.get(view_name)
+
+
+def assert_within_query_budget(response) -> None:
+    """
+    Test helper raising `QueryBudgetExceeded` if the view behind `response`
+    went over its budget. Needs `QUERY_PROFILER` to be enabled.
+    """
+    profile = getattr(response, "query_profile", None)
+    budget = getattr(response, "query_budget", None)
+    if profile is None or budget is None:
+        return
+    if profile.count > budget:
+        duplicates = "\n".join(
+            f"{count}x {sql}" for sql, count in profile.duplicates.items()
+        )
+        raise QueryBudgetExceeded(
+            f"{response.query_view_name} ran {profile.count} queries, "
+            f"its budget is {budget}.\nDuplicated queries:\n{duplicates or '-'}"
+        )
+
+
+class QueryProfilerMiddleware:
+    """
+    Counts the SQL queries, their total time and duplicated query fingerprints
+    of every request. The numbers are sent as `X-DB-*` response headers and
+    logged, and with `QUERY_BUDGET_STRICT` a view going over the budget of its
+    URL name raises `QueryBudgetExceeded`.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with profile_queries() as profile:
+            response = self.get_response(request)
+        view_name, budget = get_query_budget(request)
+        response.query_profile = profile
+        response.query_budget = budget
+        response.query_view_name = view_name
+        response["X-DB-Query-Count"] = str(profile.count)
+        response["X-DB-Query-Time-Ms"] = f"{profile.duration * 1000:.2f}"
+        response["X-DB-Duplicate-Queries"] = str(profile.duplicate_count)
+        if budget is not None:
+            response["X-DB-Query-Budget"] = str(budget)
+        over_budget = budget is not None and profile.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            "%s %s view=%s queries=%d budget=%s time=%.2fms duplicates=%d",
+            request.method,
+            request.path,
+            view_name,
+            profile.count,
+            budget,
+            profile.duration * 1000,
+            profile.duplicate_count,
+        )
+        if over_budget and settings.QUERY_BUDGET_STRICT:
+            assert_within_query_budget(response)
+        return response
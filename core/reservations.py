@@ -0,0 +1,148 @@
+from __future__ import annotations
+import enum
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value, signals
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from core.models import Interval, User
+from core.timetable import cached_conflict, interval_mask, lock_timetables
+
+Reservation = Interval.reserving_students.through
+
+
+class ReservationOutcome(enum.Enum):
+    RESERVED = "reserved"
+    ALREADY_RESERVED = "already_reserved"
+    FULL = "full"
+    CONFLICT = "conflict"
+
+
+class ReleaseOutcome(enum.Enum):
+    RELEASED = "released"
+    NOT_RESERVED = "not_reserved"
+
+
+def _send_m2m_changed(interval: Interval, action: str, student: User) -> None:
+    # The engine writes the through table directly, so it announces
+    # successful changes the way `reserving_students.add()` would.
+    interval._reservation_engine = True
+    try:
+        signals.m2m_changed.send(
+            sender=Reservation,
+            instance=interval,
+            action=action,
+            reverse=False,
+            model=User,
+            pk_set={student.pk},
+            using=router.db_for_write(Reservation),
+        )
+    finally:
+        del interval._reservation_engine
+
+
+def _clash_outcome(interval: Interval, student: User) -> ReservationOutcome:
+    # An interval always collides with itself, so rule that out first.
+    if Reservation.objects.filter(interval_id=interval.pk, user_id=student.pk).exists():
+        return ReservationOutcome.ALREADY_RESERVED
+    return ReservationOutcome.CONFLICT
+
+
+def reserve_interval(interval: Interval, student: User) -> ReservationOutcome:
+    """
+    Reserves a seat of `interval` for `student`.
+    The capacity check and the seat count increment are a single conditional
+    `UPDATE`, which also locks the interval row until the membership row is
+    inserted, so concurrent requests can never over-book an interval.
+    Intervals clashing with the student's timetable, checked against the
+    database with the student's row locked, are refused.
+    """
+    mask = interval_mask(interval)
+    if cached_conflict(student, mask):
+        return _clash_outcome(interval, student)
+    try:
+        with transaction.atomic():
+            if lock_timetables([student.pk])[student.pk] & mask:
+                return _clash_outcome(interval, student)
+            seated = Interval.objects.filter(
+                pk=interval.pk, reserved_count__lt=F("capacity")
+            ).update(reserved_count=F("reserved_count") + 1)
+            if not seated:
+                if Reservation.objects.filter(
+                    interval_id=interval.pk, user_id=student.pk
+                ).exists():
+                    return ReservationOutcome.ALREADY_RESERVED
+                return ReservationOutcome.FULL
+            Reservation.objects.create(interval_id=interval.pk, user_id=student.pk)
+    except IntegrityError:
+        # The unique (interval, user) constraint rejected a second seat;
+        # leaving the atomic block rolled the increment back.
+        return ReservationOutcome.ALREADY_RESERVED
+    interval.reserved_count += 1
+    _send_m2m_changed(interval, "post_add", student)
+    return ReservationOutcome.RESERVED
+
+
+def release_interval(interval: Interval, student: User) -> ReleaseOutcome:
+    """Gives back the seat `student` holds on `interval`, if any."""
+    with transaction.atomic():
+        deleted, _ = Reservation.objects.filter(
+            interval_id=interval.pk, user_id=student.pk
+        ).delete()
+        if not deleted:
+            return ReleaseOutcome.NOT_RESERVED
+        Interval.objects.filter(pk=interval.pk).update(
+            reserved_count=F("reserved_count") - 1
+        )
+    interval.reserved_count -= 1
+    _send_m2m_changed(interval, "post_remove", student)
+    return ReleaseOutcome.RELEASED
+
+
+def sync_reserved_counts(interval_ids) -> None:
+    """Recomputes `Interval.reserved_count` from the through table."""
+    seats = (
+        Reservation.objects.filter(interval_id=OuterRef("pk"))
+        .values("interval_id")
+        .annotate(seats=Count("pk"))
+        .values("seats")
+    )
+    Interval.objects.filter(pk__in=interval_ids).update(
+        reserved_count=Coalesce(Subquery(seats), Value(0))
+    )
+
+
+@receiver(signals.m2m_changed, sender=Reservation, dispatch_uid="reserved_count_sync")
+def sync_reserved_count_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keeps `reserved_count` right when reservations change outside the engine."""
+    if getattr(instance, "_reservation_engine", False):
+        return
+    if action == "pre_clear" and reverse:
+        instance._cleared_interval_ids = list(
+            instance.reserved_intervals.values_list("pk", flat=True)
+        )
+        return
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if action == "post_clear":
+        interval_ids = (
+            instance.__dict__.pop("_cleared_interval_ids", [])
+            if reverse
+            else [instance.pk]
+        )
+    else:
+        interval_ids = pk_set if reverse else [instance.pk]
+    sync_reserved_counts(interval_ids)
+
+
+@receiver(signals.pre_delete, sender=User, dispatch_uid="reserved_count_user_delete")
+def remember_reserved_intervals(sender, instance, **kwargs):
+    instance._reserved_interval_ids = list(
+        instance.reserved_intervals.values_list("pk", flat=True)
+    )
+
+
+@receiver(signals.post_delete, sender=User, dispatch_uid="reserved_count_user_sync")
+def sync_reserved_count_on_user_delete(sender, instance, **kwargs):
+    interval_ids = instance.__dict__.pop("_reserved_interval_ids", [])
+    if interval_ids:
+        sync_reserved_counts(interval_ids)
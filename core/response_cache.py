@@ -0,0 +1,151 @@
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import HttpResponse
+from core.utils import LRUCache
+from core.versions import get_version
+
+# Per-view `{"hits": ..., "misses": ...}` of this process.
+stats: dict[str, Counter] = {}
+_stats_lock = threading.Lock()
+
+
+class MemoryResponseCache:
+    """Per-process LRU of responses; entries also expire after `timeout` seconds."""
+
+    def __init__(self, maxsize: int, timeout: int):
+        self.entries = LRUCache(maxsize)
+        self.timeout = timeout
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            self.entries.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value) -> None:
+        self.entries.set(key, (time.monotonic() + self.timeout, value))
+
+
+class FileResponseCache:
+    """Responses pickled to `location`, shared by every worker on the host."""
+
+    def __init__(self, location: str, maxsize: int, timeout: int):
+        self.files = FileBasedCache(
+            location, {"TIMEOUT": timeout, "OPTIONS": {"MAX_ENTRIES": maxsize}}
+        )
+
+    def get(self, key: str):
+        return self.files.get(key)
+
+    def set(self, key: str, value) -> None:
+        self.files.set(key, value)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Returns the backend chosen by `RESPONSE_CACHE`, or `None` when it is `off`."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_response_cache(settings.RESPONSE_CACHE)
+    return _backend or None
+
+
+def build_response_cache(kind: str):
+    size = settings.RESPONSE_CACHE_SIZE
+    timeout = settings.RESPONSE_CACHE_TIMEOUT
+    if kind == "memory":
+        return MemoryResponseCache(size, timeout)
+    if kind == "file":
+        return FileResponseCache(settings.RESPONSE_CACHE_LOCATION, size, timeout)
+    return False
+
+
+def set_response_cache(backend) -> None:
+    """Replaces the backend, e.g. `set_response_cache(False)` turns caching off."""
+    global _backend
+    _backend = backend
+
+
+def record(view_name: str, outcome: str) -> None:
+    with _stats_lock:
+        stats.setdefault(view_name, Counter())[outcome] += 1
+
+
+def hit_rates() -> dict[str, dict]:
+    with _stats_lock:
+        snapshot = {name: dict(counter) for name, counter in stats.items()}
+    for counter in snapshot.values():
+        total = counter.get("hits", 0) + counter.get("misses", 0)
+        counter["hit_rate"] = counter.get("hits", 0) / total if total else 0.0
+    return snapshot
+
+
+def is_cacheable(request) -> bool:
+    # Signed-in users see their name and notifications in the layout, and
+    # pending messages are shown once, so only plain anonymous views qualify.
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def response_key(request, resources: tuple[str, ...]) -> str:
+    versions = ",".join(get_version(resource).token for resource in resources)
+    query = request.GET.urlencode()
+    raw = f"{request.path}?{query}|anonymous|{versions}"
+    return "response:" + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def cache_response(*resources: str):
+    """
+    Serves anonymous GETs of the view from the response cache. Keys include
+    the versions of `resources` from `core.versions`, so any save, delete or
+    membership change of the models behind them invalidates the entries.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            backend = get_response_cache()
+            if backend is None or not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            key = response_key(request, resources)
+            cached = backend.get(key)
+            if cached is not None:
+                record(view.__name__, "hits")
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Cache"] = "HIT"
+                return response
+            record(view.__name__, "misses")
+            response = view(request, *args, **kwargs)
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not len(get_messages(request))
+            ):
+                backend.set(key, (response.content, response["Content-Type"]))
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,672 @@
+from __future__ import annotations
+import heapq
+import re
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from django.db import connection, transaction
+from django.db.models import Q, signals
+from django.db.models.functions import Upper
+from django.dispatch import receiver
+from core.models import Course, Department, User
+from core.versions import (
+    COURSE_SEARCH,
+    USER_SEARCH,
+    advance_generation,
+    generation_changes,
+    get_generation,
+)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Relative weight of each indexed field when ranking search results.
+COURSE_FIELD_WEIGHTS = {
+    "name": 4,
+    "department": 2,
+    "teacher": 2,
+    "number": 1,
+    "day": 1,
+}
+
+COURSE_DOCUMENT_FIELDS = [
+    "id",
+    "name",
+    "department__name",
+    "teacher__username",
+    "teacher__first_name",
+    "teacher__last_name",
+    "course_number",
+    "group_number",
+    "first_day",
+    "second_day",
+]
+
+
+def tokenize(text) -> list[str]:
+    if text is None:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def word_prefix_pattern(term: str) -> str:
+    """
+    A Postgres regular expression matching the upper-cased `term` at the
+    start of a word, as `InvertedIndex` matches it against tokens. Terms
+    come from `tokenize`, so they need no escaping.
+    """
+    return r"\m" + term.upper()
+
+
+class InvertedIndex:
+    """
+    In-memory token index with a sorted vocabulary.
+    Query terms are matched as prefixes of the indexed tokens
+    using binary search, so lookups do not scan every document.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, dict[int, int]] = {}
+        self._documents: dict[int, dict[str, int]] = {}
+        self._vocabulary: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._documents
+
+    def add(self, doc_id: int, fields: list[tuple[object, int]]) -> None:
+        """Indexes `doc_id` from `(text, weight)` pairs, replacing any previous entry."""
+        self.remove(doc_id)
+        tokens: dict[str, int] = {}
+        for text, weight in fields:
+            for token in tokenize(text):
+                tokens[token] = max(tokens.get(token, 0), weight)
+        self._documents[doc_id] = tokens
+        for token, weight in tokens.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._vocabulary, token)
+            postings[doc_id] = weight
+
+    def remove(self, doc_id: int) -> None:
+        tokens = self._documents.pop(doc_id, None)
+        if not tokens:
+            return
+        for token in tokens:
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._documents.clear()
+        self._vocabulary.clear()
+
+    def _match_prefix(self, term: str) -> dict[int, int]:
+        matches: dict[int, int] = {}
+        position = bisect_left(self._vocabulary, term)
+        while position < len(self._vocabulary):
+            token = self._vocabulary[position]
+            if not token.startswith(term):
+                break
+            # Exact token hits rank above prefix hits.
+            bonus = 1 if token == term else 0
+            for doc_id, weight in self._postings[token].items():
+                matches[doc_id] = max(matches.get(doc_id, 0), weight + bonus)
+            position += 1
+        return matches
+
+    def search(self, query: str) -> dict[int, int]:
+        """Returns `{doc_id: score}` for documents matching every term of `query`."""
+        scores: dict[int, int] | None = None
+        for term in tokenize(query):
+            matches = self._match_prefix(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    doc_id: score + matches[doc_id]
+                    for doc_id, score in scores.items()
+                    if doc_id in matches
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+
+def course_document_fields(row: dict) -> list[tuple[object, int]]:
+    weights = COURSE_FIELD_WEIGHTS
+    return [
+        (row["name"], weights["name"]),
+        (row["department__name"], weights["department"]),
+        (row["teacher__username"], weights["teacher"]),
+        (row["teacher__first_name"], weights["teacher"]),
+        (row["teacher__last_name"], weights["teacher"]),
+        (row["course_number"], weights["number"]),
+        (row["group_number"], weights["number"]),
+        (row["first_day"], weights["day"]),
+        (row["second_day"], weights["day"]),
+    ]
+
+
+def course_row(course: Course) -> dict:
+    return {
+        "id": course.pk,
+        "name": course.name,
+        "department__name": course.department.name,
+        "teacher__username": course.teacher.username,
+        "teacher__first_name": course.teacher.first_name,
+        "teacher__last_name": course.teacher.last_name,
+        "course_number": course.course_number,
+        "group_number": course.group_number,
+        "first_day": course.first_day,
+        "second_day": course.second_day,
+    }
+
+
+def build_search_document(row: dict) -> str:
+    """Flattens the searchable fields of a course into a single lowercase string."""
+    return " ".join(
+        str(row[name]).lower()
+        for name in COURSE_DOCUMENT_FIELDS[1:]
+        if row[name] is not None
+    )
+
+
+class SharedInMemoryIndex(ABC):
+    """
+    Base of the in-process indexes, kept in step with other processes.
+    Every committed change advances the generation `generation_name` in the
+    shared cache along with the ids it touched, so an index that is behind
+    re-reads just those rows, or everything when they are not all known.
+    """
+
+    generation_name = ""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation: int | None = None
+
+    @abstractmethod
+    def load_all(self) -> None:
+        """Fills the index from scratch; called with the lock held."""
+
+    @abstractmethod
+    def load(self, ids: set[int]) -> None:
+        """Re-reads the rows of `ids`, dropping the deleted ones; called with the lock held."""
+
+    def build(self) -> None:
+        with self._lock:
+            self._build(get_generation(self.generation_name))
+
+    def _build(self, generation: int) -> None:
+        self.load_all()
+        self._generation = generation
+
+    def ensure_current(self) -> None:
+        if get_generation(self.generation_name) == self._generation:
+            return
+        with self._lock:
+            # Read again with the lock held, another thread may have caught up.
+            generation = get_generation(self.generation_name)
+            if generation == self._generation:
+                return
+            changed = None
+            # A generation going back means the shared cache was reset.
+            if self._generation is not None and self._generation < generation:
+                changed = generation_changes(
+                    self.generation_name, self._generation, generation
+                )
+            if changed is None:
+                self._build(generation)
+            else:
+                self.load(changed)
+                self._generation = generation
+
+    @property
+    def built(self) -> bool:
+        return self._generation is not None
+
+    def changed(self, ids: list[int], apply: Callable[[], None]) -> None:
+        """
+        Once the transaction commits, announces a change of `ids` and applies
+        it to this index with `apply`, so a rollback leaves both untouched.
+        """
+        transaction.on_commit(lambda: self._commit(ids, apply))
+
+    def _commit(self, ids: list[int], apply: Callable[[], None]) -> None:
+        generation = advance_generation(self.generation_name, ids)
+        with self._lock:
+            # Nobody else changed anything in between, so applying the change
+            # makes the index current. Otherwise `ensure_current` reads it back.
+            if self._generation is not None and generation == self._generation + 1:
+                apply()
+                self._generation = generation
+
+    def invalidate(self) -> None:
+        """Makes every process rebuild, after rows were written without signals."""
+        transaction.on_commit(lambda: advance_generation(self.generation_name))
+
+
+class InMemoryCourseSearchBackend(SharedInMemoryIndex):
+    """
+    Pure-Python fallback used on databases without trigram support.
+    The index is built lazily on the first search and then kept
+    up to date by the model signals below.
+    """
+
+    generation_name = COURSE_SEARCH
+
+    def __init__(self):
+        super().__init__()
+        self.index = InvertedIndex()
+
+    def load_all(self) -> None:
+        self.index.clear()
+        for row in Course.objects.values(*COURSE_DOCUMENT_FIELDS).iterator():
+            self.index.add(row["id"], course_document_fields(row))
+
+    def load(self, ids: set[int]) -> None:
+        rows = Course.objects.filter(pk__in=ids).values(*COURSE_DOCUMENT_FIELDS)
+        for course_id in ids:
+            self.index.remove(course_id)
+        for row in rows:
+            self.index.add(row["id"], course_document_fields(row))
+
+    def update(self, row: dict) -> None:
+        self.update_many([row])
+
+    def update_many(self, rows: list[dict]) -> None:
+        """Indexes `rows` as a single change, however many there are."""
+
+        def apply():
+            for row in rows:
+                self.index.add(row["id"], course_document_fields(row))
+
+        self.changed([row["id"] for row in rows], apply)
+
+    def remove(self, course_id: int) -> None:
+        self.changed([course_id], lambda: self.index.remove(course_id))
+
+    def search(self, q: str, limit: int) -> list[Course]:
+        self.ensure_current()
+        with self._lock:
+            scores = self.index.search(q)
+        ranked = heapq.nsmallest(
+            limit, scores, key=lambda doc_id: (-scores[doc_id], doc_id)
+        )
+        courses = Course.objects.select_related("department", "teacher").in_bulk(ranked)
+        return [courses[pk] for pk in ranked if pk in courses]
+
+
+class PostgresCourseSearchBackend:
+    """
+    Searches the precomputed `Course.search_document` column.
+    Like the in-memory index, every query term has to start a word of it.
+    The regular expressions are served by the trigram GIN index created
+    in the migrations, and results are ranked by similarity.
+    """
+
+    def update(self, row: dict) -> None:
+        pass
+
+    def update_many(self, rows: list[dict]) -> None:
+        pass
+
+    def remove(self, course_id: int) -> None:
+        pass
+
+    def invalidate(self) -> None:
+        pass
+
+    def search(self, q: str, limit: int) -> list[Course]:
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        courses = Course.objects.select_related("department", "teacher").alias(
+            document=Upper("search_document")
+        )
+        for term in tokenize(q):
+            courses = courses.filter(document__regex=word_prefix_pattern(term))
+        courses = courses.annotate(
+            rank=TrigramSimilarity("search_document", q.lower())
+        ).order_by("-rank", "pk")
+        return list(courses[:limit])
+
+
+_course_backend = None
+
+
+def get_course_search_backend():
+    global _course_backend
+    if _course_backend is None:
+        if connection.vendor == "postgresql":
+            _course_backend = PostgresCourseSearchBackend()
+        else:
+            _course_backend = InMemoryCourseSearchBackend()
+    return _course_backend
+
+
+def search_courses(q: str, limit: int = 5) -> list[Course]:
+    """Returns up to `limit` courses matching `q`, best matches first."""
+    if not tokenize(q):
+        return list(Course.objects.select_related("department", "teacher")[:limit])
+    return get_course_search_backend().search(q, limit)
+
+
+def refresh_course_documents(courses) -> None:
+    """Recomputes the search document of `courses` after a related object changed."""
+    changed = []
+    rows = []
+    for course in courses.select_related("department", "teacher"):
+        row = course_row(course)
+        course.search_document = build_search_document(row)
+        changed.append(course)
+        rows.append(row)
+    Course.objects.bulk_update(changed, ["search_document"])
+    if rows:
+        get_course_search_backend().update_many(rows)
+
+
+@receiver(signals.pre_save, sender=Course, dispatch_uid="course_search_document")
+def update_course_search_document(sender, instance, **kwargs):
+    instance.search_document = build_search_document(course_row(instance))
+
+
+@receiver(signals.post_save, sender=Course, dispatch_uid="course_search_index")
+def index_course_on_save(sender, instance, **kwargs):
+    get_course_search_backend().update(course_row(instance))
+
+
+@receiver(signals.post_delete, sender=Course, dispatch_uid="course_search_unindex")
+def unindex_course_on_delete(sender, instance, **kwargs):
+    get_course_search_backend().remove(instance.pk)
+
+
+@receiver(signals.post_save, sender=Department, dispatch_uid="department_search")
+def reindex_department_courses(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and "name" not in update_fields):
+        return
+    refresh_course_documents(instance.courses.all())
+
+
+@receiver(signals.post_save, sender=User, dispatch_uid="teacher_search")
+def reindex_teacher_courses(sender, instance, created, update_fields, **kwargs):
+    if created or not instance.is_staff:
+        return
+    names = {"username", "first_name", "last_name"}
+    if update_fields and not names & set(update_fields):
+        return
+    if not instance.search_values_changed(names):
+        return
+    refresh_course_documents(instance.courses.all())
+
+
+USER_DOCUMENT_FIELDS = ["id", "username", "first_name", "last_name", "is_staff"]
+USER_SEARCH_FIELDS = {"username", "first_name", "last_name", "is_staff"}
+
+DEFAULT_USER_PAGE_SIZE = 25
+
+TEACHER = True
+STUDENT = False
+
+
+@dataclass
+class UserPage:
+    users: list[User] = field(default_factory=list)
+    next_cursor: str | None = None
+
+
+@dataclass
+class UserSearchResult:
+    teachers: UserPage = field(default_factory=UserPage)
+    students: UserPage = field(default_factory=UserPage)
+
+    def page(self, is_staff: bool) -> UserPage:
+        return self.teachers if is_staff else self.students
+
+
+def user_document_fields(row: dict) -> list[tuple[object, int]]:
+    return [(row["username"], 2), (row["first_name"], 1), (row["last_name"], 1)]
+
+
+def user_queryset(fields: tuple[str, ...] | None):
+    """Users loading only `fields`, plus the columns the backends group by."""
+    if fields is None:
+        return User.objects.all()
+    return User.objects.only("pk", "username", "is_staff", *fields)
+
+
+def paginate_usernames(
+    usernames: list[str], limit: int | None
+) -> tuple[list[str], str | None]:
+    """Cuts a sorted `usernames` list to `limit` items and returns the next cursor."""
+    if limit is None or len(usernames) <= limit:
+        return usernames, None
+    page = usernames[:limit]
+    return page, page[-1]
+
+
+class InMemoryUserSearchBackend(SharedInMemoryIndex):
+    """
+    Per-role prefix index over user names.
+    Each role also keeps its usernames sorted, so keyset pagination
+    is a binary search instead of a scan.
+    """
+
+    generation_name = USER_SEARCH
+
+    def __init__(self):
+        super().__init__()
+        self.indexes = {TEACHER: InvertedIndex(), STUDENT: InvertedIndex()}
+        self.sorted_usernames: dict[bool, list[str]] = {TEACHER: [], STUDENT: []}
+        self.users: dict[int, tuple[str, bool]] = {}
+        self.usernames: dict[str, int] = {}
+
+    def _add(self, row: dict) -> None:
+        self._remove(row["id"])
+        role = bool(row["is_staff"])
+        self.indexes[role].add(row["id"], user_document_fields(row))
+        insort(self.sorted_usernames[role], row["username"])
+        self.users[row["id"]] = (row["username"], role)
+        self.usernames[row["username"]] = row["id"]
+
+    def _remove(self, user_id: int) -> None:
+        entry = self.users.pop(user_id, None)
+        if entry is None:
+            return
+        username, role = entry
+        self.indexes[role].remove(user_id)
+        usernames = self.sorted_usernames[role]
+        del usernames[bisect_left(usernames, username)]
+        self.usernames.pop(username, None)
+
+    def load_all(self) -> None:
+        for index in self.indexes.values():
+            index.clear()
+        for usernames in self.sorted_usernames.values():
+            usernames.clear()
+        self.users.clear()
+        self.usernames.clear()
+        for row in User.objects.values(*USER_DOCUMENT_FIELDS).iterator():
+            self._add(row)
+
+    def load(self, ids: set[int]) -> None:
+        rows = User.objects.filter(pk__in=ids).values(*USER_DOCUMENT_FIELDS)
+        for user_id in ids:
+            self._remove(user_id)
+        for row in rows:
+            self._add(row)
+
+    def update(self, row: dict) -> None:
+        self.changed([row["id"]], lambda: self._add(row))
+
+    def remove(self, user_id: int) -> None:
+        self.changed([user_id], lambda: self._remove(user_id))
+
+    def _page_usernames(
+        self, q: str, role: bool, limit: int | None, after: str | None
+    ) -> tuple[list[str], str | None]:
+        fetch = None if limit is None else limit + 1
+        if not tokenize(q):
+            usernames = self.sorted_usernames[role]
+            start = bisect_right(usernames, after) if after else 0
+            end = None if fetch is None else start + fetch
+            return paginate_usernames(usernames[start:end], limit)
+        matches = (self.users[user_id][0] for user_id in self.indexes[role].search(q))
+        if after:
+            matches = (username for username in matches if username > after)
+        if fetch is None:
+            usernames = sorted(matches)
+        else:
+            usernames = heapq.nsmallest(fetch, matches)
+        return paginate_usernames(usernames, limit)
+
+    def search(
+        self,
+        q: str,
+        roles,
+        limit: int | None,
+        cursors: dict[bool, str | None],
+        fields: tuple[str, ...] | None = None,
+    ) -> UserSearchResult:
+        self.ensure_current()
+        pages = {}
+        with self._lock:
+            for role in roles:
+                pages[role] = self._page_usernames(q, role, limit, cursors.get(role))
+            ids = [
+                self.usernames[username]
+                for usernames, _ in pages.values()
+                for username in usernames
+            ]
+        users = user_queryset(fields).in_bulk(ids)
+        result = UserSearchResult()
+        for role, (usernames, next_cursor) in pages.items():
+            page = result.page(role)
+            page.users = [
+                users[self.usernames[username]]
+                for username in usernames
+                if self.usernames.get(username) in users
+            ]
+            page.next_cursor = next_cursor
+        return result
+
+
+class PostgresUserSearchBackend:
+    """
+    Queries both roles with a single `UNION ALL` statement.
+    Like the in-memory index, every query term has to start a word of the
+    username, first or last name; the regular expressions are served by the
+    trigram indexes created in the migrations.
+    """
+
+    def update(self, row: dict) -> None:
+        pass
+
+    def remove(self, user_id: int) -> None:
+        pass
+
+    def invalidate(self) -> None:
+        pass
+
+    def search(
+        self,
+        q: str,
+        roles,
+        limit: int | None,
+        cursors: dict[bool, str | None],
+        fields: tuple[str, ...] | None = None,
+    ) -> UserSearchResult:
+        query = Q()
+        for term in tokenize(q):
+            pattern = word_prefix_pattern(term)
+            query &= (
+                Q(username_upper__regex=pattern)
+                | Q(first_name_upper__regex=pattern)
+                | Q(last_name_upper__regex=pattern)
+            )
+        querysets = []
+        for role in roles:
+            queryset = (
+                user_queryset(fields)
+                .alias(
+                    username_upper=Upper("username"),
+                    first_name_upper=Upper("first_name"),
+                    last_name_upper=Upper("last_name"),
+                )
+                .filter(query, is_staff=role)
+                .order_by("username")
+            )
+            if cursors.get(role):
+                queryset = queryset.filter(username__gt=cursors[role])
+            if limit is not None:
+                queryset = queryset[: limit + 1]
+            querysets.append(queryset)
+        combined = querysets[0]
+        if len(querysets) > 1:
+            combined = combined.union(*querysets[1:], all=True)
+        grouped: dict[bool, list[User]] = {role: [] for role in roles}
+        for user in combined:
+            grouped[user.is_staff].append(user)
+        result = UserSearchResult()
+        for role, users in grouped.items():
+            users.sort(key=lambda user: user.username)
+            page = result.page(role)
+            if limit is not None and len(users) > limit:
+                users = users[:limit]
+                page.next_cursor = users[-1].username
+            page.users = users
+        return result
+
+
+_user_backend = None
+
+
+def get_user_search_backend():
+    global _user_backend
+    if _user_backend is None:
+        if connection.vendor == "postgresql":
+            _user_backend = PostgresUserSearchBackend()
+        else:
+            _user_backend = InMemoryUserSearchBackend()
+    return _user_backend
+
+
+def search_users(
+    q: str,
+    roles=(TEACHER, STUDENT),
+    limit: int | None = DEFAULT_USER_PAGE_SIZE,
+    teachers_after: str | None = None,
+    students_after: str | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> UserSearchResult:
+    """
+    Searches users by username, first name and last name.
+    Every requested role is answered in one pass; results are ordered
+    by username and continue after the `*_after` username cursors.
+    With `fields` only those columns of the users are loaded.
+    """
+    cursors = {TEACHER: teachers_after, STUDENT: students_after}
+    return get_user_search_backend().search(q, roles, limit, cursors, fields)
+
+
+@receiver(signals.post_save, sender=User, dispatch_uid="user_search_index")
+def index_user_on_save(sender, instance, created, update_fields, **kwargs):
+    if update_fields and not USER_SEARCH_FIELDS & set(update_fields):
+        return
+    if not created and not instance.search_values_changed(USER_SEARCH_FIELDS):
+        return
+    get_user_search_backend().update(
+        {name: getattr(instance, name) for name in USER_DOCUMENT_FIELDS}
+    )
+
+
+@receiver(signals.post_delete, sender=User, dispatch_uid="user_search_unindex")
+def unindex_user_on_delete(sender, instance, **kwargs):
+    get_user_search_backend().remove(instance.pk)
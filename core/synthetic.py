@@ -0,0 +1,371 @@
+from __future__ import annotations
+import datetime
+import itertools
+import random
+from dataclasses import dataclass
+from time import perf_counter
+from django.contrib.auth.hashers import make_password
+from django.db import models, transaction
+from django.db.models import Max
+from core.models import Course, Department, Interval, User
+from core.reservations import Reservation, sync_reserved_counts
+from core.search import (
+    build_search_document,
+    course_row,
+    get_course_search_backend,
+    get_user_search_backend,
+)
+from core.timetable import WEEKDAYS, slot_mask
+from core.utils import interval_has_overlap, render_markdown
+from core.versions import COURSES, DEPARTMENTS, INTERVALS, USERS, bump
+
+Enrollment = Course.participants.through
+
+SUBJECTS = [
+    "Algebra",
+    "Biology",
+    "Chemistry",
+    "Databases",
+    "Economics",
+    "Geometry",
+    "History",
+    "Literature",
+    "Mathematics",
+    "Networks",
+    "Physics",
+    "Statistics",
+]
+FIRST_NAMES = ["Ada", "Alan", "Grace", "Edsger", "Barbara", "Donald", "Frances"]
+LAST_NAMES = ["Lovelace", "Turing", "Hopper", "Dijkstra", "Liskov", "Knuth", "Allen"]
+GENDERS = ["Male", "Female", "Other"]
+DAYS = [day.title() for day in WEEKDAYS]
+
+
+def time_range(
+    start: datetime.time, minutes: int
+) -> tuple[datetime.time, datetime.time]:
+    begin = datetime.datetime.combine(datetime.date.min, start)
+    return start, (begin + datetime.timedelta(minutes=minutes)).time()
+
+
+# Courses meet on two different days, 90 minutes each time.
+COURSE_SLOTS = [
+    (first_day, second_day, *time_range(datetime.time(hour), 90))
+    for first_day, second_day in itertools.combinations(DAYS, 2)
+    for hour in range(8, 17, 2)
+]
+# Office hours last 30 minutes and start every 45, since `interval_has_overlap`
+# treats touching intervals as overlapping.
+INTERVAL_SLOTS = [
+    (day, *time_range(datetime.time(8 + minutes // 60, minutes % 60), 30))
+    for day in DAYS
+    for minutes in range(0, 12 * 60, 45)
+]
+COURSE_SLOT_MASKS = [
+    slot_mask(first_day, start_time, end_time)
+    | slot_mask(second_day, start_time, end_time)
+    for first_day, second_day, start_time, end_time in COURSE_SLOTS
+]
+INTERVAL_SLOT_MASKS = [slot_mask(*slot) for slot in INTERVAL_SLOTS]
+
+
+@dataclass
+class DatasetSpec:
+    prefix: str = "synthetic"
+    departments: int = 20
+    teachers: int = 500
+    students: int = 10000
+    courses: int = 2000
+    # Per teacher.
+    intervals: int = 10
+    # Per student.
+    enrollments: int = 3
+    reservations: int = 2
+    capacity: int = 30
+    password: str = "synthetic"
+    seed: int = 0
+    batch_size: int = 5000
+    # Runs `clean()` and `interval_has_overlap` on every generated row.
+    validate: bool = True
+
+
+class BulkWriter:
+    """Buffers rows of `model` and inserts `batch_size` at a time, one transaction each."""
+
+    def __init__(self, model: type[models.Model], batch_size: int):
+        self.model = model
+        self.batch_size = batch_size
+        self.pending = []
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, instance: models.Model) -> None:
+        self.pending.append(instance)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def extend(self, instances) -> None:
+        for instance in instances:
+            self.add(instance)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        started = perf_counter()
+        with transaction.atomic():
+            self.model.objects.bulk_create(self.pending)
+        self.seconds += perf_counter() - started
+        self.rows += len(self.pending)
+        self.pending = []
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def clear_dataset(prefix: str) -> None:
+    """Deletes the users of a dataset and, through them, everything else it created."""
+    students = User.objects.filter(username__startswith=f"{prefix}-student-")
+    # Removing the memberships in bulk first spares the per-user signals of
+    # `core.reservations` a recount for every student.
+    Enrollment.objects.filter(user__in=students).delete()
+    Reservation.objects.filter(user__in=students).delete()
+    # Students go first, so deleting the intervals of their teachers does
+    # not notify them while they are being deleted themselves.
+    students.delete()
+    User.objects.filter(username__startswith=f"{prefix}-teacher-").delete()
+
+
+def dataset_exists(prefix: str) -> bool:
+    return User.objects.filter(username__startswith=f"{prefix}-").exists()
+
+
+class SyntheticDataset:
+    """
+    Generates the dataset described by `spec` and loads it with `bulk_create`.
+    The same seed on the same database yields the same rows. Every row passes
+    the `clean()` rules of its model, the intervals of a teacher never overlap
+    and no student is enrolled or reserved twice at the same time.
+    """
+
+    def __init__(self, spec: DatasetSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.writers: dict[str, BulkWriter] = {}
+
+    def writer(self, name: str, model: type[models.Model]) -> BulkWriter:
+        self.writers[name] = BulkWriter(model, self.spec.batch_size)
+        return self.writers[name]
+
+    def username(self, role: str, number: int) -> str:
+        return f"{self.spec.prefix}-{role}-{number}"
+
+    def load(self) -> dict[str, BulkWriter]:
+        """Loads the dataset and returns the writer of each table, for their stats."""
+        # Hashing is deliberately slow, so every user shares one hash.
+        password = make_password(self.spec.password)
+        teachers = list(self.users("teacher", self.spec.teachers, password))
+        teacher_pks = self.load_users("teachers", "teacher", teachers)
+        for teacher, pk in zip(teachers, teacher_pks):
+            teacher.pk = pk
+        student_pks = self.load_users(
+            "students",
+            "student",
+            self.users("student", self.spec.students, password),
+        )
+        departments = self.load_departments(teachers)
+        course_pks, course_slots = self.load_courses(teachers, departments)
+        interval_pks, interval_slots = self.load_intervals(teachers)
+        self.load_timetables(
+            student_pks, course_pks, course_slots, interval_pks, interval_slots
+        )
+        # Bulk writes send no signals, so versions and counters are refreshed here.
+        sync_reserved_counts(
+            Interval.objects.filter(
+                teacher__username__startswith=f"{self.spec.prefix}-teacher-"
+            ).values("pk")
+        )
+        bump(COURSES, DEPARTMENTS, INTERVALS, USERS)
+        get_course_search_backend().invalidate()
+        get_user_search_backend().invalidate()
+        return self.writers
+
+    def users(self, role: str, count: int, password: str):
+        for number in range(count):
+            user = User(
+                username=self.username(role, number),
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                email=f"{self.username(role, number)}@example.com",
+                password=password,
+                gender=self.rng.choice(GENDERS),
+                is_staff=role == "teacher",
+            )
+            if self.spec.validate:
+                user.clean()
+            yield user
+
+    def load_users(self, name: str, role: str, users) -> list[int]:
+        writer = self.writer(name, User)
+        writer.extend(users)
+        writer.flush()
+        # Not every backend returns the ids of bulk-created rows.
+        pks = dict(
+            User.objects.filter(
+                username__startswith=f"{self.spec.prefix}-{role}-"
+            ).values_list("username", "pk")
+        )
+        return [pks[self.username(role, number)] for number in range(writer.rows)]
+
+    def load_departments(self, teachers: list[User]) -> list[Department]:
+        first_number = self.next_number(Department, "department_number")
+        rendered = {}
+        departments = []
+        for number in range(self.spec.departments):
+            subject = SUBJECTS[number % len(SUBJECTS)]
+            description = f"The department of **{subject}**."
+            if description not in rendered:
+                rendered[description] = render_markdown(description)
+            departments.append(
+                Department(
+                    name=f"{subject} {number}",
+                    description=description,
+                    description_html=rendered[description],
+                    department_number=first_number + number,
+                    manager=self.rng.choice(teachers),
+                )
+            )
+        writer = self.writer("departments", Department)
+        writer.extend(departments)
+        writer.flush()
+        pks = dict(
+            Department.objects.filter(department_number__gte=first_number).values_list(
+                "department_number", "pk"
+            )
+        )
+        for department in departments:
+            department.pk = pks[department.department_number]
+        return departments
+
+    def load_courses(
+        self, teachers: list[User], departments: list[Department]
+    ) -> tuple[list[int], list[int]]:
+        first_number = self.next_number(Course, "course_number")
+        slots = []
+        writer = self.writer("courses", Course)
+        for number in range(self.spec.courses):
+            slot = self.rng.randrange(len(COURSE_SLOTS))
+            first_day, second_day, start_time, end_time = COURSE_SLOTS[slot]
+            teacher = self.rng.choice(teachers)
+            course = Course(
+                name=f"{self.rng.choice(SUBJECTS)} {number}",
+                user=teacher,
+                teacher=teacher,
+                department=self.rng.choice(departments),
+                course_number=first_number + number,
+                group_number=self.rng.randint(1, 3),
+                start_time=start_time,
+                end_time=end_time,
+                first_day=first_day,
+                second_day=second_day,
+            )
+            course.search_document = build_search_document(course_row(course))
+            if self.spec.validate:
+                course.clean()
+            slots.append(slot)
+            writer.add(course)
+        writer.flush()
+        pks = dict(
+            Course.objects.filter(course_number__gte=first_number).values_list(
+                "course_number", "pk"
+            )
+        )
+        return [pks[first_number + number] for number in range(writer.rows)], slots
+
+    def load_intervals(self, teachers: list[User]) -> tuple[list[int], list[int]]:
+        slots = []
+        keys = []
+        writer = self.writer("intervals", Interval)
+        per_teacher = min(self.spec.intervals, len(INTERVAL_SLOTS))
+        for teacher in teachers:
+            own = []
+            for slot in sorted(
+                self.rng.sample(range(len(INTERVAL_SLOTS)), per_teacher)
+            ):
+                day, start_time, end_time = INTERVAL_SLOTS[slot]
+                interval = Interval(
+                    teacher=teacher,
+                    day=day,
+                    start_time=start_time,
+                    end_time=end_time,
+                    capacity=self.spec.capacity,
+                )
+                if self.spec.validate:
+                    interval.clean()
+                    if interval_has_overlap(own, interval):
+                        raise ValueError(
+                            f"Generated an overlapping interval: {interval}"
+                        )
+                    own.append(interval)
+                slots.append(slot)
+                keys.append((teacher.pk, day, start_time))
+                writer.add(interval)
+        writer.flush()
+        # A teacher has at most one interval per slot, which identifies the rows.
+        pks = {
+            (teacher_id, day, start_time): pk
+            for pk, teacher_id, day, start_time in Interval.objects.filter(
+                teacher__username__startswith=f"{self.spec.prefix}-teacher-"
+            ).values_list("pk", "teacher_id", "day", "start_time")
+        }
+        return [pks[key] for key in keys], slots
+
+    def load_timetables(
+        self,
+        student_pks: list[int],
+        course_pks: list[int],
+        course_slots: list[int],
+        interval_pks: list[int],
+        interval_slots: list[int],
+    ) -> None:
+        enrollments = self.writer("enrollments", Enrollment)
+        reservations = self.writer("reservations", Reservation)
+        seats = [self.spec.capacity] * len(interval_pks)
+        for student_pk in student_pks:
+            # Weekly occupancy as in `core.timetable`, to skip clashing picks.
+            occupied = 0
+            enrolled = 0
+            for index in self.candidates(len(course_pks), self.spec.enrollments):
+                if enrolled == self.spec.enrollments:
+                    break
+                mask = COURSE_SLOT_MASKS[course_slots[index]]
+                if occupied & mask:
+                    continue
+                occupied |= mask
+                enrolled += 1
+                enrollments.add(
+                    Enrollment(course_id=course_pks[index], user_id=student_pk)
+                )
+            reserved = 0
+            for index in self.candidates(len(interval_pks), self.spec.reservations):
+                if reserved == self.spec.reservations:
+                    break
+                mask = INTERVAL_SLOT_MASKS[interval_slots[index]]
+                if not seats[index] or occupied & mask:
+                    continue
+                occupied |= mask
+                seats[index] -= 1
+                reserved += 1
+                reservations.add(
+                    Reservation(interval_id=interval_pks[index], user_id=student_pk)
+                )
+        enrollments.flush()
+        reservations.flush()
+
+    def candidates(self, population: int, wanted: int) -> list[int]:
+        """A few more random picks than `wanted`, since some of them may clash."""
+        return self.rng.sample(range(population), min(wanted * 3, population))
+
+    @staticmethod
+    def next_number(model: type[models.Model], field: str) -> int:
+        return (model.objects.aggregate(last=Max(field))["last"] or 0) + 1
@@ -0,0 +1,15 @@
+from django import template
+from core.versions import USERS, get_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def fragment_version(name, pk):
+    """
+    Returns the version of the `name` fragment of object `pk`, for use as a
+    `{% cache %}` key. It changes whenever `core.versions` bumps the fragment
+    or any user changes, since the fragments show usernames.
+    """
+    fragment = get_version(f"{name}:{pk}").token
+    return f"{fragment}-{get_version(USERS).token}"
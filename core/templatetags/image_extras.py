@@ -0,0 +1,23 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def user_image(user, size="large", alt="User Image"):
+    """
+    Renders the `size` variant of the image of `user` as a `<picture>` that
+    prefers WebP. Falls back to the upload while its variants are being built.
+    """
+    variants = user.image_variants
+    if size not in variants:
+        return format_html('<img src="{}" alt="{}"/>', user.image.url, alt)
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp"/>'
+        '<img src="{}" alt="{}" loading="lazy"/></picture>',
+        default_storage.url(variants[f"{size}.webp"]),
+        default_storage.url(variants[size]),
+        alt,
+    )
@@ -1,3 +1,1377 @@
-from django.test import TestCase
+from __future__ import annotations
+import datetime
+import io
+import os
+import random
+import socketserver
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import BadHeaderError
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from notifications.models import Notification
+from PIL import Image
+from core import enrollments, images, search, utils
+from core.catalog import import_courses
+from core.enrollments import (
+    Enrollment,
+    EnrollmentOutcome,
+    EnrollmentResult,
+    bulk_enroll,
+    enroll_student,
+)
+from core.models import (
+    Course,
+    Department,
+    Interval,
+    NotificationFanout,
+    OutboundEmail,
+    User,
+)
+from core.notifications import (
+    deliver_deferred_notifications,
+    dispatch_notifications,
+    get_unread_summary,
+    mark_notifications_read,
+)
+from core.profiling import (
+    QUERY_BUDGETS,
+    QueryBudgetExceeded,
+    assert_within_query_budget,
+)
+from core.reservations import (
+    ReleaseOutcome,
+    Reservation,
+    ReservationOutcome,
+    release_interval,
+    reserve_interval,
+)
+from core.response_cache import set_response_cache
+from core.synthetic import DatasetSpec, SyntheticDataset, clear_dataset
+from core.timetable import CACHE_KEY, course_mask, interval_mask
+from core.utils import (
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_RETRY_DELAY,
+    IntervalIndex,
+    LRUCache,
+    interval_has_overlap,
+    interval_overlap_exists,
+    queue_email,
+    render_markdown,
+    send_queued_emails,
+)
+from core.versions import COURSE_SEARCH, USER_RESOURCES, get_generation, get_version
 
-# Create your tests here.
+DAYS = ["Monday", "Tuesday"]
+
+
+def quarter(number: int) -> datetime.time:
+    return datetime.time(number // 4, number % 4 * 15)
+
+
+def random_interval(rng: random.Random, **kwargs) -> Interval:
+    # Quarter hours of a short morning, so touching, nested and equal
+    # intervals come up often.
+    start, end = sorted(rng.sample(range(8 * 4, 12 * 4), 2))
+    return Interval(
+        day=rng.choice(DAYS),
+        start_time=quarter(start),
+        end_time=quarter(end),
+        capacity=1,
+        **kwargs,
+    )
+
+
+def course_record(number: int, name: str) -> dict:
+    """A catalog record of a course of `teacher` in department 1."""
+    return {
+        "name": name,
+        "course_number": number,
+        "group_number": 1,
+        "teacher": "teacher",
+        "department": 1,
+        "first_day": "Monday",
+        "second_day": "Wednesday",
+        "start_time": "10:00",
+        "end_time": "11:30",
+    }
+
+
+def create_course(
+    teacher: User, department: Department, number: int, name: str, **kwargs
+) -> Course:
+    fields = {
+        "first_day": "Monday",
+        "second_day": "Wednesday",
+        "start_time": datetime.time(10),
+        "end_time": datetime.time(11, 30),
+        **kwargs,
+    }
+    return Course.objects.create(
+        name=name,
+        user=teacher,
+        teacher=teacher,
+        department=department,
+        course_number=number,
+        group_number=1,
+        **fields,
+    )
+
+
+class IntervalOverlapTests(TestCase):
+    """`IntervalIndex` and `interval_overlap_exists` answer like `interval_has_overlap`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+
+    def test_index_matches_scan(self):
+        rng = random.Random(0)
+        for case in range(500):
+            intervals = [random_interval(rng) for _ in range(rng.randint(0, 8))]
+            candidates = [random_interval(rng) for _ in range(10)]
+            expected = [
+                interval_has_overlap(intervals, candidate) for candidate in candidates
+            ]
+            with self.subTest(case=case):
+                self.assertEqual(
+                    IntervalIndex(intervals).overlaps_many(candidates), expected
+                )
+
+    def test_index_matches_scan_while_adding(self):
+        rng = random.Random(1)
+        for case in range(100):
+            intervals = []
+            index = IntervalIndex()
+            for _ in range(10):
+                candidate = random_interval(rng)
+                with self.subTest(case=case, intervals=len(intervals)):
+                    self.assertEqual(
+                        index.overlaps(candidate),
+                        interval_has_overlap(intervals, candidate),
+                    )
+                intervals.append(candidate)
+                index.add(candidate)
+
+    def test_exists_query_matches_scan(self):
+        rng = random.Random(2)
+        for case in range(30):
+            Interval.objects.filter(teacher=self.teacher).delete()
+            intervals = Interval.objects.bulk_create(
+                random_interval(rng, teacher=self.teacher)
+                for _ in range(rng.randint(0, 8))
+            )
+            saved = list(Interval.objects.filter(teacher=self.teacher))
+            for _ in range(10):
+                candidate = random_interval(rng, teacher=self.teacher)
+                with self.subTest(case=case):
+                    self.assertEqual(
+                        interval_overlap_exists(self.teacher, candidate),
+                        interval_has_overlap(intervals, candidate),
+                    )
+            if saved:
+                # Editing an interval checks the others only.
+                edited = rng.choice(saved)
+                candidate = random_interval(rng, teacher=self.teacher)
+                others = [interval for interval in saved if interval.pk != edited.pk]
+                with self.subTest(case=case, exclude=edited.pk):
+                    self.assertEqual(
+                        interval_overlap_exists(
+                            self.teacher, candidate, exclude_pk=edited.pk
+                        ),
+                        interval_has_overlap(others, candidate),
+                    )
+
+
+class TimetableConflictTests(TestCase):
+    """Clashes are refused from the database, whatever the cached timetables say."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.student = User.objects.create(username="student")
+        department = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+        cls.courses = [
+            Course.objects.create(
+                name=name,
+                user=cls.teacher,
+                teacher=cls.teacher,
+                department=department,
+                course_number=number,
+                group_number=1,
+                first_day="Monday",
+                second_day="Wednesday",
+                start_time=datetime.time(10),
+                end_time=datetime.time(11, 30),
+            )
+            for number, name in enumerate(["Algebra", "Geometry"], start=1)
+        ]
+        cls.interval = Interval.objects.create(
+            teacher=cls.teacher,
+            day="Monday",
+            start_time=datetime.time(11),
+            end_time=datetime.time(12),
+            capacity=10,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def enroll_elsewhere(self, course: Course) -> None:
+        # Another process enrolled the student; this one cached an empty week.
+        Enrollment.objects.create(course_id=course.pk, user_id=self.student.pk)
+        cache.set(CACHE_KEY.format(self.student.pk), 0)
+
+    def test_stale_cache_does_not_accept_a_clashing_course(self):
+        algebra, geometry = self.courses
+        self.enroll_elsewhere(algebra)
+        self.assertEqual(
+            enroll_student(geometry, self.student), EnrollmentOutcome.CONFLICT
+        )
+        self.assertEqual(
+            enroll_student(algebra, self.student), EnrollmentOutcome.ALREADY_ENROLLED
+        )
+        self.assertFalse(geometry.participants.exists())
+
+    def test_stale_cache_does_not_accept_a_clashing_interval(self):
+        self.enroll_elsewhere(self.courses[0])
+        self.assertEqual(
+            reserve_interval(self.interval, self.student), ReservationOutcome.CONFLICT
+        )
+        self.assertFalse(self.interval.reserving_students.exists())
+
+    def test_local_cache_does_not_refuse_a_free_course(self):
+        # Another process dropped a course; this one still caches a full week.
+        geometry = self.courses[1]
+        cache.set(CACHE_KEY.format(self.student.pk), (1 << 7 * 24 * 60) - 1)
+        self.assertEqual(
+            enroll_student(geometry, self.student), EnrollmentOutcome.ENROLLED
+        )
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": os.path.join(tempfile.gettempdir(), "courseware-tests"),
+            }
+        }
+    )
+    def test_shared_cache_refuses_known_clashes_without_locking(self):
+        algebra, geometry = self.courses
+        cache.clear()
+        self.assertEqual(
+            enroll_student(algebra, self.student), EnrollmentOutcome.ENROLLED
+        )
+        with self.assertNumQueries(1):
+            # Only the membership check that tells duplicates from clashes.
+            self.assertEqual(
+                enroll_student(geometry, self.student), EnrollmentOutcome.CONFLICT
+            )
+        cache.clear()
+
+    def test_bulk_enroll_labels_pairs_enrolled_concurrently(self):
+        algebra, geometry = self.courses
+        lock_timetables = enrollments.lock_timetables
+
+        def enroll_then_lock(student_ids):
+            # Another request enrolls the student between the lookups of
+            # the batch and its lock.
+            Enrollment.objects.create(course_id=algebra.pk, user_id=self.student.pk)
+            return lock_timetables(student_ids)
+
+        with mock.patch.object(enrollments, "lock_timetables", enroll_then_lock):
+            results = bulk_enroll([("student", 1), ("student", 2)])
+        self.assertEqual(
+            results,
+            [
+                EnrollmentResult("student", 1, EnrollmentOutcome.ALREADY_ENROLLED),
+                EnrollmentResult("student", 2, EnrollmentOutcome.CONFLICT),
+            ],
+        )
+        self.assertFalse(geometry.participants.exists())
+
+
+class ReservationTests(TestCase):
+    """`reserve_interval` seats students up to the capacity, once each."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.students = User.objects.bulk_create(
+            User(username=f"student{number}", email=f"s{number}@example.com")
+            for number in range(3)
+        )
+        cls.interval = Interval.objects.create(
+            teacher=cls.teacher,
+            day="Tuesday",
+            start_time=datetime.time(10),
+            end_time=datetime.time(11),
+            capacity=2,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def reserve(self, student: User) -> ReservationOutcome:
+        return reserve_interval(self.interval, student)
+
+    def assert_seats(self, *students: User) -> None:
+        self.interval.refresh_from_db()
+        self.assertEqual(self.interval.reserved_count, len(students))
+        self.assertQuerysetEqual(
+            self.interval.reserving_students.order_by("username"),
+            students,
+            ordered=True,
+        )
+
+    def test_reserves_until_full(self):
+        first, second, third = self.students
+        self.assertEqual(self.reserve(first), ReservationOutcome.RESERVED)
+        self.assertEqual(self.reserve(second), ReservationOutcome.RESERVED)
+        self.assertEqual(self.reserve(third), ReservationOutcome.FULL)
+        self.assert_seats(first, second)
+
+    def test_second_reservation_is_refused(self):
+        first, second, _ = self.students
+        self.assertEqual(self.reserve(first), ReservationOutcome.RESERVED)
+        self.assertEqual(self.reserve(first), ReservationOutcome.ALREADY_RESERVED)
+        # Without a cached timetable the database tells, whether full or not.
+        cache.clear()
+        self.assertEqual(self.reserve(first), ReservationOutcome.ALREADY_RESERVED)
+        self.assertEqual(self.reserve(second), ReservationOutcome.RESERVED)
+        cache.clear()
+        self.assertEqual(self.reserve(first), ReservationOutcome.ALREADY_RESERVED)
+        self.assert_seats(first, second)
+
+    def test_released_seat_can_be_reserved(self):
+        first, second, third = self.students
+        self.reserve(first)
+        self.reserve(second)
+        self.assertEqual(
+            release_interval(self.interval, first), ReleaseOutcome.RELEASED
+        )
+        self.assertEqual(self.reserve(third), ReservationOutcome.RESERVED)
+        self.assert_seats(second, third)
+
+
+class UserDetailsQueryTests(TestCase):
+    """The profile page takes the same queries however many rows it lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(
+            username="teacher", first_name="Ada", is_staff=True
+        )
+        cls.student = User.objects.create(username="student")
+        cls.department = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def add_rows(self, count: int) -> None:
+        # Half of the reserved intervals belong to teachers of their own,
+        # so reading those teachers one by one would show up as queries.
+        start = Course.objects.count()
+        for number in range(start + 1, start + count + 1):
+            teacher = User.objects.create(username=f"teacher{number}", is_staff=True)
+            course = Course.objects.create(
+                name=f"Course {number}",
+                user=teacher,
+                teacher=self.teacher,
+                department=self.department,
+                course_number=number,
+                group_number=1,
+                first_day="Monday",
+                second_day="Wednesday",
+                start_time=datetime.time(8),
+                end_time=datetime.time(9),
+            )
+            course.participants.add(self.student)
+            for owner in (self.teacher, teacher):
+                interval = Interval.objects.create(
+                    teacher=owner,
+                    day="Tuesday",
+                    start_time=quarter(8 * 4 + number),
+                    end_time=quarter(8 * 4 + number + 1),
+                    capacity=10,
+                )
+                interval.reserving_students.add(self.student)
+
+    def assert_constant_queries(self, username: str, queries: int) -> None:
+        url = reverse("core:user_details", args=[username])
+        # The first request also caches the viewer's unread notifications.
+        self.client.get(url)
+        for count in (1, 5):
+            self.add_rows(count)
+            with self.subTest(rows=count), self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_teacher_page(self):
+        self.assert_constant_queries("teacher", 5)
+
+    def test_student_page(self):
+        self.assert_constant_queries("student", 5)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for `smtplib`; refuses mail to `BOUNCING`."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost")
+        envelope = {}
+        for raw in self.rfile:
+            command = raw.decode().rstrip("\r\n")
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                envelope = {"from": command.split(":", 1)[1], "to": []}
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].strip("<> ")
+                if recipient == SMTPServer.BOUNCING:
+                    self.reply("550 No such user")
+                else:
+                    envelope["to"].append(recipient)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                for line in self.rfile:
+                    if line == b".\r\n":
+                        break
+                with server.lock:
+                    server.delivered.append(envelope["to"])
+                self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                envelope = {}
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                with server.lock:
+                    server.quits += 1
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """A local SMTP stand-in that counts connections, QUITs and deliveries."""
+
+    BOUNCING = "bounce@example.com"
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.quits = 0
+        self.delivered: list[list[str]] = []
+
+    def wait_for_quits(self, count: int) -> None:
+        # Handlers count the QUIT on their own thread, right after replying.
+        deadline = time.monotonic() + 5
+        while self.quits < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+class OutboundEmailTests(TestCase):
+    """`queue_email` only stores; `send_queued_emails` delivers in batches."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        self.server.connections = self.server.quits = 0
+        self.server.delivered = []
+        settings = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def queue(self, recipient: str = "student@example.com") -> OutboundEmail:
+        return queue_email("Subject", "Body", "courseware@example.com", [recipient])
+
+    def assert_connections(self, count: int) -> None:
+        self.server.wait_for_quits(count)
+        self.assertEqual(self.server.connections, count)
+        self.assertEqual(self.server.quits, count)
+
+    def test_queue_email_does_not_send(self):
+        email = self.queue()
+        self.assertEqual(email.status, OutboundEmail.PENDING)
+        self.assert_connections(0)
+
+    def test_queue_email_validates_headers(self):
+        with self.assertRaises(BadHeaderError):
+            queue_email("Sub\nject", "Body", "courseware@example.com", ["a@b.c"])
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_each_batch_uses_one_connection(self):
+        for index in range(5):
+            self.queue(f"student{index}@example.com")
+        self.assertEqual(send_queued_emails(batch_size=3), 3)
+        self.assert_connections(1)
+        self.assertEqual(len(self.server.delivered), 3)
+        self.assertEqual(send_queued_emails(batch_size=3), 2)
+        self.assert_connections(2)
+        # Nothing due, so nothing connects.
+        self.assertEqual(send_queued_emails(batch_size=3), 0)
+        self.assert_connections(2)
+        self.assertEqual(
+            sorted(self.server.delivered),
+            [[f"student{index}@example.com"] for index in range(5)],
+        )
+        self.assertFalse(
+            OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists()
+        )
+        self.assertFalse(OutboundEmail.objects.filter(sent_at=None).exists())
+
+    def test_command_keeps_one_connection_across_batches(self):
+        for index in range(5):
+            self.queue(f"student{index}@example.com")
+        call_command(
+            "send_queued_emails", "--once", "--batch-size", "2", stdout=io.StringIO()
+        )
+        self.assert_connections(1)
+        self.assertEqual(len(self.server.delivered), 5)
+
+    def test_failures_are_retried_with_backoff(self):
+        bouncing = self.queue(SMTPServer.BOUNCING)
+        self.queue()
+        for attempt in range(1, EMAIL_MAX_ATTEMPTS + 1):
+            before = timezone.now()
+            with self.assertLogs("core.utils", "WARNING"):
+                send_queued_emails()
+            bouncing.refresh_from_db()
+            self.assertEqual(bouncing.attempts, attempt)
+            self.assertIn(SMTPServer.BOUNCING, bouncing.last_error)
+            if attempt == EMAIL_MAX_ATTEMPTS:
+                break
+            self.assertEqual(bouncing.status, OutboundEmail.PENDING)
+            delay = EMAIL_RETRY_DELAY * 2 ** (attempt - 1)
+            self.assertGreaterEqual(bouncing.next_attempt_at, before + delay)
+            self.assertLessEqual(bouncing.next_attempt_at, timezone.now() + delay)
+            # Not due yet, so the next run leaves it alone.
+            self.assertEqual(send_queued_emails(), 0)
+            OutboundEmail.objects.filter(pk=bouncing.pk).update(
+                next_attempt_at=timezone.now()
+            )
+        self.assertEqual(bouncing.status, OutboundEmail.FAILED)
+        self.assertEqual(send_queued_emails(), 0)
+        # The refusal did not cost the connection: one per run.
+        self.assert_connections(EMAIL_MAX_ATTEMPTS)
+        # The other email went out on the first run, past the failure.
+        self.assertEqual(self.server.delivered, [["student@example.com"]])
+
+
+@override_settings(QUERY_PROFILER=1, QUERY_BUDGET_STRICT=1)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Every budgeted page of `core` stays within its budget. Transactions are
+    real here, so views count the same queries as when serving.
+    """
+
+    def setUp(self):
+        cache.clear()
+        # Unique emails, as the bound sign-up form looks them up.
+        self.admin, self.teacher, self.student = (
+            User.objects.create(
+                username=username, email=f"{username}@example.com", **flags
+            )
+            for username, flags in [
+                ("admin", {"is_superuser": True}),
+                ("teacher", {"is_staff": True}),
+                ("student", {}),
+            ]
+        )
+        department = Department.objects.create(
+            name="Mathematics", department_number=1, manager=self.teacher
+        )
+        Course.objects.create(
+            name="Algebra",
+            user=self.teacher,
+            teacher=self.teacher,
+            department=department,
+            course_number=1,
+            group_number=1,
+            first_day="Monday",
+            second_day="Wednesday",
+            start_time=datetime.time(10),
+            end_time=datetime.time(11, 30),
+        )
+        self.interval = Interval.objects.create(
+            teacher=self.teacher,
+            day="Tuesday",
+            start_time=datetime.time(10),
+            end_time=datetime.time(11),
+            capacity=10,
+        )
+
+    def requests(self):
+        teacher = {"username": "teacher"}
+        interval = {"username": "teacher", "pk": self.interval.pk}
+        course = {"course_number": 1}
+        department = {"department_number": 1}
+        return [
+            (None, "index", {}),
+            (None, "password_reset_request", {}),
+            (None, "contact_us", {}),
+            (None, "user_list", {}),
+            (None, "user_create", {}),
+            (None, "user_login", {}),
+            (None, "user_details", teacher),
+            (None, "course_list", {}),
+            (None, "course_details", course),
+            (None, "department_list", {}),
+            (None, "department_details", department),
+            (self.teacher, "notification_list", {}),
+            (self.teacher, "user_logout", {}),
+            (self.teacher, "user_update", teacher),
+            (self.teacher, "user_delete", teacher),
+            (self.teacher, "user_interval_create", teacher),
+            (self.teacher, "user_interval_update", interval),
+            (self.teacher, "user_interval_delete", interval),
+            (self.teacher, "course_create", {}),
+            (self.teacher, "course_update", course),
+            (self.teacher, "department_update", department),
+            (self.admin, "department_create", {}),
+            (self.student, "user_interval_reserve", interval),
+            (self.student, "user_interval_release", interval),
+            (self.student, "course_add_user", course),
+        ]
+
+    def test_pages_stay_within_budget(self):
+        for user, name, kwargs in self.requests():
+            if user is None:
+                self.client.logout()
+            else:
+                self.client.force_login(user)
+            with self.subTest(name=name), self.assertLogs("core.profiling", "INFO"):
+                response = self.client.get(reverse(f"core:{name}", kwargs=kwargs))
+                self.assertLess(response.status_code, 400)
+                self.assertEqual(
+                    response["X-DB-Query-Budget"], str(QUERY_BUDGETS[f"core:{name}"])
+                )
+                assert_within_query_budget(response)
+
+    def test_every_budget_is_exercised(self):
+        budgeted = {name for name in QUERY_BUDGETS if name.startswith("core:")}
+        self.assertEqual({f"core:{name}" for _, name, _ in self.requests()}, budgeted)
+
+    def test_strict_budget_raises(self):
+        with mock.patch.dict(QUERY_BUDGETS, {"core:user_list": 0}):
+            with self.assertRaises(QueryBudgetExceeded), self.assertLogs(
+                "core.profiling", "WARNING"
+            ):
+                self.client.get(reverse("core:user_list"))
+
+    @override_settings(QUERY_BUDGET_STRICT=0)
+    def test_assert_within_query_budget(self):
+        with mock.patch.dict(QUERY_BUDGETS, {"core:user_list": 0}), self.assertLogs(
+            "core.profiling", "WARNING"
+        ):
+            response = self.client.get(reverse("core:user_list"))
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaisesMessage(QueryBudgetExceeded, "core:user_list ran"):
+            assert_within_query_budget(response)
+
+
+class DepartmentPageCacheTests(TestCase):
+    """The cached department page lists the courses as they are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.department = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+
+    def setUp(self):
+        cache.clear()
+        set_response_cache(None)
+        self.url = reverse("core:department_details", args=[1])
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+    def tearDown(self):
+        set_response_cache(None)
+
+    def assert_lists(self, name: str) -> None:
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, name)
+
+    def test_saved_course_is_listed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = create_course(self.teacher, self.department, 1, "Algebra")
+        self.assert_lists("Algebra")
+        with self.captureOnCommitCallbacks(execute=True):
+            course.name = "Linear Algebra"
+            course.save()
+        self.assert_lists("Linear Algebra")
+
+    def test_open_write_keeps_the_cached_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                create_course(self.teacher, self.department, 1, "Algebra")
+                # Other requests still read the old rows, so nothing they
+                # render may be cached under the version of the new ones.
+                response = self.client.get(self.url)
+                self.assertEqual(response["X-Cache"], "HIT")
+                self.assertNotContains(response, "Algebra")
+        self.assert_lists("Algebra")
+
+    def test_imported_course_is_listed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            import_courses([course_record(1, "Algebra")])
+        self.assert_lists("Algebra")
+
+
+class FragmentCacheTests(TestCase):
+    """Cached fragments of signed-in pages are re-rendered once changes commit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.student = User.objects.create(username="student", email="s@example.com")
+        cls.mathematics = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+        cls.physics = Department.objects.create(
+            name="Physics", department_number=2, manager=cls.teacher
+        )
+        cls.course = create_course(cls.teacher, cls.mathematics, 1, "Algebra")
+
+    def setUp(self):
+        cache.clear()
+        # Signed-in pages skip the response cache and only reuse fragments.
+        self.client.force_login(self.teacher)
+
+    def get(self, name: str, number: int):
+        with mock.patch("builtins.print"):
+            return self.client.get(reverse(f"core:{name}", args=[number]))
+
+    def test_participants_are_re_rendered_after_an_enrollment(self):
+        self.assertNotContains(self.get("course_details", 1), "student")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.participants.add(self.student)
+        self.assertContains(self.get("course_details", 1), "student")
+
+    def test_courses_are_re_rendered_after_a_department_move(self):
+        self.assertContains(self.get("department_details", 1), "Algebra")
+        self.assertNotContains(self.get("department_details", 2), "Algebra")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.department = self.physics
+            self.course.save()
+        self.assertNotContains(self.get("department_details", 1), "Algebra")
+        self.assertContains(self.get("department_details", 2), "Algebra")
+
+
+class CourseSearchTests(TestCase):
+    """The in-memory course index ranks, matches word prefixes and follows other processes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(
+            username="teacher", first_name="Emmy", last_name="Noether", is_staff=True
+        )
+        cls.mathematics = Department.objects.create(
+            name="Mathematics", department_number=1, manager=cls.teacher
+        )
+        cls.algebra = create_course(cls.teacher, cls.mathematics, 1, "Linear Algebra")
+        cls.geometry = create_course(cls.teacher, cls.mathematics, 2, "Geometry")
+
+    def setUp(self):
+        cache.clear()
+        # The backend of this process; other instances play other processes.
+        self.backend = search.InMemoryCourseSearchBackend()
+        patcher = mock.patch.object(search, "_course_backend", self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, q: str, backend=None) -> list[str]:
+        backend = backend or self.backend
+        return [course.name for course in backend.search(q, limit=10)]
+
+    def test_terms_match_the_start_of_words(self):
+        self.assertEqual(self.names("alg"), ["Linear Algebra"])
+        self.assertEqual(self.names("LINEAR alg"), ["Linear Algebra"])
+        self.assertEqual(self.names("ear"), [])
+        self.assertEqual(self.names("linear geo"), [])
+
+    def test_name_matches_rank_first(self):
+        # "Mathematics" is the department of both, but the name of one only.
+        history = create_course(
+            self.teacher, self.mathematics, 3, "Mathematics History"
+        )
+        self.assertEqual(
+            self.names("math"), [history.name, "Linear Algebra", "Geometry"]
+        )
+
+    def test_abstract_loaders_are_required(self):
+        class Incomplete(search.SharedInMemoryIndex):
+            def load_all(self) -> None:
+                pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_other_process_picks_up_changes(self):
+        other = search.InMemoryCourseSearchBackend()
+        self.assertEqual(self.names("alg", other), ["Linear Algebra"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.algebra.name = "Topology"
+            self.algebra.save()
+        # Only the changed course is read back, then the results.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.names("topo", other), ["Topology"])
+        self.assertEqual(self.names("alg", other), [])
+
+    def test_import_announces_each_batch_once(self):
+        other = search.InMemoryCourseSearchBackend()
+        self.assertEqual(self.names("calc", other), [])
+        generation = get_generation(COURSE_SEARCH)
+        records = [
+            course_record(number, f"Calculus {number}") for number in range(10, 15)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            import_courses(records, batch_size=2)
+        self.assertEqual(get_generation(COURSE_SEARCH), generation + 3)
+        # Caught up from the ids of the batches, without a rebuild.
+        with mock.patch.object(other, "load_all") as load_all:
+            self.assertEqual(len(self.names("calc", other)), 5)
+        load_all.assert_not_called()
+        self.assertEqual(len(self.names("calc")), 5)
+
+    def test_rolled_back_change_is_not_indexed(self):
+        self.assertEqual(self.names("alg"), ["Linear Algebra"])
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.algebra.name = "Topology"
+                self.algebra.save()
+                raise RuntimeError
+        self.assertEqual(self.names("topo"), [])
+        self.assertEqual(self.names("alg"), ["Linear Algebra"])
+
+
+class UserDirectoryTests(TestCase):
+    """The user directory pages each role by username after its own cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            [User(username=f"alice{number:02}") for number in range(30)]
+            + [User(username=f"bob{number:02}") for number in range(30)]
+            + [User(username=f"teacher{number}", is_staff=True) for number in range(2)]
+        )
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(
+            search, "_user_backend", search.InMemoryUserSearchBackend()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        with mock.patch("builtins.print"):
+            return self.client.get(reverse("core:user_list"), params)
+
+    def usernames(self, response, role: str) -> list[str]:
+        return [user.username for user in response.context[f"{role}_users"]]
+
+    def test_students_continue_after_the_cursor(self):
+        first = self.get()
+        self.assertEqual(len(self.usernames(first, "student")), 25)
+        self.assertEqual(self.usernames(first, "teacher"), ["teacher0", "teacher1"])
+        self.assertIsNone(first.context["teachers_next"])
+        after = first.context["students_next"]
+        self.assertEqual(after, "alice24")
+        self.assertContains(first, "?students_after=alice24")
+        pages = [self.usernames(first, "student")]
+        while after:
+            response = self.get(students_after=after)
+            pages.append(self.usernames(response, "student"))
+            after = response.context["students_next"]
+        self.assertEqual([len(page) for page in pages], [25, 25, 10])
+        expected = [
+            f"{name}{number:02}" for name in ("alice", "bob") for number in range(30)
+        ]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_query_carries_over_to_the_next_page(self):
+        first = self.get(q="bob")
+        self.assertEqual(first.context["students_next"], "bob24")
+        self.assertContains(first, "?q=bob&students_after=bob24")
+        second = self.get(q="bob", students_after="bob24")
+        self.assertEqual(
+            self.usernames(second, "student"),
+            [f"bob{number:02}" for number in range(25, 30)],
+        )
+        self.assertIsNone(second.context["students_next"])
+        self.assertEqual(self.usernames(second, "teacher"), [])
+
+
+class NotificationTests(TestCase):
+    """Opening notifications marks them read at once; the cached summary follows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.student = User.objects.create(username="student", email="s@example.com")
+
+    def setUp(self):
+        cache.clear()
+
+    def notify(self, description: str, **kwargs) -> None:
+        dispatch_notifications(
+            self.teacher, [self.student.pk], "Message", description, **kwargs
+        )
+
+    def unread_count(self) -> int:
+        return get_unread_summary(self.student)["count"]
+
+    def test_opening_marks_the_shown_notifications_read_at_once(self):
+        for number in range(3):
+            self.notify(f"Message {number}")
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("core:notification_list"))
+        self.assertContains(response, "Message 2")
+        updates = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "notifications_notification"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(Notification.objects.filter(unread=True).exists())
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_summary_follows_dispatches_and_reads(self):
+        self.assertEqual(self.unread_count(), 0)
+        self.notify("Room changed")
+        summary = get_unread_summary(self.student)
+        self.assertEqual(summary["count"], 1)
+        self.assertEqual(summary["recent"][0]["description"], "Room changed")
+        self.notify("Deferred", defer=True)
+        self.assertEqual(self.unread_count(), 1)
+        deliver_deferred_notifications()
+        self.assertEqual(self.unread_count(), 2)
+        notification = Notification.objects.get(description="Deferred")
+        notification.mark_as_read()
+        self.assertEqual(self.unread_count(), 1)
+        mark_notifications_read(
+            self.student.pk, Notification.objects.values_list("pk", flat=True)
+        )
+        self.assertEqual(self.unread_count(), 0)
+
+
+class UserVersionTests(TestCase):
+    """Saving a user only changes the versions of resources when a shown name changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.teacher.refresh_from_db()
+        self.versions = self.current_versions()
+
+    def current_versions(self) -> dict:
+        return {name: get_version(name) for name in USER_RESOURCES}
+
+    def save(self, **kwargs) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.save(**kwargs)
+
+    def test_profile_changes_keep_versions(self):
+        self.teacher.bio = "Teaches *algebra*."
+        self.teacher.gender = "Female"
+        self.save()
+        self.teacher.last_login = timezone.now()
+        self.save(update_fields=["last_login"])
+        self.teacher.image_variants = {"small": "small.webp"}
+        self.save(update_fields=["image_hash", "image_variants"])
+        self.assertEqual(self.current_versions(), self.versions)
+
+    def test_name_change_bumps_every_resource(self):
+        self.teacher.first_name = "Emmy"
+        self.save()
+        versions = self.current_versions()
+        for name in USER_RESOURCES:
+            self.assertNotEqual(versions[name], self.versions[name], name)
+
+
+def image_upload(name: str, size: tuple[int, int], mode: str = "RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, "teal").save(buffer, format=name.rsplit(".", 1)[-1])
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ProfileImageTests(TestCase):
+    """Uploads get their variants and a bounded original; replaced files go away."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Processes on the test thread, inside the test transaction.
+        patcher = mock.patch("core.models.schedule_user_image")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, user: User, image) -> User:
+        with self.captureOnCommitCallbacks(execute=True):
+            user.image = image
+            user.save()
+        images.process_user_image(user.pk)
+        return User.objects.get(pk=user.pk)
+
+    def dimensions(self, name: str) -> tuple[int, int]:
+        with default_storage.open(name) as file, Image.open(file) as image:
+            return image.size
+
+    def test_large_upload_is_scaled_down(self):
+        stale = User.objects.create(username="student")
+        user = self.upload(stale, image_upload("photo.jpeg", (4000, 1000)))
+        self.assertEqual(self.dimensions(user.image.name), (2048, 512))
+        self.assertTrue(user.image.name.endswith(".jpg"))
+        self.assertEqual(default_storage.listdir("")[1], [user.image.name])
+        with default_storage.open(user.image.name) as file:
+            self.assertEqual(user.image_hash, images.content_hash(file.read()))
+        self.assertEqual(self.dimensions(user.image_variants["full"]), (2048, 512))
+        self.assertEqual(self.dimensions(user.image_variants["small.webp"]), (64, 16))
+        # Saving an instance loaded before the swap keeps the scaled-down copy.
+        stale.bio = "Hello"
+        stale.save()
+        self.assertEqual(User.objects.get(pk=user.pk).image.name, user.image.name)
+
+    def test_small_upload_is_kept(self):
+        user = User.objects.create(username="student")
+        user = self.upload(user, image_upload("logo.png", (300, 200), "RGBA"))
+        self.assertTrue(user.image.name.startswith("logo_"))
+        self.assertEqual(self.dimensions(user.image.name), (300, 200))
+        self.assertTrue(user.image_variants["medium"].endswith("/medium.png"))
+        self.assertEqual(self.dimensions(user.image_variants["medium"]), (256, 171))
+
+    def test_replaced_image_is_deleted_unless_shared(self):
+        student = self.upload(
+            User.objects.create(username="student"), image_upload("a.png", (80, 80))
+        )
+        other = self.upload(
+            User.objects.create(username="other", email="o@example.com"),
+            image_upload("a.png", (80, 80)),
+        )
+        self.assertEqual(student.image_hash, other.image_hash)
+        old_name, old_variants = student.image.name, student.image_variants
+        student = self.upload(student, image_upload("b.png", (90, 90)))
+        self.assertFalse(default_storage.exists(old_name))
+        # `other` still shows the variants of the same bytes.
+        self.assertTrue(default_storage.exists(old_variants["small"]))
+        other_name = other.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            other.image = None
+            other.save()
+        self.assertFalse(default_storage.exists(other_name))
+        self.assertFalse(default_storage.exists(old_variants["small"]))
+        self.assertTrue(default_storage.exists(student.image_variants["small"]))
+
+    def test_finishing_waits_for_scheduled_images(self):
+        processed = []
+
+        def process_slowly(pk):
+            time.sleep(0.1)
+            processed.append(pk)
+
+        with mock.patch.object(images, "process_user_image", process_slowly):
+            with self.captureOnCommitCallbacks(execute=True):
+                images.schedule_user_image(1)
+                images.schedule_user_image(2)
+            self.assertEqual(processed, [])
+            images.finish_scheduled_images()
+            self.assertEqual(sorted(processed), [1, 2])
+            # A process that keeps serving starts new threads.
+            with self.captureOnCommitCallbacks(execute=True):
+                images.schedule_user_image(3)
+            images.finish_scheduled_images()
+        self.assertEqual(sorted(processed), [1, 2, 3])
+
+
+class MarkdownTests(TestCase):
+    """Markdown renders once per text and is stored next to the fields it renders."""
+
+    def setUp(self):
+        patcher = mock.patch.object(utils, "markdown_cache", LRUCache(2))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_identical_texts_render_once(self):
+        with mock.patch.object(
+            utils, "get_markdown_engine", wraps=utils.get_markdown_engine
+        ) as engine:
+            self.assertEqual(render_markdown("*Hi*"), "<p><em>Hi</em></p>")
+            self.assertEqual(render_markdown("*Hi*"), "<p><em>Hi</em></p>")
+            self.assertEqual(engine.call_count, 1)
+            render_markdown("One")
+            render_markdown("Two")
+            # The cache holds two texts, so the first was evicted.
+            render_markdown("*Hi*")
+            self.assertEqual(engine.call_count, 4)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_engine_is_reused_per_thread(self):
+        engine = utils.get_markdown_engine()
+        self.assertIs(utils.get_markdown_engine(), engine)
+        others = []
+        thread = threading.Thread(
+            target=lambda: others.append(utils.get_markdown_engine())
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(others[0], engine)
+        # State of an earlier text does not leak into the next one.
+        render_markdown("[a]: http://example.com\n\n[a]")
+        self.assertEqual(render_markdown("[a]"), "<p>[a]</p>")
+
+    def test_filter_renders_markdown(self):
+        template = Template("{% load markdown_extras %}{{ text|markdown|safe }}")
+        html = template.render(Context({"text": "```\ncode\n```"}))
+        self.assertEqual(html, "<pre><code>code\n</code></pre>")
+
+    def test_html_columns_follow_saves(self):
+        user = User.objects.create(username="student", bio="**Bold**")
+        self.assertEqual(user.bio_html, "<p><strong>Bold</strong></p>")
+        user.bio = "_New_"
+        user.save(update_fields=["first_name"])
+        user.refresh_from_db()
+        self.assertEqual(user.bio_html, "<p><strong>Bold</strong></p>")
+        user.bio = "_New_"
+        user.save(update_fields=["bio"])
+        user.refresh_from_db()
+        self.assertEqual(user.bio_html, "<p><em>New</em></p>")
+        user.bio = ""
+        user.save()
+        user.refresh_from_db()
+        self.assertIsNone(user.bio_html)
+        department = Department.objects.create(
+            name="Mathematics",
+            department_number=1,
+            manager=user,
+            description="# Numbers",
+        )
+        department.refresh_from_db()
+        self.assertEqual(department.description_html, "<h1>Numbers</h1>")
+
+
+class IntervalDeletionNotificationTests(TestCase):
+    """Deleting an interval notifies each reserving student once, in bulk."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username="teacher", is_staff=True)
+        cls.students = User.objects.bulk_create(
+            User(username=f"student{number}", email=f"s{number}@example.com")
+            for number in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.interval = Interval.objects.create(
+            teacher=self.teacher,
+            day="Tuesday",
+            start_time=datetime.time(10),
+            end_time=datetime.time(11),
+            capacity=5,
+        )
+        self.interval.reserving_students.add(*self.students)
+        self.client.force_login(self.teacher)
+
+    def delete(self) -> list[str]:
+        """Deletes the interval and returns the inserts of notifications."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("core:user_interval_delete", args=["teacher", self.interval.pk])
+            )
+        inserts = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "notifications_notification"')
+        ]
+        self.assertRedirects(response, reverse("core:user_details", args=["teacher"]))
+        self.assertFalse(Interval.objects.filter(pk=self.interval.pk).exists())
+        return inserts
+
+    def assert_notified(self) -> None:
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient_id", flat=True)),
+            sorted(student.pk for student in self.students),
+        )
+        self.assertEqual(
+            set(Notification.objects.values_list("description", flat=True)),
+            {f"Teacher teacher deleted Interval on {self.interval}"},
+        )
+
+    def test_students_are_notified_once_with_one_insert(self):
+        self.assertEqual(len(self.delete()), 1)
+        self.assert_notified()
+
+    def test_large_audiences_are_deferred_to_the_worker(self):
+        with mock.patch("core.notifications.FANOUT_INLINE_LIMIT", 2):
+            self.assertEqual(self.delete(), [])
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationFanout.objects.count(), 1)
+        call_command("deliver_notifications", "--once", stdout=io.StringIO())
+        self.assertFalse(NotificationFanout.objects.exists())
+        self.assert_notified()
+
+
+class SyntheticDatasetTests(TestCase):
+    """Generated datasets follow the spec and the model rules, and repeat by seed."""
+
+    spec = DatasetSpec(
+        prefix="test",
+        departments=2,
+        teachers=4,
+        students=30,
+        courses=12,
+        intervals=3,
+        enrollments=2,
+        reservations=2,
+        capacity=5,
+        batch_size=7,
+    )
+
+    def load(self, **kwargs) -> dict:
+        return SyntheticDataset(replace(self.spec, **kwargs)).load()
+
+    def snapshot(self) -> dict:
+        return {
+            "users": list(
+                User.objects.order_by("username").values_list(
+                    "username", "first_name", "last_name", "gender", "is_staff"
+                )
+            ),
+            "courses": list(
+                Course.objects.order_by("course_number").values_list(
+                    "course_number",
+                    "name",
+                    "teacher__username",
+                    "department__department_number",
+                    "first_day",
+                    "second_day",
+                    "start_time",
+                    "end_time",
+                )
+            ),
+            "intervals": list(
+                Interval.objects.order_by(
+                    "teacher__username", "day", "start_time"
+                ).values_list("teacher__username", "day", "start_time", "end_time")
+            ),
+            "enrollments": sorted(
+                Enrollment.objects.values_list(
+                    "user__username", "course__course_number"
+                )
+            ),
+            "reservations": sorted(
+                Reservation.objects.values_list(
+                    "user__username",
+                    "interval__teacher__username",
+                    "interval__day",
+                    "interval__start_time",
+                )
+            ),
+        }
+
+    def test_rows_follow_the_spec_and_the_rules(self):
+        writers = self.load()
+        self.assertEqual(writers["teachers"].rows, 4)
+        self.assertEqual(writers["students"].rows, 30)
+        self.assertEqual(Department.objects.count(), 2)
+        self.assertEqual(Course.objects.count(), 12)
+        self.assertEqual(Interval.objects.count(), 12)
+        self.assertTrue(
+            User.objects.get(username="test-student-0").check_password("synthetic")
+        )
+        for course in Course.objects.all():
+            course.full_clean()
+        for teacher in User.objects.filter(is_staff=True):
+            intervals = list(teacher.intervals.all())
+            for interval in intervals:
+                interval.full_clean()
+                others = [other for other in intervals if other.pk != interval.pk]
+                self.assertFalse(interval_has_overlap(others, interval))
+        for interval in Interval.objects.annotate(seats=Count("reserving_students")):
+            self.assertEqual(interval.reserved_count, interval.seats)
+            self.assertLessEqual(interval.seats, 5)
+        for student in User.objects.filter(is_staff=False):
+            courses = list(student.participated_courses.all())
+            intervals = list(student.reserved_intervals.all())
+            self.assertLessEqual(len(courses), 2)
+            self.assertLessEqual(len(intervals), 2)
+            occupied = 0
+            for mask in [*map(course_mask, courses), *map(interval_mask, intervals)]:
+                self.assertFalse(occupied & mask, student.username)
+                occupied |= mask
+        self.assertGreater(Enrollment.objects.count(), 0)
+        self.assertGreater(Reservation.objects.count(), 0)
+
+    def test_same_seed_same_rows(self):
+        self.load()
+        first = self.snapshot()
+        clear_dataset("test")
+        self.assertFalse(User.objects.exists())
+        self.load()
+        self.assertEqual(self.snapshot(), first)
+        clear_dataset("test")
+        self.load(seed=1)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_command_refuses_to_load_twice(self):
+        options = ["--prefix", "test", "--teachers", "2", "--students", "5"]
+        options += ["--courses", "3", "--departments", "1"]
+        out = io.StringIO()
+        call_command("generate_dataset", *options, stdout=out)
+        self.assertIn("Loaded", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", *options, stdout=io.StringIO())
+        call_command("generate_dataset", *options, "--clear", stdout=io.StringIO())
+        self.assertEqual(User.objects.filter(is_staff=False).count(), 5)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+import datetime
+from collections.abc import Iterable
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, signals
+from django.dispatch import receiver
+from core.models import Course, Interval, User
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+MINUTES_PER_DAY = 24 * 60
+
+CACHE_KEY = "timetable:{}"
+CACHE_TIMEOUT = 60 * 60 * 24
+# Backends whose entries only the process that wrote them can see.
+LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+Enrollment = Course.participants.through
+Reservation = Interval.reserving_students.through
+
+
+def minute_of_day(time: datetime.time, round_up: bool = False) -> int:
+    minute = time.hour * 60 + time.minute
+    if round_up and (time.second or time.microsecond):
+        minute += 1
+    return minute
+
+
+def slot_mask(day: str, start_time: datetime.time, end_time: datetime.time) -> int:
+    """
+    Returns a weekly bitmap with one bit per minute of `day` between
+    `start_time` and `end_time`. Unknown days occupy nothing.
+    """
+    try:
+        offset = WEEKDAYS.index(day.lower()) * MINUTES_PER_DAY
+    except ValueError:
+        return 0
+    start = minute_of_day(start_time)
+    end = minute_of_day(end_time, round_up=True)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << (offset + start)
+
+
+def course_mask(course: Course) -> int:
+    return slot_mask(course.first_day, course.start_time, course.end_time) | slot_mask(
+        course.second_day, course.start_time, course.end_time
+    )
+
+
+def interval_mask(interval: Interval) -> int:
+    return slot_mask(interval.day, interval.start_time, interval.end_time)
+
+
+def build_timetables(student_ids: Iterable[int]) -> dict[int, int]:
+    """Builds the weekly occupancy of many students with two queries."""
+    masks = {student_id: 0 for student_id in student_ids}
+    courses = Enrollment.objects.filter(user_id__in=masks).values_list(
+        "user_id",
+        "course__first_day",
+        "course__second_day",
+        "course__start_time",
+        "course__end_time",
+    )
+    for student_id, first_day, second_day, start_time, end_time in courses:
+        masks[student_id] |= slot_mask(first_day, start_time, end_time) | slot_mask(
+            second_day, start_time, end_time
+        )
+    intervals = Reservation.objects.filter(user_id__in=masks).values_list(
+        "user_id", "interval__day", "interval__start_time", "interval__end_time"
+    )
+    for student_id, day, start_time, end_time in intervals:
+        masks[student_id] |= slot_mask(day, start_time, end_time)
+    return masks
+
+
+def get_timetables(student_ids: Iterable[int]) -> dict[int, int]:
+    """Returns the cached weekly occupancy of each student, building missing ones."""
+    keys = {CACHE_KEY.format(student_id): student_id for student_id in student_ids}
+    cached = cache.get_many(keys)
+    masks = {keys[key]: mask for key, mask in cached.items()}
+    missing = [student_id for student_id in keys.values() if student_id not in masks]
+    if missing:
+        built = build_timetables(missing)
+        cache.set_many(
+            {CACHE_KEY.format(student_id): mask for student_id, mask in built.items()},
+            CACHE_TIMEOUT,
+        )
+        masks.update(built)
+    return masks
+
+
+def get_timetable(student: User) -> int:
+    return get_timetables([student.pk])[student.pk]
+
+
+def cache_is_shared() -> bool:
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def cached_conflict(student: User, mask: int) -> bool:
+    """
+    Whether the cached timetable of `student` already collides with `mask`,
+    which refuses a request without a transaction. A per-process cache
+    misses what other processes changed, so it is not trusted for this.
+    """
+    return cache_is_shared() and bool(get_timetable(student) & mask)
+
+
+def lock_timetables(student_ids: Iterable[int]) -> dict[int, int]:
+    """
+    Locks the rows of the students until the transaction ends and returns
+    their occupancy as stored in the database, refreshing the cache.
+    Memberships are only added with this lock held, so the answer holds
+    until the transaction commits, whatever the cache said.
+    """
+    student_ids = sorted(set(student_ids))
+    students = User.objects.filter(pk__in=student_ids)
+    if connection.features.has_select_for_update:
+        # Locking in `pk` order keeps batches of students from deadlocking.
+        list(students.select_for_update().order_by("pk").values_list("pk", flat=True))
+    else:
+        # SQLite has no row locks. A write takes its database lock up front,
+        # as upgrading to it after the reads below fails under contention.
+        students.update(id=F("id"))
+    masks = build_timetables(student_ids)
+    cache.set_many(
+        {CACHE_KEY.format(student_id): mask for student_id, mask in masks.items()},
+        CACHE_TIMEOUT,
+    )
+    return masks
+
+
+def occupy(student_ids: Iterable[int], mask: int) -> None:
+    """Adds `mask` to the cached timetables; uncached ones are built on demand."""
+    keys = [CACHE_KEY.format(student_id) for student_id in student_ids]
+    cached = cache.get_many(keys)
+    if cached:
+        cache.set_many(
+            {key: value | mask for key, value in cached.items()}, CACHE_TIMEOUT
+        )
+
+
+def invalidate(student_ids: Iterable[int]) -> None:
+    cache.delete_many([CACHE_KEY.format(student_id) for student_id in student_ids])
+
+
+def course_members(course: Course):
+    return Enrollment.objects.filter(course_id=course.pk).values_list(
+        "user_id", flat=True
+    )
+
+
+def interval_members(interval: Interval):
+    return Reservation.objects.filter(interval_id=interval.pk).values_list(
+        "user_id", flat=True
+    )
+
+
+def _on_membership_changed(instance, action, reverse, pk_set, model, mask_of, members):
+    # With `reverse` the instance is the student, otherwise the course or interval.
+    if action == "post_add":
+        if reverse:
+            mask = 0
+            for item in model.objects.filter(pk__in=pk_set):
+                mask |= mask_of(item)
+            occupy([instance.pk], mask)
+        else:
+            occupy(pk_set, mask_of(instance))
+    elif action == "post_remove":
+        invalidate([instance.pk] if reverse else pk_set)
+    elif action == "pre_clear":
+        invalidate([instance.pk] if reverse else members(instance))
+
+
+@receiver(signals.m2m_changed, sender=Enrollment, dispatch_uid="timetable_courses")
+def update_timetable_on_enrollment(sender, instance, action, reverse, pk_set, **kwargs):
+    _on_membership_changed(
+        instance, action, reverse, pk_set, Course, course_mask, course_members
+    )
+
+
+@receiver(signals.m2m_changed, sender=Reservation, dispatch_uid="timetable_intervals")
+def update_timetable_on_reservation(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    _on_membership_changed(
+        instance, action, reverse, pk_set, Interval, interval_mask, interval_members
+    )
+
+
+@receiver(signals.post_save, sender=Course, dispatch_uid="timetable_course_save")
+def invalidate_course_timetables(sender, instance, created, **kwargs):
+    if not created:
+        invalidate(course_members(instance))
+
+
+@receiver(signals.post_save, sender=Interval, dispatch_uid="timetable_interval_save")
+def invalidate_interval_timetables(sender, instance, created, **kwargs):
+    if not created:
+        invalidate(interval_members(instance))
+
+
+@receiver(signals.pre_delete, sender=Course, dispatch_uid="timetable_course_delete")
+def invalidate_timetables_on_course_delete(sender, instance, **kwargs):
+    invalidate(course_members(instance))
+
+
+@receiver(signals.pre_delete, sender=Interval, dispatch_uid="timetable_interval_delete")
+def invalidate_timetables_on_interval_delete(sender, instance, **kwargs):
+    invalidate(interval_members(instance))
@@ -1,6 +1,6 @@
 from django.urls import path
 from core import views
-
+from core.profiling import declare_query_budgets
 
 app_name = "core"
 
@@ -15,6 +15,7 @@ urlpatterns = [
         name="password_reset_request",
     ),
     path("support/", views.contact_us_view, name="contact_us"),
+    path("notifications/", views.notification_list_view, name="notification_list"),
     path("users/", views.user_list_view, name="user_list"),
     path("users/create", views.user_create_view, name="user_create"),
     path("users/login", views.user_login_view, name="user_login"),
@@ -77,3 +78,34 @@ urlpatterns = [
         name="department_update",
     ),
 ]
+
+declare_query_budgets(
+    app_name,
+    {
+        "index": 6,
+        "password_reset_request": 5,
+        "contact_us": 5,
+        "notification_list": 6,
+        "user_list": 6,
+        "user_create": 8,
+        "user_login": 6,
+        "user_logout": 5,
+        "user_details": 8,
+        "user_delete": 25,
+        "user_update": 8,
+        "user_interval_create": 7,
+        "user_interval_update": 8,
+        "user_interval_delete": 10,
+        "user_interval_reserve": 9,
+        "user_interval_release": 7,
+        "course_list": 6,
+        "course_create": 7,
+        "course_details": 10,
+        "course_update": 9,
+        "course_add_user": 8,
+        "department_list": 6,
+        "department_create": 6,
+        "department_details": 8,
+        "department_update": 7,
+    },
+)
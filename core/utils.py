@@ -1,6 +1,14 @@
 from __future__ import annotations
+import hashlib
 import json
+import logging
 import smtplib
+import threading
+from datetime import timedelta
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterable
+import markdown as md
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from django.core.mail import send_mail
@@ -12,7 +20,20 @@ from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes
 from django.conf import settings
-from django.core.mail import send_mail, BadHeaderError
+from django.core.mail import send_mail, BadHeaderError, EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Prefetch, prefetch_related_objects
+from django.shortcuts import get_object_or_404
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_EXTENSIONS = ["markdown.extensions.fenced_code"]
+MARKDOWN_CACHE_SIZE = 1024
+
+EMAIL_BATCH_SIZE = 50
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_DELAY = timedelta(seconds=30)
 
 
 class ContactSupportException(Exception):
@@ -40,13 +61,26 @@ class EmailSender:
         self.text = text
         self.login_to_email()
 
+    # Logged-in SMTP sessions shared by every `EmailSender` of the process.
+    sessions: dict[str, smtplib.SMTP] = {}
+    sessions_lock = threading.Lock()
+
     def login_to_email(self) -> None:
         email = self.support_email
         password = self.support_password
-        session = smtplib.SMTP("smtp.gmail.com", 587)
-        session.ehlo()
-        session.starttls()
-        session.login(email, password)
+        with self.sessions_lock:
+            session = self.sessions.get(email)
+            if session is not None:
+                try:
+                    session.noop()
+                except (smtplib.SMTPException, OSError):
+                    session = None
+            if session is None:
+                session = smtplib.SMTP("smtp.gmail.com", 587)
+                session.ehlo()
+                session.starttls()
+                session.login(email, password)
+                self.sessions[email] = session
         self.session: smtplib.SMTP = session
 
     def configure_email_message(self) -> MIMEMultipart:
@@ -62,8 +96,8 @@ class EmailSender:
     def send_email(self) -> None:
         message = self.configure_email_message()
         text = message.as_string()
-        self.session.sendmail(self.support_email, self.customer_email, text)
-        self.session.quit()
+        with self.sessions_lock:
+            self.session.sendmail(self.support_email, self.customer_email, text)
 
 
 def send_email_to_support_manual(
@@ -96,19 +130,18 @@ def send_email_to_support(
     message: str,
     customer_email: str,
 ):
-    subject = subject
-    message = message
     recipient_list = [settings.SUPPORT_EMAIL]
-    subject += f"\nThis Email was sent from {customer_email}."
+    # Header values can not span lines, so the sender goes into the body.
+    message += f"\n\nThis Email was sent from {customer_email}."
     try:
-        send_mail(
+        queue_email(
             subject=subject,
-            message=message,
+            body=message,
             from_email=settings.EMAIL_HOST_USER,
             recipient_list=recipient_list,
         )
     except Exception as e:
-        print(e)  # This should be replaces with logging system.
+        logger.exception(e)
         raise ContactSupportException
 
 
@@ -131,9 +164,9 @@ def send_password_reset_email(request, user):
     }
     email_text = render_to_string(email_template, content_map)
     try:
-        send_mail(
+        queue_email(
             subject=subject,
-            message=email_text,
+            body=email_text,
             from_email=settings.EMAIL_HOST_USER,
             recipient_list=[user.email],
         )
@@ -141,6 +174,75 @@ def send_password_reset_email(request, user):
         raise PasswordResetEmailException
 
 
+def queue_email(
+    subject: str, body: str, from_email: str, recipient_list: list[str]
+) -> models.OutboundEmail:
+    """
+    Stores an email in the outbound queue instead of talking to SMTP inside
+    the request. Headers are validated right away, so `BadHeaderError` is
+    still raised to the caller. `send_queued_emails` delivers the queue.
+    """
+    EmailMessage(subject, body, from_email, recipient_list).message()
+    return models.OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or "",
+        recipients=list(recipient_list),
+    )
+
+
+def send_queued_emails(connection=None, batch_size: int = EMAIL_BATCH_SIZE) -> int:
+    """
+    Sends one batch of due emails over a single SMTP `connection` and returns
+    how many were handled. Failed emails are retried with exponential backoff
+    and given up on after `EMAIL_MAX_ATTEMPTS`.
+    """
+    connection = connection or get_connection()
+    with transaction.atomic():
+        emails = list(
+            models.OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=models.OutboundEmail.PENDING,
+                next_attempt_at__lte=timezone.now(),
+            )
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        # `send_messages` connects and disconnects for every call unless the
+        # connection is open already, e.g. by the `send_queued_emails` command.
+        opened = bool(emails) and connection.open()
+        try:
+            for email in emails:
+                message = EmailMessage(
+                    email.subject,
+                    email.body,
+                    email.from_email or None,
+                    email.recipients,
+                    connection=connection,
+                )
+                email.attempts += 1
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    logger.warning("Sending email %s failed: %s", email.pk, e)
+                    email.last_error = str(e)
+                    if email.attempts >= EMAIL_MAX_ATTEMPTS:
+                        email.status = models.OutboundEmail.FAILED
+                    else:
+                        delay = EMAIL_RETRY_DELAY * 2 ** (email.attempts - 1)
+                        email.next_attempt_at = timezone.now() + delay
+                else:
+                    email.status = models.OutboundEmail.SENT
+                    email.sent_at = timezone.now()
+        finally:
+            if opened:
+                connection.close()
+        models.OutboundEmail.objects.bulk_update(
+            emails,
+            ["status", "attempts", "next_attempt_at", "last_error", "sent_at"],
+        )
+    return len(emails)
+
+
 def uuid_namer(instance, file_name: str) -> str:
     name, ext = file_name.split(".")
     return f"{name}_{str(uuid4())}.{ext}"
@@ -179,3 +281,160 @@ def interval_has_overlap(
         ):
             return True
     return False
+
+
+class IntervalIndex:
+    """
+    Sorted per-day index over a teacher's intervals.
+    Each day keeps its intervals ordered by `start_time` together with
+    the running maximum of their `end_time`, so an overlap query is a
+    single binary search. Gives the same answers as `interval_has_overlap`.
+    """
+
+    def __init__(self, intervals: Iterable[models.Interval] = ()):
+        self._intervals: dict[str, list] = {}
+        self._starts: dict[str, list] = {}
+        self._max_ends: dict[str, list] = {}
+        for interval in intervals:
+            self._intervals.setdefault(interval.day, []).append(interval)
+        for day in self._intervals:
+            self._rebuild(day)
+
+    @classmethod
+    def for_teacher(cls, teacher: models.User, exclude_pk: int | None = None):
+        intervals = models.Interval.objects.filter(teacher=teacher).only(
+            "day", "start_time", "end_time"
+        )
+        if exclude_pk is not None:
+            intervals = intervals.exclude(pk=exclude_pk)
+        return cls(intervals)
+
+    def _rebuild(self, day: str) -> None:
+        intervals = self._intervals[day]
+        intervals.sort(key=lambda interval: interval.start_time)
+        self._starts[day] = [interval.start_time for interval in intervals]
+        max_ends = []
+        for interval in intervals:
+            if not max_ends or interval.end_time > max_ends[-1]:
+                max_ends.append(interval.end_time)
+            else:
+                max_ends.append(max_ends[-1])
+        self._max_ends[day] = max_ends
+
+    def add(self, interval: models.Interval) -> None:
+        self._intervals.setdefault(interval.day, []).append(interval)
+        self._rebuild(interval.day)
+
+    def overlaps(self, new_interval: models.Interval) -> bool:
+        starts = self._starts.get(new_interval.day)
+        if not starts:
+            return False
+        # Only intervals starting no later than the new one ends can collide,
+        # and one of them does if the latest end among them is past its start.
+        position = bisect_right(starts, new_interval.end_time)
+        if position == 0:
+            return False
+        return self._max_ends[new_interval.day][position - 1] > new_interval.start_time
+
+    def overlaps_many(self, new_intervals: Iterable[models.Interval]) -> list[bool]:
+        """Checks every candidate against the indexed intervals, e.g. for bulk imports."""
+        return [self.overlaps(new_interval) for new_interval in new_intervals]
+
+
+def interval_overlap_exists(
+    teacher: models.User,
+    new_interval: models.Interval,
+    exclude_pk: int | None = None,
+) -> bool:
+    """Database-side `interval_has_overlap`, answered with a single `EXISTS` query."""
+    intervals = models.Interval.objects.filter(
+        teacher=teacher,
+        day=new_interval.day,
+        start_time__lte=new_interval.end_time,
+        end_time__gt=new_interval.start_time,
+    )
+    if exclude_pk is not None:
+        intervals = intervals.exclude(pk=exclude_pk)
+    return intervals.exists()
+
+
+def load_user_profile(username: str) -> models.User:
+    """
+    Fetches the `User` shown on the profile page together with everything
+    `user_details.html` iterates, so rendering takes a constant number of queries.
+    """
+    user = get_object_or_404(models.User, username=username)
+    if user.is_staff:
+        lookups = ["courses", "intervals"]
+    else:
+        reserved_intervals = models.Interval.objects.select_related("teacher")
+        lookups = [
+            "participated_courses",
+            Prefetch("reserved_intervals", queryset=reserved_intervals),
+        ]
+    prefetch_related_objects([user], *lookups)
+    return user
+
+
+class LRUCache:
+    """Thread-safe in-memory mapping that evicts the least recently used entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+markdown_cache = LRUCache(MARKDOWN_CACHE_SIZE)
+_markdown_engines = threading.local()
+
+
+def get_markdown_engine() -> md.Markdown:
+    """Returns this thread's `Markdown` instance; they are not safe to share."""
+    engine = getattr(_markdown_engines, "engine", None)
+    if engine is None:
+        engine = _markdown_engines.engine = md.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return engine
+
+
+def render_markdown(text: str) -> str:
+    """Renders `text` to HTML, reusing the output of identical earlier renders."""
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    html = markdown_cache.get(key)
+    if html is None:
+        html = get_markdown_engine().reset().convert(text)
+        markdown_cache.set(key, html)
+    return html
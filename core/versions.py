@@ -0,0 +1,194 @@
+from __future__ import annotations
+import datetime
+from dataclasses import dataclass
+from uuid import uuid4
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import signals
+from django.dispatch import receiver
+from django.utils import timezone
+from core.models import Course, Department, Interval, User
+
+VERSION_KEY = "version:{}"
+
+COURSES = "courses"
+DEPARTMENTS = "departments"
+INTERVALS = "intervals"
+USERS = "users"
+
+# Per-object versions of cached template fragments, see `fragment_version`.
+COURSE_PARTICIPANTS = "course_participants:{}"
+DEPARTMENT_COURSES = "department_courses:{}"
+
+GENERATION_KEY = "generation:{}"
+GENERATION_CHANGES_KEY = "generation:{}:{}"
+# How long the ids touched by each generation are remembered.
+GENERATION_CHANGES_TIMEOUT = 24 * 60 * 60
+# Past this many missed generations, `generation_changes` gives up.
+GENERATION_CHANGES_LIMIT = 1000
+
+# Generations of the in-process search indexes, see `core.search`.
+COURSE_SEARCH = "course_search"
+USER_SEARCH = "user_search"
+
+# The resources whose representation changes when a model changes.
+# Departments show how many courses they have.
+MODEL_RESOURCES = {
+    Course: [COURSES, DEPARTMENTS],
+    Department: [COURSES, DEPARTMENTS],
+    Interval: [INTERVALS],
+}
+# Every resource shows users, but only by these fields.
+USER_NAME_FIELDS = {"username", "first_name", "last_name"}
+USER_RESOURCES = [COURSES, DEPARTMENTS, INTERVALS, USERS]
+Enrollment = Course.participants.through
+Reservation = Interval.reserving_students.through
+
+
+@dataclass(frozen=True)
+class Version:
+    token: str
+    modified: datetime.datetime
+
+
+def new_version() -> Version:
+    # `Last-Modified` has a resolution of seconds, so round up to stay ahead.
+    now = timezone.now()
+    modified = now.replace(microsecond=0) + datetime.timedelta(seconds=1)
+    return Version(uuid4().hex, modified)
+
+
+def get_version(name: str) -> Version:
+    """
+    Returns the current version of the resource `name`. It changes whenever
+    its data does, so it can answer conditional requests without a query.
+    Processes only agree on versions through a shared cache backend.
+    """
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), None)
+        version = cache.get(key) or new_version()
+    return version
+
+
+def bump(*names: str) -> None:
+    """
+    Gives `names` new versions once the transaction commits. Until then other
+    requests still read the old rows, which they would cache under the new
+    version for good.
+    """
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {VERSION_KEY.format(name): new_version() for name in names}, None
+        )
+    )
+
+
+def get_generation(name: str) -> int:
+    """
+    Returns the number of committed changes of `name`. Unlike a version it
+    only grows, so a process can tell how many changes it missed.
+    """
+    return cache.get_or_set(GENERATION_KEY.format(name), 0, None)
+
+
+def advance_generation(name: str, changed_ids=None) -> int:
+    """
+    Counts a change of `name` and records the ids it touched; `None` means
+    anything may have changed. Returns the new generation.
+    """
+    key = GENERATION_KEY.format(name)
+    cache.add(key, 0, None)
+    generation = cache.incr(key)
+    if changed_ids is not None:
+        cache.set(
+            GENERATION_CHANGES_KEY.format(name, generation),
+            list(changed_ids),
+            GENERATION_CHANGES_TIMEOUT,
+        )
+    return generation
+
+
+def generation_changes(name: str, after: int, until: int) -> set[int] | None:
+    """
+    The ids touched by the generations of `name` past `after` up to `until`,
+    or `None` when some of them are unknown or forgotten.
+    """
+    if until - after > GENERATION_CHANGES_LIMIT:
+        return None
+    keys = [
+        GENERATION_CHANGES_KEY.format(name, generation)
+        for generation in range(after + 1, until + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) < len(keys):
+        return None
+    return {pk for ids in changes.values() for pk in ids}
+
+
+@receiver(signals.post_save, dispatch_uid="version_on_save")
+@receiver(signals.post_delete, dispatch_uid="version_on_delete")
+def bump_on_change(sender, **kwargs):
+    resources = MODEL_RESOURCES.get(sender)
+    if resources is None:
+        return
+    bump(*resources)
+
+
+@receiver(signals.post_save, sender=User, dispatch_uid="version_user_save")
+def bump_on_user_save(sender, instance, created, update_fields, **kwargs):
+    # A new user shows up nowhere until they teach, enroll or reserve, which
+    # bump the resources themselves. Logins, profiles and images show nowhere.
+    if created:
+        return
+    if update_fields is not None and not USER_NAME_FIELDS & set(update_fields):
+        return
+    if instance.search_values_changed(USER_NAME_FIELDS):
+        bump(*USER_RESOURCES)
+
+
+@receiver(signals.post_delete, sender=User, dispatch_uid="version_user_delete")
+def bump_on_user_delete(sender, **kwargs):
+    bump(*USER_RESOURCES)
+
+
+@receiver(signals.m2m_changed, sender=Enrollment, dispatch_uid="version_enrollment")
+def bump_on_enrollment(sender, instance, action, reverse, pk_set, **kwargs):
+    # With `reverse` the instance is the student and `pk_set` holds courses.
+    if action == "pre_clear" and reverse:
+        instance._cleared_course_ids = list(
+            instance.participated_courses.values_list("pk", flat=True)
+        )
+        return
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        course_ids = [instance.pk]
+    elif action == "post_clear":
+        course_ids = getattr(instance, "_cleared_course_ids", [])
+    else:
+        course_ids = pk_set or []
+    bump(COURSES, *(COURSE_PARTICIPANTS.format(pk) for pk in course_ids))
+
+
+@receiver(signals.post_save, sender=Course, dispatch_uid="version_course_save")
+def bump_department_courses_on_save(sender, instance, **kwargs):
+    department_ids = {instance.department_id, instance._loaded_department_id}
+    department_ids.discard(None)
+    bump(*(DEPARTMENT_COURSES.format(pk) for pk in department_ids))
+    instance._loaded_department_id = instance.department_id
+
+
+@receiver(signals.post_delete, sender=Course, dispatch_uid="version_course_delete")
+def bump_fragments_on_course_delete(sender, instance, **kwargs):
+    bump(
+        DEPARTMENT_COURSES.format(instance.department_id),
+        COURSE_PARTICIPANTS.format(instance.pk),
+    )
+
+
+@receiver(signals.m2m_changed, sender=Reservation, dispatch_uid="version_reservation")
+def bump_on_reservation(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump(INTERVALS)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from django.shortcuts import get_object_or_404, render, redirect
+from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
 from core.forms import *
 from django.contrib.auth import authenticate, login, logout
@@ -10,15 +11,43 @@ from core.utils import (
     PasswordResetEmailException,
     send_email_to_support,
     send_password_reset_email,
-    interval_has_overlap,
+    interval_overlap_exists,
+    load_user_profile,
     ContactSupportException,
 )
 from core.models import Course, Department, Interval, User
-from django.db.models import Q
+from core.enrollments import EnrollmentOutcome, enroll_student
+from core.reservations import (
+    ReleaseOutcome,
+    ReservationOutcome,
+    release_interval,
+    reserve_interval,
+)
+from core.notifications import mark_notifications_read
+from core.response_cache import cache_response
+from core.search import search_courses, search_users, UserSearchResult
+from core.versions import COURSES, DEPARTMENTS
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import PasswordResetForm
-from notifications.signals import notify
+
+
+@login_required(login_url=reverse_lazy("core:user_login"))  # type: ignore
+def notification_list_view(request):
+    notifications = list(request.user.notifications.unread().prefetch_related("actor"))
+    context = {"notifications": notifications}
+    response = TemplateResponse(
+        request, "notification/notification_list.html", context=context
+    )
+    # Rendering stays read-only; the shown notifications are marked read
+    # with a single `UPDATE` once the fragment has been rendered.
+    displayed = [notification.pk for notification in notifications]
+
+    def mark_displayed_read(response):
+        mark_notifications_read(request.user.pk, displayed)
+
+    response.add_post_render_callback(mark_displayed_read)
+    return response
 
 
 def handle_404_view(request, exception: Exception):
@@ -58,20 +87,10 @@ def password_reset_request_view(request):
 
 
 @require_http_methods(["GET"])
+@cache_response(COURSES)
 def index_view(request):
     q = request.GET.get("q", "")
-    query = (
-        Q(name__icontains=q)
-        | Q(department__name__icontains=q)
-        | Q(teacher__username__icontains=q)
-        | Q(teacher__first_name__icontains=q)
-        | Q(teacher__last_name__icontains=q)
-        | Q(course_number__contains=q)
-        | Q(group_number__contains=q)
-        | Q(first_day__icontains=q)
-        | Q(second_day__icontains=q)
-    )
-    courses = Course.objects.filter(query)[:5]
+    courses = search_courses(q, limit=5)
     context = {"courses": courses}
     if "q" in request.GET:
         context["q"] = q
@@ -112,19 +131,18 @@ def user_list_view(request):
     q = request.GET.get("q", "")
     if q == "" and "q" in request.GET:  # search an empty string
         print("searched empty string")
-        teacher_users = User.objects.none()
-        student_users = User.objects.none()
+        result = UserSearchResult()
     else:
-        query = (
-            Q(username__icontains=q)
-            | Q(first_name__icontains=q)
-            | Q(last_name__icontains=q)
+        result = search_users(
+            q,
+            teachers_after=request.GET.get("teachers_after"),
+            students_after=request.GET.get("students_after"),
         )
-        teacher_users = User.objects.filter(Q(is_staff=True) & query).all()
-        student_users = User.objects.filter(Q(is_staff=False) & query).all()
     context = {
-        "teacher_users": teacher_users,
-        "student_users": student_users,
+        "teacher_users": result.teachers.users,
+        "student_users": result.students.users,
+        "teachers_next": result.teachers.next_cursor,
+        "students_next": result.students.next_cursor,
     }
     if "q" in request.GET:
         context["q"] = q
@@ -133,7 +151,7 @@ def user_list_view(request):
 
 @require_http_methods(["GET"])
 def user_details_view(request, username: str):
-    user = get_object_or_404(User, username=username)
+    user = load_user_profile(username)
     context = {"user": user}
     return render(request, "user/user_details.html", context=context)
 
@@ -289,6 +307,7 @@ def course_create_view(request):
 
 
 @require_http_methods(["GET"])
+@cache_response(COURSES)
 def course_details_view(request, course_number: int):
     course = get_object_or_404(Course, course_number=course_number)
     print()
@@ -334,31 +353,30 @@ def course_update_view(request, course_number: int):
 def course_add_user_view(request, course_number: int):
     course = get_object_or_404(Course, course_number=course_number)
     user = request.user
-    if user.is_superuser or user.is_staff:
+    outcome = enroll_student(course=course, student=user)
+    if outcome == EnrollmentOutcome.NOT_A_STUDENT:
         messages.add_message(
             request, messages.ERROR, "Admins and Teachers can not take courses."
         )
         return redirect("core:course_details", course_number=course_number)
-    if course not in user.participated_courses.all():
-        course.participants.add(user)
-        try:
-            course.full_clean()
-        except ValidationError as e:
-            messages.add_message(request, messages.ERROR, str(e))
-            return redirect("core:course_details", course_number=course_number)
-        course.save()
+    if outcome == EnrollmentOutcome.ALREADY_ENROLLED:
+        messages.add_message(request, messages.ERROR, "Can only add a course once.")
+        return redirect("core:course_details", course_number=course_number)
+    if outcome == EnrollmentOutcome.CONFLICT:
         messages.add_message(
-            request,
-            messages.SUCCESS,
-            f"Course {course.name} was added to your course list.",
+            request, messages.ERROR, "Course clashes with your current timetable."
         )
-        return redirect("core:user_details", username=user.username)
-    else:
-        messages.add_message(request, messages.ERROR, "Can only add a course once.")
         return redirect("core:course_details", course_number=course_number)
+    messages.add_message(
+        request,
+        messages.SUCCESS,
+        f"Course {course.name} was added to your course list.",
+    )
+    return redirect("core:user_details", username=user.username)
 
 
 @require_http_methods(["GET"])
+@cache_response(DEPARTMENTS)
 def department_list_view(request):
     q = request.GET.get("q", "")
     departments = Department.objects.filter(name__icontains=q)
@@ -369,6 +387,7 @@ def department_list_view(request):
 
 
 @require_http_methods(["GET"])
+@cache_response(DEPARTMENTS, COURSES)
 def department_details_view(request, department_number: int):
     department = get_object_or_404(Department, department_number=department_number)
     context = {"department": department}
@@ -471,8 +490,7 @@ def user_interval_create_view(request, username: str):
             except ValidationError as e:
                 messages.add_message(request, messages.ERROR, str(e))
                 return redirect("core:user_interval_create", username=username)
-            intervals = list(user.intervals.all())  # type: ignore
-            if interval_has_overlap(intervals=intervals, new_interval=interval):
+            if interval_overlap_exists(teacher=user, new_interval=interval):
                 messages.add_message(
                     request,
                     messages.ERROR,
@@ -522,8 +540,9 @@ def user_interval_update_view(request, username: str, pk: int):
             except ValidationError as e:
                 messages.add_message(request, messages.ERROR, str(e))
                 return redirect("core:user_interval_update", username=username, pk=pk)
-            intervals = list(user.intervals.exclude(pk=pk).all())  # type: ignore
-            if interval_has_overlap(intervals=intervals, new_interval=interval):
+            if interval_overlap_exists(
+                teacher=user, new_interval=interval, exclude_pk=pk
+            ):
                 messages.add_message(
                     request,
                     messages.ERROR,
@@ -553,7 +572,7 @@ def user_interval_update_view(request, username: str, pk: int):
 @login_required(login_url=reverse_lazy("core:user_login"))  # type: ignore
 @require_http_methods(["GET", "POST"])
 def user_interval_delete_view(request, username: str, pk: int):
-    interval = get_object_or_404(Interval, pk=pk)
+    interval = get_object_or_404(Interval.objects.select_related("teacher"), pk=pk)
     user = get_object_or_404(User, username=username)
     if request.user != user:
         messages.add_message(
@@ -568,11 +587,7 @@ def user_interval_delete_view(request, username: str, pk: int):
 
     context = {"interval": interval}
     if request.method == "POST":
-        for student in interval.reserving_students.all():
-            description = f"Teacher {user.username} deleted Interval on {interval}"
-            notify.send(
-                user, recipient=student, verb="Message", description=description
-            )
+        # The students are notified by `notify_interval_deleted` on delete.
         interval.delete()
         messages.add_message(
             request, messages.SUCCESS, "Interval was deleted successfully."
@@ -591,20 +606,22 @@ def user_interval_reserve_view(request, username: str, pk: int):
         )
         return redirect("core:user_details", username=username)
     interval = get_object_or_404(Interval, pk=pk)
-    student = request.user
-    if student in interval.reserving_students.all():
+    outcome = reserve_interval(interval=interval, student=request.user)
+    if outcome == ReservationOutcome.ALREADY_RESERVED:
         messages.add_message(
             request, messages.ERROR, "You have already reserved this Interval."
         )
-        return redirect("core:user_details", username=username)
-    if interval.capacity > interval.reserving_students.count():
-        interval.reserving_students.add(student)
+    elif outcome == ReservationOutcome.FULL:
         messages.add_message(
-            request, messages.SUCCESS, "Interval was reserved successfully."
+            request, messages.ERROR, "Interval does not have enough capacity."
+        )
+    elif outcome == ReservationOutcome.CONFLICT:
+        messages.add_message(
+            request, messages.ERROR, "Interval clashes with your current timetable."
         )
     else:
         messages.add_message(
-            request, messages.ERROR, "Interval does not have enough capacity."
+            request, messages.SUCCESS, "Interval was reserved successfully."
         )
     return redirect("core:user_details", username=username)
 
@@ -618,9 +635,8 @@ def user_interval_release_view(request, username: str, pk: int):
         )
         return redirect("core:user_details", username=username)
     interval = get_object_or_404(Interval, pk=pk)
-    student = request.user
-    if student in interval.reserving_students.all():
-        interval.reserving_students.remove(student)
+    outcome = release_interval(interval=interval, student=request.user)
+    if outcome == ReleaseOutcome.RELEASED:
         messages.add_message(
             request, messages.SUCCESS, "Interval was released successfully."
         )
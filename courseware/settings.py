@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 import json
 from django.contrib.messages import constants
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -53,7 +55,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.profiling.QueryProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -75,6 +79,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.unread_notifications",
             ],
         },
     },
@@ -86,17 +91,67 @@ WSGI_APPLICATION = "courseware.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# `CONN_HEALTH_CHECKS` and `POOL` below are implemented by `core.db.postgresql`
+# (Django 4.0 has neither), so other engines ignore the health checks and
+# refuse `SQL_POOL`.
+SQL_ENGINE = os.environ.get("SQL_ENGINE", "django.db.backends.sqlite3")
+if SQL_ENGINE == "django.db.backends.postgresql":
+    # The same backend plus health checks and the optional pool of `SQL_POOL`.
+    SQL_ENGINE = "core.db.postgresql"
+SQL_POOL = int(os.environ.get("SQL_POOL", 0))
+if SQL_POOL and SQL_ENGINE != "core.db.postgresql":
+    raise ImproperlyConfigured(
+        f"SQL_POOL needs SQL_ENGINE=django.db.backends.postgresql, not {SQL_ENGINE}."
+    )
+
 DATABASES = {
     "default": {
-        "ENGINE": os.environ.get("SQL_ENGINE", "django.db.backends.sqlite3"),
+        "ENGINE": SQL_ENGINE,
         "NAME": os.environ.get("SQL_DATABASE", BASE_DIR / "db.sqlite3"),
         "USER": os.environ.get("SQL_USER", "user"),
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # Pooled connections go back to the pool after every request; otherwise
+        # connections are kept for `SQL_CONN_MAX_AGE` seconds.
+        "CONN_MAX_AGE": 0 if SQL_POOL else int(os.environ.get("SQL_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_CONN_HEALTH_CHECKS", 1))),
+    }
+}
+if SQL_POOL:
+    DATABASES["default"]["POOL"] = {
+        # Enough for every thread of a worker, see `gunicorn.conf.py`.
+        "MAX_SIZE": int(os.environ.get("SQL_POOL_MAX_SIZE", 10)),
+        "TIMEOUT": float(os.environ.get("SQL_POOL_TIMEOUT", 10)),
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Use a backend shared by all workers in production (`docker-compose.yaml`
+# runs redis), since cached versions, unread counts and timetables are
+# invalidated through model signals. The default only suits a single process.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "courseware"),
     }
 }
 
+# Cache of anonymous responses of public pages, see `core.response_cache`:
+# "memory" (per-process LRU), "file" (shared by the workers of a host) or "off".
+# Entries are invalidated through versions kept in the default cache, so
+# with several workers `CACHE_BACKEND` has to be shared as well.
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "memory")
+RESPONSE_CACHE_LOCATION = os.environ.get(
+    "RESPONSE_CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "courseware")
+)
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", "600"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -136,9 +191,20 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR.joinpath("staticfiles")
 # STATIC_ROOT = "static"
+# With `DJANGO_STATIC_MANIFEST=1` (set by the `Dockerfile`, which runs
+# `collectstatic`), static files get content-hashed names plus gzip and brotli
+# copies that WhiteNoise serves with year-long `Cache-Control` headers. The
+# manifest only exists after `collectstatic`, so other runs keep plain names.
+STATIC_MANIFEST = int(os.environ.get("DJANGO_STATIC_MANIFEST", 0))
+if STATIC_MANIFEST:
+    STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+else:
+    STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
 
 MEDIA_URL = "media/"
 MEDIA_ROOT = "static/images"
+# Serves uploads from Django when `DEBUG` is off; disable it once a proxy does.
+SERVE_MEDIA = int(os.environ.get("DJANGO_SERVE_MEDIA", 1))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
@@ -174,4 +240,27 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # `Accept: application/json; version=2` opts into paginated user lists.
+    "DEFAULT_VERSIONING_CLASS": "rest_framework.versioning.AcceptHeaderVersioning",
+    "DEFAULT_VERSION": "1",
+    "ALLOWED_VERSIONS": ("1", "2"),
+}
+
+# Per-request SQL profiling, see `core.profiling`.
+# With strict budgets, views exceeding the query budget of their URL name raise.
+QUERY_PROFILER = int(os.environ.get("DJANGO_QUERY_PROFILER", DEBUG))
+QUERY_BUDGET_STRICT = int(os.environ.get("DJANGO_QUERY_BUDGET_STRICT", 0))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core": {
+            "handlers": ["console"],
+            "level": os.environ.get("DJANGO_LOG_LEVEL", "INFO"),
+        },
+    },
 }
@@ -0,0 +1,45 @@
+"""
+Production settings of `gunicorn`, read from the working directory:
+
+    gunicorn                                    # WSGI with threaded workers
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn   # ASGI
+
+Every value can be overridden through the environment.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class.startswith("uvicorn"):
+    wsgi_app = "courseware.asgi:application"
+else:
+    wsgi_app = "courseware.wsgi:application"
+
+# The usual 2 x cores + 1 processes; threads overlap the time spent on the
+# database, SMTP and the cache while keeping the memory of few processes.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Imports Django once in the master, so workers fork with shared memory and
+# start right away. Nothing opens connections or threads at import time.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycles workers now and then, so slow leaks never pile up.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    # Recycled and stopped workers finish the profile images they accepted
+    # within `graceful_timeout` instead of dropping them.
+    from core.images import finish_scheduled_images
+
+    finish_scheduled_images()
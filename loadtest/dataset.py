@@ -0,0 +1,57 @@
+"""
+The dataset written by `python manage.py seed_loadtest` and the journeys both
+load-testing tools replay against it.
+"""
+from __future__ import annotations
+import json
+import os
+import random
+from dataclasses import dataclass
+
+DATASET_PATH = os.environ.get(
+    "LOADTEST_DATASET", os.path.join(os.path.dirname(__file__), "dataset.json")
+)
+LOGIN_PATH = "/users/login"
+
+
+@dataclass
+class Dataset:
+    password: str
+    teachers: list[str]
+    students: list[str]
+    departments: list[int]
+    courses: list[int]
+    intervals: list[dict]
+    queries: list[str]
+
+    @classmethod
+    def load(cls, path: str = DATASET_PATH) -> Dataset:
+        with open(path) as file:
+            return cls(**json.load(file))
+
+    def course_path(self, rng: random.Random) -> str:
+        return f"/courses/{rng.choice(self.courses)}/"
+
+    def department_path(self, rng: random.Random) -> str:
+        return f"/departments/{rng.choice(self.departments)}/"
+
+    def search_path(self, rng: random.Random) -> str:
+        return f"/?q={rng.choice(self.queries)}"
+
+    def user_path(self, username: str) -> str:
+        return f"/users/{username}"
+
+    def interval_path(self, rng: random.Random, action: str) -> str:
+        interval = rng.choice(self.intervals)
+        return f"/users/{interval['teacher']}/intervals/{interval['pk']}/{action}"
+
+    def api_course_path(self, rng: random.Random) -> str:
+        return f"/api/courses/{rng.choice(self.courses)}/"
+
+
+def login_form(username: str, password: str, csrf_token: str) -> dict:
+    return {
+        "username": username,
+        "password": password,
+        "csrfmiddlewaretoken": csrf_token,
+    }
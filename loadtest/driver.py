@@ -0,0 +1,280 @@
+"""
+Measures latency percentiles and throughput per endpoint with concurrent
+`httpx` requests, and compares the results of two runs:
+
+    python manage.py seed_loadtest --clear
+    python loadtest/driver.py run --host http://localhost:8000 \
+        --requests 500 --concurrency 20 --output results/baseline.json
+    python loadtest/driver.py run ... --output results/candidate.json
+    python loadtest/driver.py compare results/baseline.json results/candidate.json
+
+`compare` exits with status 1 when an endpoint got slower or less reliable
+than `--threshold` percent, so it can gate a CI job.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+from time import perf_counter
+import httpx
+from dataset import DATASET_PATH, LOGIN_PATH, Dataset, login_form
+
+RESULTS_VERSION = 1
+
+
+@dataclass
+class Endpoint:
+    name: str
+    path: Callable[[Dataset, random.Random], str]
+    signed_in: bool = False
+
+
+ENDPOINTS = [
+    Endpoint("index", lambda data, rng: "/"),
+    Endpoint("search", lambda data, rng: data.search_path(rng)),
+    Endpoint("course_details", lambda data, rng: data.course_path(rng)),
+    Endpoint("department_list", lambda data, rng: "/departments/"),
+    Endpoint("department_details", lambda data, rng: data.department_path(rng)),
+    Endpoint("user_list", lambda data, rng: "/users/?q=student"),
+    Endpoint("api_course_list", lambda data, rng: "/api/courses/"),
+    Endpoint("api_course_detail", lambda data, rng: data.api_course_path(rng)),
+    Endpoint("api_department_list", lambda data, rng: "/api/departments/"),
+    Endpoint("api_interval_list", lambda data, rng: "/api/intervals/"),
+    Endpoint("api_student_list", lambda data, rng: "/api/students/"),
+    Endpoint(
+        "user_details",
+        lambda data, rng: data.user_path(rng.choice(data.students)),
+        signed_in=True,
+    ),
+    Endpoint("notifications", lambda data, rng: "/notifications/", signed_in=True),
+    Endpoint(
+        "interval_reserve",
+        lambda data, rng: data.interval_path(rng, "reserve"),
+        signed_in=True,
+    ),
+    Endpoint(
+        "interval_release",
+        lambda data, rng: data.interval_path(rng, "release"),
+        signed_in=True,
+    ),
+]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], failures: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "failures": failures,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "mean": sum(latencies) / requests if requests else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def write_results(
+    path: str, tool: str, host: str, duration: float, endpoints: dict
+) -> None:
+    """Writes per-endpoint statistics, latencies in milliseconds."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "version": RESULTS_VERSION,
+                "tool": tool,
+                "host": host,
+                "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "duration": duration,
+                "endpoints": endpoints,
+            },
+            file,
+            indent=2,
+        )
+
+
+async def sign_in(client, username: str, password: str) -> None:
+    await client.get(LOGIN_PATH)
+    response = await client.post(
+        LOGIN_PATH,
+        data=login_form(username, password, client.cookies.get("csrftoken", "")),
+    )
+    if "sessionid" not in client.cookies:
+        raise SystemExit(f"Could not sign in as {username!r}: {response.status_code}")
+
+
+async def measure(
+    client, endpoint: Endpoint, data: Dataset, requests: int, concurrency: int, seed
+) -> dict:
+    rng = random.Random(seed)
+    paths = [endpoint.path(data, rng) for _ in range(requests)]
+    latencies = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        while paths:
+            path = paths.pop()
+            started = perf_counter()
+            try:
+                response = await client.get(path)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append((perf_counter() - started) * 1000)
+            failures += failed
+
+    started = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, failures, perf_counter() - started)
+
+
+async def run(options) -> dict:
+    data = Dataset.load(options.dataset)
+    endpoints = [
+        endpoint
+        for endpoint in ENDPOINTS
+        if not options.endpoints or endpoint.name in options.endpoints
+    ]
+    limits = httpx.Limits(max_connections=options.concurrency)
+    results = {}
+    async with httpx.AsyncClient(
+        base_url=options.host, limits=limits, timeout=options.timeout
+    ) as anonymous, httpx.AsyncClient(
+        base_url=options.host, limits=limits, timeout=options.timeout
+    ) as signed_in:
+        if any(endpoint.signed_in for endpoint in endpoints):
+            await sign_in(
+                signed_in, options.username or data.students[0], data.password
+            )
+        for endpoint in endpoints:
+            client = signed_in if endpoint.signed_in else anonymous
+            # Warms caches and connections so they do not skew the percentiles.
+            await measure(client, endpoint, data, options.warmup, 1, options.seed)
+            results[endpoint.name] = summary = await measure(
+                client,
+                endpoint,
+                data,
+                options.requests,
+                options.concurrency,
+                options.seed,
+            )
+            print(
+                f"{endpoint.name:>20}: {summary['rps']:8.1f} req/s  "
+                f"p50 {summary['p50']:7.1f}ms  p95 {summary['p95']:7.1f}ms  "
+                f"p99 {summary['p99']:7.1f}ms  failures {summary['failures']}"
+            )
+    return results
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """Returns the regressions of `candidate` against `baseline`."""
+    regressions = []
+    limit = 1 + threshold / 100
+    print(
+        f"{'endpoint':>36} {'p95 before':>11} {'p95 after':>10} "
+        f"{'rps before':>11} {'rps after':>10}"
+    )
+    for name, before in baseline["endpoints"].items():
+        after = candidate["endpoints"].get(name)
+        if after is None:
+            print(f"{name:>36} missing from the candidate run")
+            continue
+        print(
+            f"{name:>36} {before['p95']:>9.1f}ms {after['p95']:>8.1f}ms "
+            f"{before['rps']:>11.1f} {after['rps']:>10.1f}"
+        )
+        if after["p95"] > before["p95"] * limit:
+            regressions.append(
+                f"{name}: p95 {before['p95']:.1f}ms -> {after['p95']:.1f}ms"
+            )
+        if after["rps"] * limit < before["rps"]:
+            regressions.append(
+                f"{name}: {before['rps']:.1f} -> {after['rps']:.1f} req/s"
+            )
+        before_rate = before["failures"] / max(before["requests"], 1)
+        after_rate = after["failures"] / max(after["requests"], 1)
+        if after_rate > before_rate:
+            regressions.append(
+                f"{name}: failure rate {before_rate:.1%} -> {after_rate:.1%}"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Load the endpoints and save results.")
+    run_parser.add_argument("--host", default="http://localhost:8000")
+    run_parser.add_argument("--dataset", default=DATASET_PATH)
+    run_parser.add_argument("--requests", type=int, default=500)
+    run_parser.add_argument("--concurrency", type=int, default=20)
+    run_parser.add_argument("--warmup", type=int, default=10)
+    run_parser.add_argument("--timeout", type=float, default=30)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument(
+        "--username", help="Student to sign in as; the first seeded one by default."
+    )
+    run_parser.add_argument(
+        "--endpoints",
+        nargs="*",
+        choices=[endpoint.name for endpoint in ENDPOINTS],
+        help="Only load these endpoints.",
+    )
+    run_parser.add_argument("--output", default="loadtest/results/latest.json")
+
+    compare_parser = commands.add_parser(
+        "compare", help="Flag regressions between two results."
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10,
+        help="Tolerated slowdown in percent of p95 latency and throughput.",
+    )
+
+    options = parser.parse_args(argv)
+    if options.command == "run":
+        started = perf_counter()
+        endpoints = asyncio.run(run(options))
+        write_results(
+            options.output, "httpx", options.host, perf_counter() - started, endpoints
+        )
+        print(f"Results: {options.output}")
+        return 0
+
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    with open(options.candidate) as file:
+        candidate = json.load(file)
+    regressions = compare(baseline, candidate, options.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions above {options.threshold:g}%.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
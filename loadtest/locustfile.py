@@ -0,0 +1,160 @@
+"""
+Weighted journeys of anonymous visitors, students and teachers through the
+site and the API. Seed the database first, then e.g.:
+
+    python manage.py seed_loadtest --clear
+    gunicorn
+    locust -f loadtest/locustfile.py --host http://localhost:8000 \
+        --headless -u 50 -r 10 -t 1m --csv results/<setup>
+
+With `LOADTEST_RESULTS=<path>.json` the statistics are also written in the
+format of `loadtest/driver.py`, so `driver.py compare` can diff two runs.
+"""
+from __future__ import annotations
+import os
+import random
+from locust import HttpUser, between, events, task
+from dataset import LOGIN_PATH, Dataset, login_form
+from driver import write_results
+
+dataset = Dataset.load()
+
+
+class Visitor(HttpUser):
+    abstract = True
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.rng = random.Random()
+
+
+class AnonymousVisitor(Visitor):
+    weight = 6
+
+    @task(4)
+    def index(self):
+        self.client.get("/")
+
+    @task(3)
+    def search(self):
+        self.client.get(dataset.search_path(self.rng), name="/?q=")
+
+    @task(3)
+    def course_details(self):
+        self.client.get(dataset.course_path(self.rng), name="/courses/[number]/")
+
+    @task(2)
+    def departments(self):
+        self.client.get("/departments/")
+        self.client.get(
+            dataset.department_path(self.rng), name="/departments/[number]/"
+        )
+
+    @task(2)
+    def api_courses(self):
+        response = self.client.get("/api/courses/", name="/api/courses/")
+        next_page = response.json().get("next") if response.ok else None
+        if next_page:
+            self.client.get(next_page, name="/api/courses/?cursor=")
+
+    @task(1)
+    def api_catalog(self):
+        self.client.get(
+            dataset.api_course_path(self.rng), name="/api/courses/[number]/"
+        )
+        self.client.get("/api/departments/")
+        self.client.get("/api/intervals/")
+
+    @task(1)
+    def stylesheet(self):
+        self.client.get("/static/style.css", headers={"Accept-Encoding": "br, gzip"})
+
+
+class SignedInVisitor(Visitor):
+    abstract = True
+    usernames: list[str] = []
+
+    def on_start(self):
+        super().on_start()
+        self.username = self.rng.choice(self.usernames)
+        self.client.get(LOGIN_PATH)
+        self.client.post(
+            LOGIN_PATH,
+            login_form(
+                self.username,
+                dataset.password,
+                self.client.cookies.get("csrftoken", ""),
+            ),
+        )
+
+    @task(2)
+    def profile(self):
+        self.client.get(dataset.user_path(self.username), name="/users/[username]")
+
+    @task(1)
+    def notifications(self):
+        self.client.get("/notifications/")
+
+
+class Student(SignedInVisitor):
+    weight = 3
+    usernames = dataset.students
+
+    @task(3)
+    def browse_courses(self):
+        self.client.get(dataset.search_path(self.rng), name="/?q=")
+        self.client.get(dataset.course_path(self.rng), name="/courses/[number]/")
+
+    @task(2)
+    def reserve_and_release(self):
+        # The interval page redirects back to the profile, which is not followed
+        # so the numbers show the reservation itself.
+        interval = self.rng.choice(dataset.intervals)
+        base = f"/users/{interval['teacher']}/intervals/{interval['pk']}"
+        self.client.get(
+            f"{base}/reserve",
+            name="/users/[username]/intervals/[pk]/reserve",
+            allow_redirects=False,
+        )
+        self.client.get(
+            f"{base}/release",
+            name="/users/[username]/intervals/[pk]/release",
+            allow_redirects=False,
+        )
+
+
+class Teacher(SignedInVisitor):
+    weight = 1
+    usernames = dataset.teachers
+
+    @task(2)
+    def students(self):
+        self.client.get("/users/?q=student", name="/users/?q=")
+        self.client.get("/api/students/", name="/api/students/")
+
+    @task(1)
+    def teachers(self):
+        self.client.get("/api/teachers/", name="/api/teachers/")
+
+
+@events.quitting.add_listener
+def save_results(environment, **kwargs):
+    path = os.environ.get("LOADTEST_RESULTS")
+    if not path:
+        return
+    stats = environment.stats
+    finished = stats.total.last_request_timestamp or stats.total.start_time
+    duration = max(finished - stats.total.start_time, 1e-9)
+    endpoints = {
+        f"{entry.method} {entry.name}": {
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "rps": entry.num_requests / duration,
+            "mean": entry.avg_response_time,
+            "p50": entry.get_response_time_percentile(0.5),
+            "p95": entry.get_response_time_percentile(0.95),
+            "p99": entry.get_response_time_percentile(0.99),
+        }
+        for entry in stats.entries.values()
+    }
+    write_results(path, "locust", environment.host, duration, endpoints)
@@ -1,7 +0,0 @@
-from locust import HttpUser, task
-
-
-class HelloWorldUser(HttpUser):
-    @task
-    def hello_world(self):
-        self.client.get("")